@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks of the client against :class:`~benchmarks.api.FakeQuickBooksApi`,
+a local stand-in for the quickbooks v3 api. Run them with::
+
+    python -m benchmarks [--quick] [--filter query] [--latency 20]
+
+Results are appended to a history file and compared to the previous run,
+see :mod:`benchmarks.runner`.
+"""
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+import argparse
+import os
+import sys
+
+from .runner import History, compare, run
+from .suite import CASES
+
+DEFAULT_HISTORY = os.path.join(os.path.dirname(__file__), 'history.jsonl')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description='Benchmarks the client '
+                                                 'against a local fake api.')
+    parser.add_argument('--filter', help='only run the cases whose name '
+                                         'contains this')
+    parser.add_argument('--operations', type=int, default=200,
+                        help='calls of the operation per repeat')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0,
+                        help='latency of the fake api in milliseconds')
+    parser.add_argument('--quick', action='store_true',
+                        help='20 operations, no repeat')
+    parser.add_argument('--history', default=DEFAULT_HISTORY)
+    parser.add_argument('--no-history', action='store_true',
+                        help='do not record the results')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='relative change reported as a regression')
+    parser.add_argument('--check', action='store_true',
+                        help='exit with status 1 on regressions')
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.operations, args.repeat = 20, 1
+
+    row = '%-50s %10s %9s %9s %9s %12s %6s'
+    print(row % ('case', 'ops/s', 'p50 ms', 'p95 ms', 'p99 ms',
+                 'peak KiB', 'errors'))
+    results = []
+    for result in run(CASES, args.filter, operations=args.operations,
+                      repeat=args.repeat, latency=args.latency / 1000):
+        stats = result.as_dict()
+        print(row % (result.key, '%.1f' % stats['throughput'],
+                     '%.2f' % (stats['p50'] * 1000),
+                     '%.2f' % (stats['p95'] * 1000),
+                     '%.2f' % (stats['p99'] * 1000),
+                     '%.1f' % (stats['peak_memory'] / 1024),
+                     stats['errors']))
+        results.append(result)
+
+    history = History(args.history)
+    previous = history.last()
+    regressions = []
+    if previous is not None and previous.get('latency') == args.latency:
+        regressions = compare(previous['results'],
+                              dict((result.key, result.as_dict())
+                                   for result in results), args.threshold)
+        for regression in regressions:
+            print('REGRESSION %s' % regression)
+
+    if not args.no_history:
+        history.append(results, latency=args.latency)
+
+    return 1 if args.check and regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+
+"""
+A :class:`~tests.fakeserver.FakeQuickBooksServer` serving a generated realm
+the way the v3 api does: paginated queries, CDC, reports and CRUD, with
+optional latency, faults and throttling.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+import itertools
+import random
+import re
+import time
+
+from tests.fakeserver import FakeQuickBooksServer
+
+COMPANY = r'/v3/company/\w+'
+
+_FROM_RE = re.compile(r'\sFrom\s+(\w+)', re.IGNORECASE)
+_START_RE = re.compile(r'StartPosition\s+(\d+)', re.IGNORECASE)
+_MAX_RE = re.compile(r'MaxResults\s+(\d+)', re.IGNORECASE)
+_AFTER_ID_RE = re.compile(r"\sId\s+>\s+'(\d+)'")
+
+
+def _search_int(regex, text, default):
+    match = regex.search(text)
+    return int(match.group(1)) if match else default
+
+
+def make_entity(name, index):
+    """
+    Returns a deterministic entity of about the size of a real customer.
+    """
+
+    return {
+        'Id': str(index),
+        'SyncToken': '0',
+        'domain': 'QBO',
+        'sparse': False,
+        'Active': True,
+        'DisplayName': '%s %d' % (name, index),
+        'CompanyName': 'Company %d' % index,
+        'PrimaryEmailAddr': {'Address': 'user%d@example.com' % index},
+        'BillAddr': {'Id': str(index), 'Line1': '%d Main Street' % index,
+                     'City': 'Mountain View', 'CountrySubDivisionCode': 'CA',
+                     'PostalCode': '94043'},
+        'Balance': round(index * 1.25, 2),
+        'CurrencyRef': {'value': 'USD', 'name': 'United States Dollar'},
+        'MetaData': {'CreateTime': '2016-01-01T10:00:00-08:00',
+                     'LastUpdatedTime': '2016-02-01T10:00:00-08:00'},
+    }
+
+
+def make_report(name, rows):
+    columns = [{'ColTitle': title, 'ColType': kind,
+                'MetaData': [{'Name': 'ColKey', 'Value': key}]}
+               for title, kind, key in [('Date', 'Date', 'tx_date'),
+                                        ('Amount', 'Money', 'amount')]]
+    data = [{'type': 'Data',
+             'ColData': [{'value': '2016-01-%02d' % (i % 28 + 1)},
+                         {'value': '%.2f' % (i * 1.5)}]}
+            for i in range(rows)]
+    return {'Header': {'ReportName': name, 'StartPeriod': '2016-01-01',
+                       'EndPeriod': '2016-12-31'},
+            'Columns': {'Column': columns},
+            'Rows': {'Row': [{
+                'type': 'Section',
+                'Header': {'ColData': [{'value': 'Checking'},
+                                       {'value': ''}]},
+                'Rows': {'Row': data},
+                'Summary': {'ColData': [
+                    {'value': 'Total for Checking'},
+                    {'value': '%.2f' % sum(i * 1.5 for i in range(rows))}]}
+            }]}}
+
+
+class FakeQuickBooksApi(FakeQuickBooksServer):
+    """
+    Usage::
+
+        api = FakeQuickBooksApi(entities={'Customer': 5000}, latency=0.02)
+        api.start()
+        client.base_url_v3 = api.base_url_v3
+
+    Every request is delayed by `latency` seconds; a `fault_rate` fraction
+    of them fails with a `ValidationFault` and every `throttle_every`-th
+    one with a 429 response.
+    """
+
+    def __init__(self, entities=None, report_rows=500, latency=0,
+                 fault_rate=0, throttle_every=0, seed=0):
+        super(FakeQuickBooksApi, self).__init__()
+        self.latency = latency
+        self.fault_rate = fault_rate
+        self.throttle_every = throttle_every
+        self.report_rows = report_rows
+        self.random = random.Random(seed)
+        self.counter = itertools.count(1)
+        self.store = {}
+        for name, count in (entities or {'Customer': 1000}).items():
+            self.store[name] = [make_entity(name, i)
+                                for i in range(1, count + 1)]
+
+        self.route('GET', COMPANY + '/query', self.query)
+        self.route('GET', COMPANY + '/cdc', self.cdc)
+        self.route('GET', COMPANY + r'/reports/(\w+)', self.report)
+        self.route('POST', COMPANY + '/batch', self.batch)
+        self.route('GET', COMPANY + r'/(\w+)/(\w+)', self.read)
+        self.route('POST', COMPANY + r'/(\w+)', self.write)
+
+    def record(self, request):
+        # requests are not kept, a benchmark sends too many of them
+        pass
+
+    def handle(self, request):
+        if self.latency:
+            time.sleep(self.latency)
+
+        number = next(self.counter)
+        if self.throttle_every and number % self.throttle_every == 0:
+            return 429, {'error': 'throttled'}, {'Retry-After': '0'}
+        if self.fault_rate and self.random.random() < self.fault_rate:
+            return 400, self.fault('Injected fault'), {}
+
+        return super(FakeQuickBooksApi, self).handle(request)
+
+    def fault(self, message):
+        return {'Fault': {'type': 'ValidationFault', 'Error': [
+            {'Message': message, 'Detail': message, 'code': '2000'}]}}
+
+    def entities(self, resource):
+        for name, entities in self.store.items():
+            if name.lower() == resource.lower():
+                return name, entities
+        return None, None
+
+    def query(self, request):
+        query = request.query.get('query', '')
+        match = _FROM_RE.search(query)
+        name, entities = self.entities(match.group(1) if match else '')
+        if entities is None:
+            return 400, self.fault('Unknown entity')
+
+        if 'count(*)' in query.lower():
+            return 200, {'QueryResponse': {'totalCount': len(entities)}}
+
+        start = _search_int(_START_RE, query, 1)
+        maxresults = _search_int(_MAX_RE, query, 100)
+        # entities are generated ordered by id, the nth having id n
+        first = _search_int(_AFTER_ID_RE, query, 0) + start - 1
+        page = entities[first:first + maxresults]
+        return 200, {'QueryResponse': {name: page, 'startPosition': start,
+                                       'maxResults': len(page),
+                                       'totalCount': len(page)},
+                     'time': '2016-03-01T10:00:00-08:00'}
+
+    def cdc(self, request):
+        responses = []
+        for resource in request.query.get('entities', '').split(','):
+            name, entities = self.entities(resource)
+            changed = (entities or [])[::10]
+            responses.append({name or resource: changed, 'startPosition': 1,
+                              'maxResults': len(changed)})
+        return 200, {'CDCResponse': [{'QueryResponse': responses}],
+                     'time': '2016-03-01T10:00:00-08:00'}
+
+    def report(self, request, name):
+        return 200, make_report(name, self.report_rows)
+
+    def read(self, request, resource, resource_id):
+        name, entities = self.entities(resource)
+        index = int(resource_id) - 1 if resource_id.isdigit() else -1
+        if entities is None or not 0 <= index < len(entities):
+            return 404, {}
+        return 200, {name: entities[index]}
+
+    def write(self, request, resource):
+        name, entities = self.entities(resource)
+        if entities is None:
+            return 404, {}
+
+        entity = request.json()
+        if request.query.get('operation') == 'delete':
+            return 200, {name: {'Id': entity.get('Id'), 'status': 'Deleted'}}
+
+        entity = dict(entity)
+        if 'Id' in entity:
+            entity['SyncToken'] = str(int(entity.get('SyncToken', 0)) + 1)
+        else:
+            entity['Id'] = str(len(entities) + 1)
+            entity['SyncToken'] = '0'
+        return 200, {name: entity}
+
+    def batch(self, request):
+        items = []
+        for item in request.json()['BatchItemRequest']:
+            resource = [key for key in item
+                        if key not in ('bId', 'operation')][0]
+            if resource == 'Query':
+                items.append({'bId': item['bId'], 'QueryResponse': {}})
+                continue
+            entity = dict(item[resource], Id=item[resource].get('Id', '1'))
+            items.append({'bId': item['bId'], resource: entity})
+        return 200, {'BatchItemResponse': items}
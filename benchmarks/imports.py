@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+"""
+Measures the import time of the package with ``python -X importtime``, in a
+fresh interpreter as on a cold start::
+
+    python -m benchmarks.imports "from quickbook3 import QuickBooks"
+
+prints the modules imported by the statement, the slowest first.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+import subprocess
+import sys
+
+
+def import_times(statement):
+    """
+    Runs `statement` in a new interpreter and returns the ``(module, depth,
+    self_us, cumulative_us)`` of the modules it imports, in their import
+    order, `depth` being `0` for the modules imported by `statement` itself
+    and `n + 1` for those imported by a module of depth `n`. Modules imported
+    by the interpreter startup are left out.
+    """
+
+    # the startup imports are reported before the marker
+    marker = 'import time: 0 | 0 | benchmarks-imports-start'
+    code = 'import sys; sys.stderr.write(%r + "\\n"); %s' % (
+        marker, statement)
+    process = subprocess.Popen([sys.executable, '-X', 'importtime', '-c',
+                                code], stderr=subprocess.PIPE)
+    output = process.communicate()[1].decode('utf-8')
+    if process.returncode:
+        raise RuntimeError('%r failed:\n%s' % (statement, output))
+
+    times = []
+    for line in output.split(marker, 1)[1].splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):]\
+            .split('|')
+        # the module is indented by two spaces per level, after a space
+        module = module.rstrip()[1:]
+        depth = (len(module) - len(module.lstrip())) // 2
+        times.append((module.lstrip(), depth, int(self_us),
+                      int(cumulative_us)))
+    return times
+
+
+def total_time(times):
+    """
+    Returns the seconds spent importing the top level modules of `times`.
+    """
+
+    return sum(cumulative_us for module, depth, self_us, cumulative_us
+               in times if depth == 0) / 1e6
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    statement = argv[0] if argv else 'import quickbook3'
+    times = import_times(statement)
+    print('%-40s %10s %12s' % ('module', 'self ms', 'cumulative ms'))
+    for module, depth, self_us, cumulative_us in sorted(
+            times, key=lambda time: -time[3])[:30]:
+        print('%-40s %10.2f %12.2f' % (module, self_us / 1000,
+                                       cumulative_us / 1000))
+    print('%s: %.2f ms' % (statement, total_time(times) * 1000))
+
+
+if __name__ == '__main__':
+    main()
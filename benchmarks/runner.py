@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+
+"""
+Runs the benchmark cases and keeps the history of their results.
+
+Each case is run with every combination of its parameters: the operation is
+called `operations` times from `concurrency` threads, `repeat` times, after
+a warmup call. The latencies of all the calls give the percentiles and the
+total wall time the throughput, while the peak memory allocated by a single
+call is traced separately. Results are appended as a json line to the
+history file, and compared to those of the previous line.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+import datetime
+import itertools
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from quickbook3 import QuickBooksError
+
+from .api import FakeQuickBooksApi
+
+timer = time.perf_counter
+
+
+def percentile(values, fraction):
+    """
+    Returns the value of the sorted `values` below which `fraction` of them
+    lie (nearest rank).
+    """
+
+    if not values:
+        return 0.0
+    index = max(0, int(round(fraction * len(values))) - 1)
+    return values[min(index, len(values) - 1)]
+
+
+class Case(object):
+    """
+    A benchmark: `setup` receives the fake api (`None` when `server` is
+    `False`) and the parameters, and returns the operation to time.
+    `grid` maps the parameter names to the values to benchmark.
+    `operations` caps the calls per repeat of slow operations.
+    """
+
+    def __init__(self, name, setup, grid, server=True, api_options=None,
+                 operations=None):
+        self.name = name
+        self.setup = setup
+        self.grid = grid
+        self.server = server
+        self.api_options = api_options or {}
+        self.operations = operations
+
+    def params(self):
+        names = sorted(self.grid)
+        for values in itertools.product(*(self.grid[name]
+                                          for name in names)):
+            yield dict(zip(names, values))
+
+
+class Result(object):
+
+    def __init__(self, name, params, latencies, wall_time, errors,
+                 peak_memory):
+        self.name = name
+        self.params = params
+        self.latencies = sorted(latencies)
+        self.wall_time = wall_time
+        self.errors = errors
+        self.peak_memory = peak_memory
+
+    @property
+    def key(self):
+        return '%s[%s]' % (self.name, ','.join(
+            '%s=%s' % item for item in sorted(self.params.items())))
+
+    @property
+    def throughput(self):
+        return len(self.latencies) / self.wall_time if self.wall_time else 0
+
+    def as_dict(self):
+        return {'operations': len(self.latencies),
+                'errors': self.errors,
+                'throughput': round(self.throughput, 2),
+                'p50': round(percentile(self.latencies, 0.5), 6),
+                'p95': round(percentile(self.latencies, 0.95), 6),
+                'p99': round(percentile(self.latencies, 0.99), 6),
+                'peak_memory': self.peak_memory}
+
+
+def _timed(operation):
+    started = timer()
+    try:
+        operation()
+        failed = False
+    except QuickBooksError:
+        failed = True
+    return timer() - started, failed
+
+
+def run_case(case, params, operations=200, repeat=3, latency=0):
+    """
+    Runs `case` with `params` and returns its :class:`Result`.
+    """
+
+    if case.operations is not None:
+        operations = min(operations, case.operations)
+
+    api = None
+    if case.server:
+        api = FakeQuickBooksApi(latency=latency, **case.api_options).start()
+
+    try:
+        operation = case.setup(api, **params)
+        operation()
+
+        latencies, errors, wall_time = [], 0, 0.0
+        concurrency = params.get('concurrency', 1)
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        try:
+            for _ in range(repeat):
+                started = timer()
+                timings = list(executor.map(lambda _: _timed(operation),
+                                            range(operations)))
+                wall_time += timer() - started
+                latencies.extend(elapsed for elapsed, failed in timings)
+                errors += sum(1 for elapsed, failed in timings if failed)
+        finally:
+            executor.shutdown(wait=True)
+
+        tracemalloc.start()
+        try:
+            _timed(operation)
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    finally:
+        if api is not None:
+            api.stop()
+
+    return Result(case.name, params, latencies, wall_time, errors,
+                  peak_memory)
+
+
+def run(cases, pattern=None, **options):
+    """
+    Runs the cases whose name contains `pattern` with all their parameters
+    and yields the results.
+    """
+
+    for case in cases:
+        if pattern and pattern not in case.name:
+            continue
+        for params in case.params():
+            yield run_case(case, params, **options)
+
+
+def current_commit():
+    try:
+        output = subprocess.check_output(['git', 'rev-parse', '--short',
+                                          'HEAD'], stderr=subprocess.STDOUT)
+        return output.decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class History(object):
+    """
+    The results of past runs, one json object per line.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def records(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path) as history:
+            return [json.loads(line) for line in history if line.strip()]
+
+    def last(self):
+        records = self.records()
+        return records[-1] if records else None
+
+    def append(self, results, **info):
+        record = {'timestamp': datetime.datetime.utcnow().isoformat(),
+                  'commit': current_commit(),
+                  'python': platform.python_version(),
+                  'results': dict((result.key, result.as_dict())
+                                  for result in results)}
+        record.update(info)
+        with open(self.path, 'a') as history:
+            history.write(json.dumps(record, sort_keys=True) + '\n')
+        return record
+
+
+def compare(previous, current, threshold=0.2):
+    """
+    Returns the regressions of the `current` results (keyed by
+    :attr:`Result.key`, as in the history) against the `previous` ones: a
+    throughput lower, or a p95 latency or peak memory higher, by more than
+    `threshold`.
+    """
+
+    regressions = []
+    for key, result in sorted(current.items()):
+        before = previous.get(key)
+        if before is None:
+            continue
+
+        if result['throughput'] < before['throughput'] * (1 - threshold):
+            regressions.append('%s: throughput %.1f/s -> %.1f/s' % (
+                key, before['throughput'], result['throughput']))
+        for metric in ('p95', 'peak_memory'):
+            if result[metric] > before[metric] * (1 + threshold):
+                regressions.append('%s: %s %s -> %s' % (
+                    key, metric, before[metric], result[metric]))
+    return regressions
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+"""
+The benchmark cases, registered in :data:`CASES` with the parameters they
+are run with.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+import json
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from rauth.oauth import HmacSha1Signature
+from quickbook3 import QuickBooks, QueryBuilder, ResponseParser, \
+    PooledTransport, RetryPolicy, CachedHmacSha1Signature, SQLiteMirror
+
+from .api import make_entity
+from .imports import import_times
+from .runner import Case
+
+CASES = []
+
+REALM_SIZE = 2000
+
+
+def case(name, server=True, api_options=None, operations=None, **grid):
+    def register(setup):
+        CASES.append(Case(name, setup, grid, server=server,
+                          api_options=api_options, operations=operations))
+        return setup
+    return register
+
+
+def client_for(api, concurrency=1, **options):
+    client = QuickBooks('1234', consumer_key='key', consumer_secret='secret',
+                        access_token='token', access_token_secret='secret',
+                        transport=PooledTransport(pool_maxsize=concurrency),
+                        **options)
+    client.base_url_v3 = api.base_url_v3
+    return client
+
+
+IMPORTS = {'package': 'import quickbook3',
+           'QueryBuilder': 'from quickbook3 import QueryBuilder',
+           'QuickBooks': 'from quickbook3 import QuickBooks'}
+
+
+@case('cold_import', server=False, operations=20,
+      target=sorted(IMPORTS))
+def cold_import(api, target):
+    # a new interpreter per call, python -m benchmarks.imports details the
+    # import time of each module
+    return lambda: import_times(IMPORTS[target])
+
+
+@case('parse', server=False, page_size=[100, 1000])
+def parse(api, page_size):
+    body = json.dumps({'QueryResponse': {
+        'Customer': [make_entity('Customer', i)
+                     for i in range(1, page_size + 1)],
+        'startPosition': 1, 'maxResults': page_size}}).encode('utf-8')
+
+    def operation():
+        response = requests.Response()
+        response.status_code = 200
+        response.encoding = 'utf-8'
+        response.headers = CaseInsensitiveDict(
+            {'Content-Type': 'application/json'})
+        response._content = body
+        return ResponseParser(response).parse()
+    return operation
+
+
+@case('sign', server=False, signature=['rauth', 'cached'])
+def sign(api, signature):
+    signature = HmacSha1Signature() if signature == 'rauth' \
+        else CachedHmacSha1Signature()
+    oauth_params = {'oauth_consumer_key': 'key', 'oauth_nonce': 'nonce',
+                    'oauth_signature_method': signature.NAME,
+                    'oauth_timestamp': '1457000000', 'oauth_token': 'token',
+                    'oauth_version': '1.0'}
+    url = 'https://quickbooks.api.intuit.com/v3/company/1234/query'
+    req_kwargs = {'params': {'query': 'Select * From Customer '
+                                      'StartPosition 1 MaxResults 100'},
+                  'headers': {'Content-Type': 'application/json'}}
+    return lambda: signature.sign('secret', 'secret', 'GET', url,
+                                  oauth_params, req_kwargs)
+
+
+@case('query', api_options={'entities': {'Customer': REALM_SIZE}},
+      page_size=[100, 1000], concurrency=[1, 8])
+def query(api, page_size, concurrency):
+    client = client_for(api, concurrency)
+    querybuilder = QueryBuilder('Customer').limit(page_size)
+    return lambda: client.query(querybuilder)
+
+
+@case('batch_query', api_options={'entities': {'Customer': REALM_SIZE}},
+      page_size=[100, 1000], keyset=[None, 'Id'])
+def batch_query(api, page_size, keyset):
+    client = client_for(api)
+
+    def operation():
+        for page in client.batch_query(QueryBuilder('Customer')
+                                       .limit(page_size), keyset=keyset):
+            pass
+    return operation
+
+
+@case('parallel_batch_query',
+      api_options={'entities': {'Customer': REALM_SIZE}},
+      page_size=[100], workers=[4])
+def parallel_batch_query(api, page_size, workers):
+    client = client_for(api, workers)
+
+    def operation():
+        for page in client.parallel_batch_query(QueryBuilder('Customer')
+                                                .limit(page_size),
+                                                workers=workers):
+            pass
+    return operation
+
+
+@case('cdc', api_options={'entities': {'Customer': REALM_SIZE,
+                                       'Invoice': REALM_SIZE}},
+      concurrency=[1, 8])
+def cdc(api, concurrency):
+    client = client_for(api, concurrency)
+    return lambda: client.cdc(['Customer', 'Invoice'],
+                              '2016-01-01T00:00:00-08:00')
+
+
+@case('crud', concurrency=[1, 8])
+def crud(api, concurrency):
+    client = client_for(api, concurrency)
+
+    def operation():
+        customer = client.create('Customer', {'DisplayName': 'Name'})
+        customer = client.read('Customer', '1')
+        customer = client.update('Customer', customer)
+        client.delete('Customer', customer)
+    return operation
+
+
+@case('report', decode=[False, True])
+def report(api, decode):
+    client = client_for(api)
+    return lambda: client.report('GeneralLedger', decode=decode)
+
+
+@case('throttled_query', api_options={'throttle_every': 5},
+      concurrency=[1, 8])
+def throttled_query(api, concurrency):
+    policy = RetryPolicy(max_retries=10, backoff=0, jitter=False)
+    client = client_for(api, concurrency, retry_policy=policy)
+    return lambda: client.query(QueryBuilder('Customer'))
+
+
+@case('faulty_query', api_options={'fault_rate': 0.1}, concurrency=[1])
+def faulty_query(api, concurrency):
+    client = client_for(api, concurrency)
+    return lambda: client.query(QueryBuilder('Customer'))
+
+
+MIRROR_QUERIES = {
+    'id': lambda: QueryBuilder('Customer').where('Id').equals('1000'),
+    'indexed': lambda: QueryBuilder('Customer').where('DisplayName')
+    .equals('Customer 1000'),
+    'scan': lambda: QueryBuilder('Customer').where('Balance').gt(2400)
+    .limit(10),
+}
+
+
+@case('mirror_query', api_options={'entities': {'Customer': REALM_SIZE}},
+      query=sorted(MIRROR_QUERIES))
+def mirror_query(api, query):
+    mirror = SQLiteMirror(client_for(api), ':memory:',
+                          resources=['customer'])
+    mirror.sync()
+    querybuilder = MIRROR_QUERIES[query]()
+    return lambda: mirror.query(querybuilder)
@@ -1,11 +1,101 @@
 # -*- coding: utf-8 -*-
 
+"""
+The names of the submodules are loaded lazily: the submodule defining a name
+(and its dependencies, like rauth, requests or pyarrow) is only imported the
+first time the name is accessed, so that ``from quickbook3 import
+QueryBuilder`` stays cheap.
+"""
+
+import importlib
+import sys
+
 __author__ = 'Ritesh Kadmawala'
 __email__ = 'ritesh@loanzen.in'
 __version__ = '0.2.2'
 
-from .auth import *  # noqa
-from .exceptions import *  # noqa
-from .querybuilder import *  # noqa
-from .quickbook import *  # noqa
-from .response import *  # noqa
+# the public names of each submodule
+_EXPORTS = {
+    'auth': ('QuickBookAuthService', 'QuickBookOAuth2Service'),
+    'batch': ('Batch',),
+    'cache': ('cache_key', 'response_key', 'Revalidation',
+              'SQLiteResponseCache'),
+    'coalesce': ('SingleFlight',),
+    'exceptions': ('QuickBooksError', 'MissingCredentialsException',
+                   'InvalidResourceError', 'InvalidQueryError',
+                   'InvalidBatchError', 'HttpQuickBookError',
+                   'AuthenticationError', 'PermissionDenied',
+                   'NotFoundError', 'ServerError', 'ServiceUnavailable',
+                   'ThrottleError', 'UnknownError', 'GenericError',
+                   'ValidationFault', 'ServiceError', 'DisconnectionError',
+                   'TokenError'),
+    'export': ('Flattener', 'BaseSink', 'CSVSink', 'ArrowSink',
+               'ParquetSink', 'Exporter', 'SINKS', 'export_query',
+               'export_realm'),
+    'lru': ('BaseCache', 'LRUCache'),
+    'metrics': ('timer', 'PHASES', 'call_tags', 'Call', 'TimedSignature',
+                'BaseExporter', 'LoggingExporter', 'Histogram', 'CallStats',
+                'HistogramExporter', 'PrometheusExporter'),
+    'mirror': ('parse_filter', 'SQLiteMirror'),
+    'models': ('Nested', 'ModelList', 'Model', 'as_dict', 'make_model', 'Ref',
+               'MetaData', 'CustomField', 'PhysicalAddress', 'EmailAddress',
+               'TelephoneNumber', 'WebSiteAddress', 'LinkedTxn', 'Line',
+               'TxnTaxDetail', 'ENTITY_FIELDS', 'TRANSACTION_FIELDS',
+               'NAME_FIELDS', 'NESTED', 'ENTITIES', 'MODELS', 'model_for',
+               'to_model',
+               # generated from ENTITIES
+               'Account', 'Attachable', 'Bill', 'BillPayment', 'Class',
+               'CompanyInfo', 'CreditMemo', 'Customer', 'Department',
+               'Deposit', 'Employee', 'Estimate', 'Invoice', 'Item',
+               'JournalEntry', 'Payment', 'PaymentMethod', 'Preferences',
+               'Purchase', 'PurchaseOrder', 'SalesReceipt', 'TaxCode',
+               'TaxRate', 'Term', 'TimeActivity', 'Vendor', 'VendorCredit'),
+    'pagination': ('PrefetchingPaginator', 'KeysetPaginator'),
+    'pool': ('query_all', 'JobResult', 'RealmResult', 'RealmPool'),
+    'querybuilder': ('quote', 'RENDERERS', 'TEMPLATE_CACHE', 'QueryBuilder',
+                     'QueryTemplate', 'BoundQuery'),
+    'reports': ('DATE_FORMAT', 'date_windows', 'merge_reports',
+                'ShardedReport'),
+    'quickbook': ('auth_required', 'BaseQuickBooks', 'QuickBooks'),
+    'response': ('ResponseParser', 'QueryResponse', 'StreamingQueryResponse',
+                 'CDCResponse', 'ReadManyResponse', 'BatchResponse',
+                 'ReportColumn', 'ReportSection', 'ReportRow',
+                 'ReportResponse'),
+    'signing': ('STATIC_OAUTH_PARAMS', 'encode_pair', 'escape_segment',
+                'CachedHmacSha1Signature'),
+    'sync': ('UTC', 'WATERMARK_FORMAT', 'format_watermark',
+             'parse_watermark', 'parse_timestamp', 'WatermarkStore',
+             'MemoryWatermarkStore', 'SQLiteWatermarkStore', 'SyncBatch',
+             'CDCSyncer'),
+    'throttle': ('monotonic', 'TokenBucket', 'RateLimiter', 'RetryPolicy'),
+    'tokens': ('OAuth2Token', 'TokenStore', 'MemoryTokenStore',
+               'SQLiteTokenStore', 'TokenManager', 'BearerSession'),
+    'transport': ('PooledTransport',),
+}
+
+_MODULES = dict((name, module) for module, names in _EXPORTS.items()
+                for name in names)
+
+__all__ = sorted(_MODULES)
+
+
+def __getattr__(name):
+    module = _MODULES.get(name)
+    if module is None:
+        raise AttributeError("module %r has no attribute %r"
+                             % (__name__, name))
+
+    value = getattr(importlib.import_module('.' + module, __name__), name)
+    # cached, later accesses don't go through __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_MODULES))
+
+
+if sys.version_info < (3, 7):
+    # module __getattr__ (PEP 562) is not supported, load everything
+    for _name in __all__:
+        globals()[_name] = __getattr__(_name)
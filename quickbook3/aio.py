@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+
+"""
+quickbook3.aio
+~~~~~~~~~~~~~~
+
+This module contains :class:`AsyncQuickBooks`, an asyncio counterpart of
+:class:`~quickbook3.quickbook.QuickBooks` built on top of aiohttp. It requires
+python 3.6+ and the ``aiohttp`` package (``pip install quickbooks-py[async]``).
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import asyncio
+import datetime
+from collections import OrderedDict
+from hashlib import sha1
+from random import random
+from time import time
+
+import aiohttp
+import requests
+from requests.structures import CaseInsensitiveDict
+from rauth.utils import OAuth1Auth
+
+from .batch import Batch
+from .exceptions import DisconnectionError, QuickBooksError
+from .models import model_for
+from .quickbook import BaseQuickBooks, auth_required
+from .response import ResponseParser, QueryResponse, CDCResponse, \
+    ReportResponse, ReadManyResponse, BatchResponse
+from .signing import CachedHmacSha1Signature
+
+
+async def gather(*aws, concurrency=10, return_exceptions=False):
+    """
+    Like :func:`asyncio.gather` but with at most `concurrency` of the given
+    awaitables running at any point of time. Results are returned in the
+    order of the awaitables passed.
+
+    :param concurrency: Maximum number of awaitables in flight.
+    :type concurrency: int
+    :param return_exceptions: If `True` exceptions are returned in place of
+        results instead of being raised.
+    :type return_exceptions: bool
+    """
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(aw):
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(*[bounded(aw) for aw in aws],
+                                return_exceptions=return_exceptions)
+
+
+class AsyncBatch(Batch):
+    """
+    The :class:`~quickbook3.batch.Batch` of
+    :class:`AsyncQuickBooks`, whose :meth:`execute` is a coroutine
+    submitting at most `concurrency` chunks at a time::
+
+        batch = client.batch()
+        batch.create('Customer', {'DisplayName': 'Jane'}, bid='jane')
+        response = await batch.execute()
+    """
+
+    def __init__(self, client, concurrency=None):
+        """
+        :param client: Client used to send the batch requests.
+        :type client: :class:`AsyncQuickBooks`
+        :param concurrency: Number of chunks submitted concurrently,
+            defaults to the concurrency of the client.
+        :type concurrency: int
+        """
+
+        super(AsyncBatch, self).__init__(client, workers=concurrency)
+
+    async def execute(self):
+        batch_response = BatchResponse(self.entities)
+        chunks = self.chunks()
+        if not chunks:
+            return batch_response
+
+        results = await self.client.gather(
+            *[self._submit(chunk) for chunk in chunks],
+            concurrency=self.workers, return_exceptions=True)
+
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, QuickBooksError):
+                for item in chunk:
+                    batch_response.add_fault(item['bId'], result)
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                batch_response.add_items(result)
+
+        return batch_response
+
+    async def _submit(self, chunk):
+        url = "/".join([self.client.base_url_v3, 'company',
+                        self.client.company_id, 'batch'])
+        response = await self.client._execute(
+            method='post', url=url, params={},
+            json={'BatchItemRequest': chunk})
+        return response['BatchItemResponse']
+
+
+class AsyncQuickBooks(BaseQuickBooks):
+    """
+    An asyncio quickbooks client whose api methods are coroutines, and
+    :meth:`batch_query` an async generator, counterparts of those of
+    :class:`~quickbook3.quickbook.QuickBooks`::
+
+        async with AsyncQuickBooks(company_id='123', cred_file='creds') as qb:
+            customers = await qb.gather(*[qb.read('customer', customer_id)
+                                          for customer_id in customer_ids])
+
+    Requests are signed locally and sent over an aiohttp connection pool.
+    Pass the same `connector` to several clients (one per realm) to share a
+    single pool between them; a shared connector is never closed by the
+    client. Errors are mapped to exceptions by
+    :class:`~quickbook3.response.ResponseParser`, so they are identical to
+    the ones raised by the synchronous client.
+
+    Requests are signed with the OAuth 1.0a credentials and sent once: the
+    options of :attr:`UNSUPPORTED_OPTIONS` raise a :class:`TypeError`, and
+    streamed, cached, keyset paginated and revalidated reads raise
+    :class:`NotImplementedError`. The client has no entity cache, so it has
+    no ``revalidate``, nor the thread based ``parallel_batch_query`` and
+    ``sharded_report``: run its queries and reports with :meth:`gather`
+    instead.
+    """
+
+    OAUTH_VERSION = '1.0'
+
+    UNSUPPORTED_OPTIONS = ('transport', 'cache', 'rate_limiter',
+                           'retry_policy', 'metrics', 'token_manager',
+                           'response_cache', 'single_flight')
+
+    def __init__(self, company_id, connector=None, pool_size=100,
+                 concurrency=10, timeout=300, **kwargs):
+        """
+        :param company_id: This is the realmID obtained during authorization
+        :type company_id: str
+        :param connector: A connector shared across clients, defaults to a
+            connector owned by this client.
+        :type connector: :class:`aiohttp.TCPConnector`
+        :param pool_size: Maximum number of pooled connections when the client
+            owns its connector, defaults to `100`.
+        :type pool_size: int
+        :param concurrency: Default concurrency used by :meth:`gather`,
+            defaults to `10`.
+        :type concurrency: int
+        :param timeout: Total timeout of a request in seconds, defaults to
+            `300`.
+        :type timeout: float
+
+        All other keyword arguments are those of
+        :class:`~quickbook3.quickbook.QuickBooks`, except those of
+        :attr:`UNSUPPORTED_OPTIONS`.
+        """
+
+        for option in self.UNSUPPORTED_OPTIONS:
+            if kwargs.get(option) is not None:
+                raise TypeError("AsyncQuickBooks does not support the %s "
+                                "option" % option)
+
+        self.connector = connector
+        self.pool_size = pool_size
+        self.concurrency = concurrency
+        self.timeout = timeout
+        super(AsyncQuickBooks, self).__init__(company_id, **kwargs)
+
+        self._create_session()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    async def gather(self, *aws, concurrency=None, return_exceptions=False):
+        return await gather(*aws,
+                            concurrency=concurrency or self.concurrency,
+                            return_exceptions=return_exceptions)
+
+    async def create(self, resource, resource_dict, **params):
+        url = self._get_crud_url(resource)
+        response = await self._execute(method='post', url=url,
+                                       params=params or {},
+                                       json=resource_dict)
+        return response[resource]
+
+    def batch(self, concurrency=None):
+        """
+        Returns an :class:`AsyncBatch` to accumulate create, update, delete
+        and query operations that are then submitted together to the batch
+        endpoint.
+
+        :param concurrency: Number of chunks submitted concurrently,
+            defaults to the concurrency of the client.
+        :type concurrency: int
+        """
+
+        return AsyncBatch(self, concurrency=concurrency)
+
+    async def read(self, resource, resource_id, revalidate=False, **params):
+        if revalidate:
+            raise NotImplementedError("revalidate is not supported by "
+                                      "AsyncQuickBooks")
+        url = self._get_crud_url(resource, resource_id)
+        response = await self._execute(method='get', url=url,
+                                       params=params or {})
+        return response[resource]
+
+    async def read_many(self, resource, ids, concurrency=None,
+                        chunk_size=BaseQuickBooks.MAX_RESULTS):
+        """
+        Reads many entities with ``Select * ... Where Id in (...)`` queries
+        run concurrently, as
+        :meth:`~quickbook3.quickbook.QuickBooks.read_many` does. Returns a
+        :class:`~quickbook3.response.ReadManyResponse`.
+
+        :param concurrency: Number of queries run concurrently, defaults to
+            the concurrency of the client.
+        :type concurrency: int
+        :param chunk_size: Maximum number of ids per query, defaults to
+            `1000`.
+        :type chunk_size: int
+        """
+
+        self._get_crud_url(resource)
+        ids = list(OrderedDict.fromkeys(str(resource_id)
+                                        for resource_id in ids))
+        result = ReadManyResponse()
+
+        entity_name = model_for(resource).__name__
+        query_responses = await self.gather(
+            *[self.query(self._id_query(entity_name, chunk))
+              for chunk in self._id_chunks(ids, chunk_size)],
+            concurrency=concurrency)
+        for query_response in query_responses:
+            for obj in query_response:
+                result.entities[obj['Id']] = obj
+
+        result.missing = [resource_id for resource_id in ids
+                          if resource_id not in result.entities]
+        return result
+
+    async def update(self, resource, resource_dict, **params):
+        url = self._get_crud_url(resource)
+        response = await self._execute(method='post', url=url,
+                                       params=params or {},
+                                       json=resource_dict)
+        return response[resource]
+
+    async def delete(self, resource, resource_dict, **params):
+        url = self._get_crud_url(resource)
+        params = params or {}
+        params['operation'] = 'delete'
+        response = await self._execute(method='post', url=url,
+                                       params=params,
+                                       json=resource_dict)
+        return response[resource]
+
+    async def query(self, querybuilder, stream=False, cached=False,
+                    **params):
+        if stream or cached:
+            raise NotImplementedError("Streamed and cached queries are not "
+                                      "supported by AsyncQuickBooks")
+        query = querybuilder.build()
+        entity = querybuilder.get_entity()
+        count = querybuilder.is_count_query()
+        return await self._query(entity, query, count, params)
+
+    async def _query(self, entity, query, count=False, params=None):
+        params = params or {}
+        params['query'] = query
+
+        url = "/".join([self.base_url_v3, 'company', self.company_id, 'query'])
+
+        response = await self._execute(method='get', url=url, params=params)
+
+        if count:
+            return response['QueryResponse']['totalCount']
+        else:
+            return QueryResponse(entity, response['QueryResponse'])
+
+    async def batch_query(self, querybuilder, stream=False, keyset=None,
+                          progress=None, **params):
+        if stream or keyset is not None or progress is not None:
+            raise NotImplementedError("Streamed and keyset paginations are "
+                                      "not supported by AsyncQuickBooks")
+        maxresults = querybuilder.get_maxresults()
+        while True:
+            query_response = await self.query(querybuilder, **params)
+            total_count = query_response.total_count
+            startposition = query_response.startposition
+            yield query_response
+            if total_count == 0 or total_count < maxresults:
+                return
+            else:
+                querybuilder.offset(startposition + maxresults)
+
+    async def report(self, name, decode=False, **params):
+        url = "/".join([self.base_url_v3, 'company', self.company_id,
+                        'reports', name])
+
+        response = await self._execute(method='get', url=url, params=params)
+        if decode:
+            return ReportResponse(response)
+        return response
+
+    async def cdc(self, entities, changed_since):
+        if isinstance(changed_since, datetime.datetime):
+            changed_since = changed_since.isoformat()
+
+        params = {
+            'entities': ','.join(entities),
+            'changedSince': changed_since
+        }
+
+        url = "/".join([self.base_url_v3, 'company', self.company_id, 'cdc'])
+
+        response = await self._execute(method='get', url=url, params=params)
+
+        return CDCResponse(entities, response['CDCResponse'])
+
+    async def disconnect(self):
+        resp = await self._execute(method='get', url=self.disconnect_url)
+        if resp['ErrorCode'] > 0:
+            raise DisconnectionError(resp['ErrorCode'], resp['ErrorMessage'])
+
+    @auth_required
+    async def _execute(self, method, url, params=None, json=None):
+        method = method.upper()
+        # parameters set to None are not sent, as by requests
+        params = {key: str(value) for key, value in (params or {}).items()
+                  if value is not None}
+        headers = dict(self.headers,
+                       Authorization=self._get_auth_header(method, url,
+                                                           params))
+
+        async with self._get_session().request(method, url, params=params,
+                                               json=json, headers=headers,
+                                               ssl=False) as response:
+            content = await response.read()
+
+        return ResponseParser(self._to_response(response, content)).parse()
+
+    def _get_auth_header(self, method, url, params):
+        oauth_params = {
+            'oauth_consumer_key': self.consumer_key,
+            'oauth_nonce': sha1(str(random()).encode('ascii')).hexdigest(),
+            'oauth_signature_method': self.signature.NAME,
+            'oauth_timestamp': int(time()),
+            'oauth_token': self.access_token,
+            'oauth_version': self.OAUTH_VERSION
+        }
+
+        oauth_params['oauth_signature'] = \
+            self.signature.sign(self.consumer_secret,
+                                self.access_token_secret,
+                                method, url, oauth_params,
+                                {'params': params})
+
+        return OAuth1Auth(oauth_params, self.company_id)._get_auth_header()
+
+    def _to_response(self, aio_response, content):
+        """
+        Wraps an aiohttp response (whose body has been read) into a
+        :class:`requests.Response` so that it can be handed over to
+        :class:`~quickbook3.response.ResponseParser`.
+        """
+
+        response = requests.Response()
+        response.status_code = aio_response.status
+        response.reason = aio_response.reason
+        response.headers = CaseInsensitiveDict(aio_response.headers)
+        response.encoding = aio_response.charset or 'utf-8'
+        response.url = str(aio_response.url)
+        response._content = content
+        return response
+
+    def _get_session(self):
+        if self.session is None:
+            if self.connector is None:
+                connector = aiohttp.TCPConnector(limit=self.pool_size)
+                owner = True
+            else:
+                connector = self.connector
+                owner = False
+
+            self.session = aiohttp.ClientSession(
+                connector=connector, connector_owner=owner,
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+        return self.session
+
+    def _create_session(self):
+        # the aiohttp session must be created from within the event loop
+        # hence it's created lazily by :meth:`_get_session`
+        self.signature = CachedHmacSha1Signature()
+        self.session = None
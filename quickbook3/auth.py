@@ -4,8 +4,8 @@
 quickbook3.auth
 ~~~~~~~~~~~~~
 
-This module contains a quickbook authentication service that implements the
-OAuth 1.0/a auth flow using rauth.OAuth1Service
+This module contains the quickbook authentication services that implement the
+OAuth 1.0/a auth flow using rauth.OAuth1Service and the OAuth 2.0 auth flow.
 """
 
 
@@ -13,8 +13,18 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
+
+import requests
 from rauth import OAuth1Service
 
+from .exceptions import TokenError
+from .tokens import OAuth2Token
+
+try:
+    from urllib.parse import urlencode
+except ImportError:
+    from urllib import urlencode
+
 
 class QuickBookAuthService(object):
     """
@@ -147,3 +157,105 @@ class QuickBookAuthService(object):
             self.request_token, self.request_token_secret,
             data={'oauth_verifier': oauth_verifier})
 
+
+class QuickBookOAuth2Service(object):
+    """
+    A quickbook authentication service implementing the OAuth 2.0
+    authorization code flow. The user is first directed to the authorize
+    url::
+
+        service = QuickBookOAuth2Service(client_id='123',
+                                         client_secret='456',
+                                         redirect_uri='http://example.com/authorize')
+        authorize_url = service.get_authorize_url(state='csrf token')
+
+    Quickbooks then redirects the user to the redirect uri with the `code`,
+    `state` and `realmId` querystring parameters, the code being exchanged
+    for an :class:`~quickbook3.tokens.OAuth2Token`::
+
+        token = service.get_tokens(code, realm=realm_id)
+
+    An access token is valid for an hour and is refreshed with the refresh
+    token, usually by a :class:`~quickbook3.tokens.TokenManager`::
+
+        token = service.refresh(token)
+    """
+
+    authorize_url = "https://appcenter.intuit.com/connect/oauth2"
+    token_url = "https://oauth.platform.intuit.com/oauth2/v1/tokens/bearer"
+
+    ACCOUNTING_SCOPE = 'com.intuit.quickbooks.accounting'
+
+    def __init__(self, client_id, client_secret, redirect_uri=None,
+                 scope=ACCOUNTING_SCOPE, token_url=None, timeout=30):
+        """
+        :param client_id: Client id of the application.
+        :type client_id: str
+        :param client_secret: Client secret of the application.
+        :type client_secret: str
+        :param redirect_uri: Redirect uri where quickbooks must redirect after
+            authorization, only needed to obtain the first tokens.
+        :type redirect_uri: str
+        :param scope: Space separated scopes requested, defaults to the
+            accounting scope.
+        :type scope: str
+        :param token_url: Url of the token endpoint, defaults to
+            :attr:`token_url`.
+        :type token_url: str
+        """
+
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.redirect_uri = redirect_uri
+        self.scope = scope
+        self.timeout = timeout
+        if token_url is not None:
+            self.token_url = token_url
+        self.session = requests.Session()
+
+    def get_authorize_url(self, state):
+        """
+        Returns the url where the user authorizes the application.
+        """
+
+        return '%s?%s' % (self.authorize_url, urlencode([
+            ('client_id', self.client_id), ('response_type', 'code'),
+            ('scope', self.scope), ('redirect_uri', self.redirect_uri),
+            ('state', state)]))
+
+    def get_tokens(self, code, realm=None):
+        """
+        Exchanges the authorization `code` for a token.
+        """
+
+        return self._request_token(realm, grant_type='authorization_code',
+                                   code=code, redirect_uri=self.redirect_uri)
+
+    def refresh(self, token):
+        """
+        Returns a new token obtained with the refresh token of `token`. The
+        refresh token may itself have been renewed, the previous one must
+        then no longer be used.
+        """
+
+        return self._request_token(token.realm, grant_type='refresh_token',
+                                   refresh_token=token.refresh_token)
+
+    def _request_token(self, realm, **data):
+        response = self.session.post(self.token_url, data=data,
+                                     auth=(self.client_id,
+                                           self.client_secret),
+                                     headers={'Accept': 'application/json'},
+                                     timeout=self.timeout)
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+
+        if response.status_code != requests.codes.ok or \
+                'access_token' not in body:
+            raise TokenError(body.get('error', response.reason),
+                             body.get('error_description'),
+                             response.status_code)
+
+        return OAuth2Token.from_response(body, realm)
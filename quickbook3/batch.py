@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+"""
+quickbook3.batch
+~~~~~~~~~~~~~~~~
+
+This module contains :class:`Batch` that packs several create, update,
+delete and query operations into requests against the quickbooks batch
+endpoint.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .exceptions import InvalidBatchError, InvalidResourceError, \
+    QuickBooksError
+from .models import as_dict
+from .response import BatchResponse
+
+
+class Batch(object):
+    """
+    Accumulates operations and submits them to the batch endpoint in chunks
+    of at most :attr:`MAX_BATCH_SIZE` items, several chunks at a time::
+
+        batch = client.batch()
+        batch.create('Customer', {'DisplayName': 'Jane'}, bid='jane')
+        batch.delete('Invoice', {'Id': '12', 'SyncToken': '3'}, bid='inv-12')
+        batch.query(QueryBuilder('Item').where('Active').equals(True))
+        response = batch.execute()
+
+        jane = response['jane']
+
+    The resource name is used as is for the key of the entity in the
+    request payload, so it must be spelled as quickbooks does (`Customer`).
+    Operations are identified by a batch id (`bId`) which defaults to the
+    position of the operation in the batch. Faults are reported per item, see
+    :class:`~quickbook3.response.BatchResponse`. The updated and deleted
+    entities are dropped from the client caches, as are the cached
+    responses of the resources written.
+    """
+
+    MAX_BATCH_SIZE = 30
+
+    def __init__(self, client, workers=4):
+        """
+        :param client: Client used to send the batch requests.
+        :type client: :class:`~quickbook3.quickbook.QuickBooks`
+        :param workers: Number of chunks submitted concurrently, defaults to
+            `4`.
+        :type workers: int
+        """
+
+        self.client = client
+        self.workers = workers
+        self.items = []
+        self.bids = set()
+        self.entities = {}
+
+    def create(self, resource, resource_dict, bid=None):
+        return self._add_entity_operation('create', resource, resource_dict,
+                                          bid)
+
+    def update(self, resource, resource_dict, bid=None):
+        return self._add_entity_operation('update', resource, resource_dict,
+                                          bid)
+
+    def delete(self, resource, resource_dict, bid=None):
+        return self._add_entity_operation('delete', resource, resource_dict,
+                                          bid)
+
+    def query(self, querybuilder, bid=None):
+        bid = self._get_bid(bid)
+        self.entities[bid] = querybuilder.get_entity()
+        self.items.append({'bId': bid, 'Query': querybuilder.build()})
+        return bid
+
+    def _add_entity_operation(self, operation, resource, resource_dict, bid):
+        if resource.lower() not in self.client.ACCOUNTING_SERVICES:
+            raise InvalidResourceError
+
+        bid = self._get_bid(bid)
+        self.items.append({'bId': bid, 'operation': operation,
+                           resource: as_dict(resource_dict)})
+        return bid
+
+    def _get_bid(self, bid):
+        bid = str(len(self.items)) if bid is None else str(bid)
+        if bid in self.bids:
+            raise InvalidBatchError("Duplicate batch id %s" % bid)
+        self.bids.add(bid)
+        return bid
+
+    def chunks(self):
+        return [self.items[i:i + self.MAX_BATCH_SIZE]
+                for i in range(0, len(self.items), self.MAX_BATCH_SIZE)]
+
+    def execute(self):
+        """
+        Submits all the operations and returns a
+        :class:`~quickbook3.response.BatchResponse`. A chunk that fails as a
+        whole (e.g. with an authentication error) records that error as the
+        fault of each of its items.
+        """
+
+        batch_response = BatchResponse(self.entities)
+        chunks = self.chunks()
+        if not chunks:
+            return batch_response
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self._submit, chunk)
+                       for chunk in chunks]
+
+            for chunk, future in zip(chunks, futures):
+                try:
+                    batch_response.add_items(future.result())
+                except QuickBooksError as e:
+                    for item in chunk:
+                        batch_response.add_fault(item['bId'], e)
+
+        return batch_response
+
+    def _submit(self, chunk):
+        url = "/".join([self.client.base_url_v3, 'company',
+                        self.client.company_id, 'batch'])
+        try:
+            response = self.client._execute(
+                method='post', url=url, params={},
+                json={'BatchItemRequest': chunk})
+        finally:
+            # even a failed chunk may have been partly processed
+            self._invalidate(chunk)
+        return response['BatchItemResponse']
+
+    def _invalidate(self, chunk):
+        resources = set()
+        for item in chunk:
+            if 'operation' not in item:
+                continue
+            resource = next(key for key in item
+                            if key not in ('bId', 'operation'))
+            resources.add(resource)
+            self.client._uncache_entity(resource, item[resource].get('Id'))
+
+        for resource in resources:
+            self.client._invalidate_responses(resource)
+
+    def __len__(self):
+        return len(self.items)
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+
+"""
+quickbook3.cache
+~~~~~~~~~~~~~~~~
+
+This module contains the helpers of the entity caches consulted by
+:meth:`~quickbook3.quickbook.QuickBooks.read`, whose backends are in
+:mod:`quickbook3.lru`, and the on-disk cache of the responses of reports
+and queries, :class:`SQLiteResponseCache`.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+try:
+    from urllib.parse import urlencode
+except ImportError:
+    from urllib import urlencode
+
+
+def cache_key(realm, resource, resource_id):
+    """
+    Returns the key under which an entity is cached.
+    """
+
+    return '%s/%s/%s' % (realm, resource.lower(), resource_id)
+
+
+def response_key(realm, url, params=None):
+    """
+    Returns the key under which a response is cached: the realm, the url and
+    the parameters sorted by name, those set to `None` being left out as
+    they are not sent.
+    """
+
+    params = sorted((name, value) for name, value in (params or {}).items()
+                    if value is not None)
+    return '%s %s?%s' % (realm, url.rstrip('/'), urlencode(params))
+
+
+def sync_token(entity):
+    """
+    Returns the `SyncToken` of an entity as an int, `-1` if it has none.
+    """
+
+    try:
+        return int(entity.get('SyncToken'))
+    except (TypeError, ValueError):
+        return -1
+
+
+class Revalidation(object):
+    """
+    The outcome of :meth:`~quickbook3.quickbook.QuickBooks.revalidate`: the
+    ids of the cached entities found `fresh`, those `refreshed` as they had
+    changed and those `deleted` from the cache as they no longer exist.
+    """
+
+    def __init__(self):
+        self.fresh = []
+        self.refreshed = []
+        self.deleted = []
+
+    def __repr__(self):
+        return "Fresh: %d, Refreshed: %d, Deleted: %d" % (
+            len(self.fresh), len(self.refreshed), len(self.deleted))
+
+
+class SQLiteResponseCache(object):
+    """
+    A cache of the responses of :meth:`~quickbook3.quickbook.QuickBooks.report`
+    and of the queries run with ``cached=True`` by
+    :meth:`~quickbook3.quickbook.QuickBooks.query`, kept in a sqlite
+    database, so that it survives restarts and is shared by the processes
+    using the same file::
+
+        cache = SQLiteResponseCache('responses.db', ttls={
+            'reports': 3600, 'reports/profitandloss': closed_periods_only,
+            'account': 86400, 'taxcode': 86400})
+        client = QuickBooks(realm_id, ..., response_cache=cache)
+        accounts = client.query(QueryBuilder('Account'), cached=True)
+
+    The other queries, those of the paginations, revalidations and
+    :meth:`~quickbook3.quickbook.QuickBooks.read_many` among them, always
+    reach quickbooks. Only the responses of the resources with a time to
+    live in `ttls` (or `default_ttl`) are cached. Resources are the
+    lowercased entity of a query, ``reports/<name>`` for a report and
+    ``reports`` for every report without a ttl of its own. A ttl is a
+    number of seconds or a callable receiving the parameters of the request
+    and returning the number of seconds or `None` not to cache the
+    response, e.g. to only cache the reports of closed periods.
+
+    Responses are stored as compressed json. Once they take more than
+    `max_size` bytes, the least recently used are evicted. The cached
+    responses of a resource are invalidated when the client creates,
+    updates or deletes one of its entities. Hits, misses, evictions and
+    expirations of this instance are counted, see :meth:`stats`.
+    """
+
+    DEFAULT_PATH = 'quickbook3-responses.db'
+
+    def __init__(self, path=DEFAULT_PATH, ttls=None, default_ttl=None,
+                 max_size=64 * 1024 * 1024, compress_level=6,
+                 timer=time.time):
+        """
+        :param path: Path of the sqlite database, created if missing,
+            defaults to :attr:`DEFAULT_PATH` in the working directory.
+        :type path: str
+        :param ttls: Time to live of the responses of each resource.
+        :type ttls: dict
+        :param default_ttl: Time to live of the responses of the other
+            resources, defaults to `None` meaning they are not cached.
+        :param max_size: Maximum size of the compressed responses in bytes,
+            defaults to 64MiB.
+        :type max_size: int
+        :param compress_level: zlib compression level, defaults to `6`.
+        :type compress_level: int
+        :param timer: Callable returning the current time in seconds,
+            defaults to :func:`time.time`.
+        """
+
+        self.path = path
+        self.ttls = dict((resource.lower(), ttl)
+                         for resource, ttl in (ttls or {}).items())
+        self.default_ttl = default_ttl
+        self.max_size = max_size
+        self.compress_level = compress_level
+        self.timer = timer
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False,
+                                           timeout=30)
+        # readers don't block the writer of another process
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'key TEXT NOT NULL PRIMARY KEY, realm TEXT NOT NULL, '
+                'resource TEXT NOT NULL, expires_at REAL NOT NULL, '
+                'accessed_at REAL NOT NULL, size INTEGER NOT NULL, '
+                'value BLOB NOT NULL)')
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS responses_accessed_at '
+                'ON responses (accessed_at)')
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS responses_resource '
+                'ON responses (realm, resource)')
+
+    def ttl_for(self, resource, params=None):
+        """
+        Returns the time to live of a response of `resource` requested with
+        `params`, `None` if it is not to be cached.
+        """
+
+        resource = resource.lower()
+        ttl = self.ttls.get(resource)
+        if ttl is None and '/' in resource:
+            ttl = self.ttls.get(resource.split('/', 1)[0])
+        if ttl is None:
+            ttl = self.default_ttl
+        if callable(ttl):
+            ttl = ttl(params or {})
+        return ttl
+
+    def get(self, key):
+        """
+        Returns the response cached under `key` or `None`.
+        """
+
+        now = self.timer()
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT expires_at, value FROM responses WHERE key = ?',
+                (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = row
+            with self._connection:
+                if expires_at <= now:
+                    self._connection.execute(
+                        'DELETE FROM responses WHERE key = ? '
+                        'AND expires_at <= ?', (key, now))
+                    self.expirations += 1
+                    self.misses += 1
+                    return None
+                self._connection.execute(
+                    'UPDATE responses SET accessed_at = ? WHERE key = ?',
+                    (now, key))
+            self.hits += 1
+        return json.loads(zlib.decompress(value).decode('utf-8'))
+
+    def set(self, key, realm, resource, value, ttl):
+        """
+        Caches `value`, a response of `resource` in `realm`, under `key` for
+        `ttl` seconds.
+        """
+
+        value = zlib.compress(json.dumps(value, separators=(',', ':'))
+                              .encode('utf-8'), self.compress_level)
+        now = self.timer()
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO responses (key, realm, resource, '
+                'expires_at, accessed_at, size, value) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, realm, resource.lower(), now + ttl, now, len(value),
+                 sqlite3.Binary(value)))
+            self._evict(now)
+
+    def invalidate(self, realm, resource):
+        """
+        Deletes the cached responses of `resource` in `realm`.
+        """
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                'DELETE FROM responses WHERE realm = ? AND resource = ?',
+                (realm, resource.lower()))
+
+    def delete(self, key):
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM responses WHERE key = ?',
+                                     (key,))
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM responses')
+
+    def size(self):
+        """
+        Returns the size of the cached responses in bytes.
+        """
+
+        with self._lock:
+            return self._size()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions,
+                    'expirations': self.expirations,
+                    'size': self._size(),
+                    'count': self._connection.execute(
+                        'SELECT COUNT(*) FROM responses').fetchone()[0]}
+
+    def close(self):
+        self._connection.close()
+
+    def _size(self):
+        return self._connection.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def _evict(self, now):
+        self.expirations += self._connection.execute(
+            'DELETE FROM responses WHERE expires_at <= ?', (now,)).rowcount
+
+        excess = self._size() - self.max_size
+        if excess <= 0:
+            return
+        for key, size in self._connection.execute(
+                'SELECT key, size FROM responses '
+                'ORDER BY accessed_at').fetchall():
+            self._connection.execute('DELETE FROM responses WHERE key = ?',
+                                     (key,))
+            self.evictions += 1
+            excess -= size
+            if excess <= 0:
+                return
+
+    def __repr__(self):
+        return "SQLiteResponseCache: Path: %s, Hits: %d, Misses: %d" % (
+            self.path, self.hits, self.misses)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+"""
+quickbook3.coalesce
+~~~~~~~~~~~~~~~~~~~
+
+This module contains :class:`SingleFlight`, which coalesces the identical
+requests sent concurrently by the threads of a process into one.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import copy
+import threading
+
+
+class _Flight(object):
+
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight(object):
+    """
+    Runs a single call at a time per key: the threads calling :meth:`do`
+    with a key whose call is in flight wait for it and share its result, or
+    its exception, instead of calling again. Passed to the clients, usually
+    shared by those of all realms, it coalesces their identical concurrent
+    get requests::
+
+        single_flight = SingleFlight()
+        client = QuickBooks(realm_id, ..., single_flight=single_flight)
+
+    Every caller sharing a result gets its own deep copy of it, which it is
+    free to mutate. Calls are counted, those sharing the result of another
+    one being `coalesced`, see :meth:`stats`.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function):
+        """
+        Returns `(result, shared)`: the result of `function()`, or a copy
+        of the one of the call in flight for `key`, and whether it was
+        shared with other callers.
+        """
+
+        with self._lock:
+            self.calls += 1
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                leader = True
+            else:
+                flight.waiters += 1
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result), True
+
+        try:
+            flight.result = function()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            # no caller joins the flight once it is removed
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        if flight.waiters:
+            # the waiters copy the result, it is kept untouched for them
+            return copy.deepcopy(flight.result), True
+        return flight.result, False
+
+    def stats(self):
+        with self._lock:
+            return {'calls': self.calls, 'coalesced': self.coalesced,
+                    'in_flight': len(self._flights)}
+
+    def __repr__(self):
+        return "SingleFlight: Calls: %d, Coalesced: %d" % (self.calls,
+                                                           self.coalesced)
@@ -24,6 +24,9 @@ class MissingCredentialsException(QuickBooksError):
             .__init__("All of consumer key, consumer secret "
                       "access token and access secret must be passed")
 
+    def __reduce__(self):
+        return self.__class__, ()
+
 
 class InvalidResourceError(QuickBooksError):
     """
@@ -39,6 +42,13 @@ class InvalidQueryError(QuickBooksError):
     pass
 
 
+class InvalidBatchError(QuickBooksError):
+    """
+    Raised while adding an invalid operation to a batch
+    """
+    pass
+
+
 class HttpQuickBookError(QuickBooksError):
     """
     A base exception for http=related errors returned from quickbooks
@@ -92,15 +102,34 @@ class ServiceUnavailable(HttpQuickBookError):
         super(ServiceUnavailable, self).__init__('Service Unavailable')
 
 
+class ThrottleError(HttpQuickBookError):
+    """
+    Raised when quickbooks throttles the requests made to a realm.
+    Corresponding to http status code 429. `retry_after` holds the seconds
+    to wait before retrying when quickbooks tells it.
+    """
+    def __init__(self, reason=None, retry_after=None):
+        self.retry_after = retry_after
+        super(ThrottleError, self).__init__('Too Many Requests')
+
+    def __reduce__(self):
+        return self.__class__, (None, self.retry_after)
+
+
 class UnknownError(HttpQuickBookError):
     """
     Raised corresponding to all other http error codes
     """
 
     def __init__(self, status_code, error):
+        self.status_code = status_code
+        self.error = error
         super(UnknownError, self).__init__(
             "Status Code: %d. Reason: %s" % (status_code, error))
 
+    def __reduce__(self):
+        return self.__class__, (self.status_code, self.error)
+
 
 class GenericError(HttpQuickBookError):
     """
@@ -115,6 +144,9 @@ class GenericError(HttpQuickBookError):
 
         super(GenericError, self).__init__(error_message)
 
+    def __reduce__(self):
+        return self.__class__, (self.errors,)
+
 
 class ValidationFault(GenericError):
     """
@@ -136,3 +168,24 @@ class DisconnectionError(HttpQuickBookError):
         self.error_code = error_code
         self.error_message = error_message
         super(DisconnectionError, self).__init__(error_message)
+
+    def __reduce__(self):
+        return self.__class__, (self.error_code, self.error_message)
+
+
+class TokenError(QuickBooksError):
+    """
+    Raised when the OAuth2 token endpoint refuses to issue or refresh a
+    token, e.g. with `invalid_grant` once a refresh token has expired.
+    """
+
+    def __init__(self, error, description=None, status_code=None):
+        self.error = error
+        self.description = description
+        self.status_code = status_code
+        super(TokenError, self).__init__(
+            '%s: %s' % (error, description) if description else error)
+
+    def __reduce__(self):
+        return self.__class__, (self.error, self.description,
+                                self.status_code)
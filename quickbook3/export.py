@@ -0,0 +1,440 @@
+# -*- coding: utf-8 -*-
+
+"""
+quickbook3.export
+~~~~~~~~~~~~~~~~~
+
+This module contains :class:`Exporter` that writes the entities of a query,
+as yielded page by page by
+:meth:`~quickbook3.quickbook.QuickBooks.batch_query`, into tables: csv
+files, parquet files or in memory arrow tables::
+
+    with Exporter(ParquetSink('invoices.parquet'), explode='Line') as exporter:
+        exporter.export(client.batch_query(QueryBuilder('Invoice')))
+
+Entities are flattened into rows, see :class:`Flattener`, that are buffered
+and flushed to the sink by column every `chunk_size` rows, so that memory is
+bounded whatever the number of entities. A column first found in a later
+chunk is added to the table, the rows before it having no value.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from .models import model_for
+from .querybuilder import QueryBuilder
+
+
+class Flattener(object):
+    """
+    Flattens an entity into rows. Nested objects are flattened into columns
+    named by their path (`CustomerRef.value`). Lists are kept as a json
+    column, except the `explode` list (`Line`) whose items each give a row,
+    the columns of the entity being repeated on each.
+    """
+
+    def __init__(self, explode=None, separator='.'):
+        """
+        :param explode: Name of a list field whose items are flattened into
+            one row each, defaults to `None`.
+        :type explode: str
+        :param separator: Separator of the parts of a column name, defaults
+            to `'.'`.
+        :type separator: str
+        """
+
+        self.explode = explode
+        self.separator = separator
+
+    def rows(self, obj):
+        """
+        Returns the rows of `obj`, a list of dicts.
+        """
+
+        row = {}
+        items = None
+        for key, value in obj.items():
+            if key == self.explode and isinstance(value, list):
+                items = value
+            else:
+                self._flatten(key, value, row)
+
+        if not items:
+            return [row]
+
+        rows = []
+        for item in items:
+            item_row = dict(row)
+            self._flatten(self.explode, item, item_row)
+            rows.append(item_row)
+        return rows
+
+    def _flatten(self, name, value, row):
+        if isinstance(value, dict):
+            for key, child in value.items():
+                self._flatten(name + self.separator + key, child, row)
+        elif isinstance(value, list):
+            row[name] = json.dumps(value, sort_keys=True)
+        else:
+            row[name] = value
+
+
+class BaseSink(object):
+    """
+    Interface of the sinks written to by an :class:`Exporter`. A chunk is
+    written as a dict of a list of values per column. The columns of a chunk
+    are those of the previous one, in the same order, possibly followed by
+    new ones, which the previous rows don't have.
+    """
+
+    def write(self, columns, data):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class CSVSink(BaseSink):
+    """
+    Writes a csv file, its first line being the names of the columns.
+    Missing values are written as empty strings. The columns being only
+    known once every chunk is written, the rows are spooled to a temporary
+    file and copied to the csv file on :meth:`close`.
+    """
+
+    def __init__(self, path_or_file, **fmtparams):
+        """
+        :param path_or_file: Path of the file, or a text file object.
+        :param fmtparams: Formatting parameters of :func:`csv.writer`.
+        """
+
+        if hasattr(path_or_file, 'write'):
+            self.file = path_or_file
+            self.owned = False
+        else:
+            self.file = io.open(path_or_file, 'w', newline='',
+                                encoding='utf-8')
+            self.owned = True
+        self.fmtparams = fmtparams
+        self.columns = []
+        # a json list of values per row, json keeping their types
+        self.spool = tempfile.TemporaryFile(mode='w+')
+
+    def write(self, columns, data):
+        self.columns = list(columns)
+        values = [data[column] for column in columns]
+        for row in zip(*values):
+            self.spool.write(json.dumps(row) + '\n')
+
+    def close(self):
+        try:
+            writer = csv.writer(self.file, **self.fmtparams)
+            writer.writerow(self.columns)
+            self.spool.seek(0)
+            for line in self.spool:
+                row = json.loads(line)
+                row.extend([None] * (len(self.columns) - len(row)))
+                writer.writerow(['' if value is None else value
+                                 for value in row])
+        finally:
+            self.spool.close()
+            if self.owned:
+                self.file.close()
+
+
+class ArrowSink(BaseSink):
+    """
+    Converts the chunks into arrow record batches, collected in
+    :attr:`batches` and returned as one table by :meth:`table`.
+
+    The type of a column is inferred from the values of each chunk, then
+    unified across the chunks: integer columns are widened to floats, as
+    quickbooks does not tell `1` from `1.0`, columns without values in a
+    chunk take the type of the other chunks, or strings if they have none,
+    and columns of different types in different chunks become strings.
+    Requires the pyarrow package (``pip install quickbooks-py[export]``).
+    """
+
+    def __init__(self):
+        if pyarrow is None:
+            raise ImportError("Arrow and parquet exports require pyarrow")
+
+        self.batches = []
+
+    @property
+    def schema(self):
+        """
+        The schema of the table, unified across the chunks written so far,
+        `None` before the first.
+        """
+
+        if not self.batches:
+            return None
+        return self.unify_schemas([batch.schema for batch in self.batches])
+
+    def to_batch(self, columns, data):
+        schema = self.infer_schema(columns, data)
+        return pyarrow.RecordBatch.from_arrays(
+            [pyarrow.array(data[column], type=field.type)
+             for column, field in zip(columns, schema)], schema=schema)
+
+    def infer_schema(self, columns, data):
+        fields = []
+        for column in columns:
+            type_ = pyarrow.array(data[column]).type
+            if pyarrow.types.is_integer(type_):
+                type_ = pyarrow.float64()
+            fields.append(pyarrow.field(column, type_))
+        return pyarrow.schema(fields)
+
+    def unify_schemas(self, schemas):
+        types = OrderedDict()
+        for schema in schemas:
+            for field in schema:
+                types.setdefault(field.name, []).append(field.type)
+
+        fields = []
+        for name, column_types in types.items():
+            column_types = [type_ for type_ in column_types
+                            if not pyarrow.types.is_null(type_)]
+            if not column_types or \
+                    any(type_ != column_types[0] for type_ in column_types):
+                type_ = pyarrow.string()
+            else:
+                type_ = column_types[0]
+            fields.append(pyarrow.field(name, type_))
+        return pyarrow.schema(fields)
+
+    def conform(self, batch, schema):
+        """
+        Returns `batch`, a record batch or a table, as a table of `schema`,
+        its missing columns being null.
+        """
+
+        arrays = []
+        for field in schema:
+            index = batch.schema.get_field_index(field.name)
+            if index < 0:
+                arrays.append(pyarrow.nulls(batch.num_rows, field.type))
+            else:
+                arrays.append(batch.column(index).cast(field.type))
+        return pyarrow.Table.from_arrays(arrays, schema=schema)
+
+    def write(self, columns, data):
+        self.batches.append(self.to_batch(columns, data))
+
+    def table(self):
+        schema = self.schema
+        if schema is None:
+            return pyarrow.table({})
+        return pyarrow.concat_tables([self.conform(batch, schema)
+                                      for batch in self.batches])
+
+
+class ParquetSink(ArrowSink):
+    """
+    Writes a parquet file, each chunk being a row group. See
+    :class:`ArrowSink` for the schema. The schema being only known once
+    every chunk is written, the chunks are spooled to temporary parquet
+    files, then copied one at a time to the parquet file on :meth:`close`.
+    """
+
+    def __init__(self, path, **options):
+        """
+        :param path: Path of the file.
+        :param options: Options of :class:`pyarrow.parquet.ParquetWriter`,
+            such as `compression`.
+        """
+
+        super(ParquetSink, self).__init__()
+        self.path = path
+        self.options = options
+        self.schemas = []
+        self.directory = None
+
+    @property
+    def schema(self):
+        if not self.schemas:
+            return None
+        return self.unify_schemas(self.schemas)
+
+    def write(self, columns, data):
+        batch = self.to_batch(columns, data)
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix='quickbook3-')
+        pyarrow.parquet.write_table(
+            pyarrow.Table.from_batches([batch]),
+            os.path.join(self.directory, '%d.parquet' % len(self.schemas)))
+        self.schemas.append(batch.schema)
+
+    def close(self):
+        if self.directory is None:
+            return
+
+        try:
+            schema = self.schema
+            writer = pyarrow.parquet.ParquetWriter(self.path, schema,
+                                                   **self.options)
+            try:
+                for part in range(len(self.schemas)):
+                    table = pyarrow.parquet.read_table(os.path.join(
+                        self.directory, '%d.parquet' % part))
+                    writer.write_table(self.conform(table, schema))
+            finally:
+                writer.close()
+        finally:
+            shutil.rmtree(self.directory)
+            self.directory = None
+
+
+class Exporter(object):
+    """
+    Flattens entities into rows, buffered and flushed to a sink as columns
+    every `chunk_size` rows.
+
+    Unless given, the columns are those of the rows, in the order they
+    first appear; the columns first found in a later chunk are added after
+    those of the previous chunks.
+    """
+
+    def __init__(self, sink, columns=None, explode=None, chunk_size=10000,
+                 flattener=None):
+        """
+        :param sink: Sink written to.
+        :type sink: :class:`BaseSink`
+        :param columns: Columns exported, defaults to `None` meaning those
+            of the rows.
+        :type columns: list
+        :param explode: See :class:`Flattener`.
+        :param chunk_size: Number of rows buffered before being flushed,
+            defaults to `10000`.
+        :type chunk_size: int
+        :param flattener: Flattener of the entities, defaults to a
+            :class:`Flattener` exploding `explode`.
+        :type flattener: :class:`Flattener`
+        """
+
+        self.sink = sink
+        self.columns = list(columns) if columns is not None else []
+        self.fixed_columns = columns is not None
+        self.chunk_size = chunk_size
+        self.flattener = flattener or Flattener(explode=explode)
+        self.rows = []
+        self.row_count = 0
+
+    def write(self, objects):
+        """
+        Writes entities, flushing the buffer whenever full.
+        """
+
+        for obj in objects:
+            self.rows.extend(self.flattener.rows(obj))
+            if len(self.rows) >= self.chunk_size:
+                self.flush()
+
+    def export(self, query_responses):
+        """
+        Writes the entities of every query response, such as the pages
+        yielded by :meth:`~quickbook3.quickbook.QuickBooks.batch_query`,
+        then flushes and closes the sink.
+        """
+
+        try:
+            for query_response in query_responses:
+                self.write(query_response)
+        finally:
+            self.close()
+        return self.row_count
+
+    def flush(self):
+        if not self.rows:
+            return
+
+        if not self.fixed_columns:
+            known = set(self.columns)
+            for row in self.rows:
+                for column in row:
+                    if column not in known:
+                        known.add(column)
+                        self.columns.append(column)
+
+        data = dict((column, [row.get(column) for row in self.rows])
+                    for column in self.columns)
+        self.sink.write(self.columns, data)
+        self.row_count += len(self.rows)
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        self.sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+SINKS = {
+    'csv': CSVSink,
+    'parquet': ParquetSink,
+}
+
+
+def export_query(client, querybuilder, sink, stream=False, **options):
+    """
+    Exports every entity matched by the query to `sink`, returning the
+    number of rows written. The querybuilder passed is not mutated.
+
+    :param stream: Whether the pages are streamed, see
+        :meth:`~quickbook3.quickbook.QuickBooks.batch_query`, defaults to
+        `False`.
+    :type stream: bool
+    :param options: Options of the :class:`Exporter`.
+    """
+
+    exporter = Exporter(sink, **options)
+    return exporter.export(client.batch_query(querybuilder.copy(),
+                                              stream=stream))
+
+
+def export_realm(client, directory, format='csv', resources=None,
+                 **options):
+    """
+    Exports every entity of the realm of `client`, one file per resource
+    named after it (`Invoice.csv`), returning the number of rows written
+    per resource.
+
+    :param format: Format of the files, `'csv'` or `'parquet'`, defaults to
+        `'csv'`.
+    :type format: str
+    :param resources: Resources exported, defaults to
+        :attr:`~quickbook3.quickbook.QuickBooks.ACCOUNTING_SERVICES`.
+    :type resources: list
+    :param options: Options of the :class:`Exporter`.
+    """
+
+    sink_class = SINKS[format]
+    counts = {}
+    for resource in resources or client.ACCOUNTING_SERVICES:
+        entity = model_for(resource).__name__
+        path = os.path.join(directory, '%s.%s' % (entity, format))
+        counts[entity] = export_query(client, QueryBuilder(entity),
+                                      sink_class(path), **options)
+    return counts
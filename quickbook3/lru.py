@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+"""
+quickbook3.lru
+~~~~~~~~~~~~~~
+
+This module contains the interface of the entity cache backends and
+:class:`LRUCache`, which also holds the compiled query templates. It is
+kept apart from :mod:`quickbook3.cache` and its sqlite, zlib and json
+imports, so that importing :class:`~quickbook3.querybuilder.QueryBuilder`
+stays cheap.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class BaseCache(object):
+    """
+    Interface of the cache backends. To plug an external store (memcached,
+    redis, ...) implement :meth:`get`, :meth:`set`, :meth:`delete` and
+    :meth:`clear`. Keys are strings built by
+    :func:`~quickbook3.cache.cache_key` and values are entity dicts.
+    """
+
+    def get(self, key):
+        """
+        Returns the value cached under `key` or `None`.
+        """
+        raise NotImplementedError
+
+    def peek(self, key):
+        """
+        Returns the value cached under `key` or `None`, without counting it
+        as a use of the value. Defaults to :meth:`get`.
+        """
+        return self.get(key)
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class LRUCache(BaseCache):
+    """
+    A thread-safe in-process cache holding at most `maxsize` values, the
+    least recently used being evicted first, each for at most `ttl` seconds.
+
+    Hits, misses, evictions (to make room) and expirations (of values older
+    than `ttl`) are counted, see :meth:`stats`. Cached values are returned
+    as is, the client copying the entities it caches and reads.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, timer=time.time):
+        """
+        :param maxsize: Maximum number of cached values, defaults to `1024`.
+        :type maxsize: int
+        :param ttl: Time to live of a value in seconds, defaults to `None`
+            meaning values never expire.
+        :type ttl: float
+        :param timer: Callable returning the current time in seconds,
+            defaults to :func:`time.time`.
+        """
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                expires_at, value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+
+            if expires_at is not None and expires_at <= self.timer():
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._data[key] = (expires_at, value)
+            self.hits += 1
+            return value
+
+    def peek(self, key):
+        with self._lock:
+            expires_at, value = self._data.get(key, (None, None))
+            if expires_at is not None and expires_at <= self.timer():
+                return None
+            return value
+
+    def set(self, key, value):
+        expires_at = self.timer() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (expires_at, value)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def keys(self):
+        with self._lock:
+            return list(self._data.keys())
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions,
+                    'expirations': self.expirations,
+                    'size': len(self._data)}
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return "LRUCache: Size: %d, Hits: %d, Misses: %d, Evictions: %d" % (
+            len(self._data), self.hits, self.misses, self.evictions)
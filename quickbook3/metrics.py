@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+
+"""
+quickbook3.metrics
+~~~~~~~~~~~~~~~~~~
+
+This module contains the instrumentation of the requests sent by
+:class:`~quickbook3.quickbook.QuickBooks` and the exporters of the recorded
+calls. Instrumentation is off unless exporters are passed to the client::
+
+    histogram = PrometheusExporter()
+    client = QuickBooks(company_id, metrics=[histogram, LoggingExporter()],
+                        **creds)
+    ...
+    print(histogram.render())
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import bisect
+import logging
+import re
+import threading
+import time
+
+timer = getattr(time, 'perf_counter', time.time)
+
+PHASES = ('sign', 'network', 'parse', 'duration')
+
+_FROM_RE = re.compile(r'\sfrom\s+(\w+)', re.IGNORECASE)
+
+
+def call_tags(url, method, params=None, json=None):
+    """
+    Returns the `(resource, operation)` of a request from its url and
+    arguments, e.g. `('customer', 'update')` or `('invoice', 'query')`.
+    """
+
+    params = params or {}
+    parts = url.split('/company/', 1)
+    if len(parts) < 2:
+        return None, url.rstrip('/').rsplit('/', 1)[-1]
+
+    path = parts[1].split('/')[1:]
+    endpoint = path[0] if path else None
+    if endpoint == 'query':
+        match = _FROM_RE.search(params.get('query', ''))
+        return (match.group(1).lower() if match else None), 'query'
+    elif endpoint == 'reports':
+        return (path[1] if len(path) > 1 else None), 'report'
+    elif endpoint == 'cdc':
+        return params.get('entities'), 'cdc'
+    elif endpoint == 'batch':
+        return None, 'batch'
+    elif method == 'get':
+        return endpoint, 'read'
+    elif params.get('operation') == 'delete':
+        return endpoint, 'delete'
+    elif json and 'Id' in json:
+        return endpoint, 'update'
+    return endpoint, 'create'
+
+
+class Call(object):
+    """
+    A request recorded by the instrumentation, retries included. Times are
+    in seconds and summed over the attempts: `sign_time` is spent signing
+    the request, `network_time` sending it and reading the response and
+    `parse_time` decoding it (only checking the status of a streamed
+    response), while `duration` also includes the waits for the rate
+    limiter and between retries. `status_code` is the one of the last
+    response and `error` the class name of the exception raised, if any.
+    A `coalesced` call sent no request but shared the response of an
+    identical one in flight, see :class:`~quickbook3.coalesce.SingleFlight`.
+    """
+
+    __slots__ = ('realm', 'resource', 'operation', 'method', 'status_code',
+                 'retries', 'sign_time', 'network_time', 'parse_time',
+                 'duration', 'request_bytes', 'response_bytes', 'error',
+                 'coalesced')
+
+    def __init__(self, realm, method, resource=None, operation=None):
+        self.realm = realm
+        self.resource = resource
+        self.operation = operation
+        self.method = method
+        self.status_code = None
+        self.retries = 0
+        self.sign_time = 0.0
+        self.network_time = 0.0
+        self.parse_time = 0.0
+        self.duration = 0.0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.error = None
+        self.coalesced = False
+
+    @property
+    def tags(self):
+        return self.realm, self.resource, self.operation
+
+    def record_response(self, response, elapsed, sign_time, stream=False):
+        self.status_code = response.status_code
+        self.sign_time += sign_time
+        self.network_time += elapsed - sign_time
+
+        request = getattr(response, 'request', None)
+        body = getattr(request, 'body', None)
+        if body:
+            self.request_bytes += len(body)
+
+        length = response.headers.get('Content-Length')
+        if length is not None:
+            self.response_bytes += int(length)
+        elif not stream:
+            self.response_bytes += len(response.content or b'')
+
+    def __repr__(self):
+        return "%s %s %s: %s in %.3fs" % (self.realm, self.operation,
+                                          self.resource, self.status_code,
+                                          self.duration)
+
+
+class TimedSignature(object):
+    """
+    Wraps the signature of a :class:`rauth.OAuth1Session` to time the
+    signing of the requests of each thread.
+    """
+
+    def __init__(self, signature):
+        self.signature = signature
+        self._local = threading.local()
+
+    def sign(self, *args, **kwargs):
+        started = timer()
+        try:
+            return self.signature.sign(*args, **kwargs)
+        finally:
+            self._local.elapsed = timer() - started
+
+    def pop_elapsed(self):
+        elapsed = getattr(self._local, 'elapsed', 0.0)
+        self._local.elapsed = 0.0
+        return elapsed
+
+    def __getattr__(self, name):
+        return getattr(self.signature, name)
+
+
+class BaseExporter(object):
+    """
+    Interface of the exporters, which receive every :class:`Call` once it
+    is complete. :meth:`record` is called from the threads sending the
+    requests and must be thread-safe.
+    """
+
+    def record(self, call):
+        raise NotImplementedError
+
+
+class LoggingExporter(BaseExporter):
+    """
+    Logs a line per call.
+    """
+
+    def __init__(self, logger=None, level=logging.DEBUG):
+        self.logger = logger or logging.getLogger('quickbook3.metrics')
+        self.level = level
+
+    def record(self, call):
+        if not self.logger.isEnabledFor(self.level):
+            return
+
+        self.logger.log(self.level,
+                        "%s %s %s status=%s retries=%d sign=%.4f "
+                        "network=%.4f parse=%.4f duration=%.4f sent=%d "
+                        "received=%d error=%s coalesced=%s", call.realm,
+                        call.operation, call.resource, call.status_code,
+                        call.retries, call.sign_time, call.network_time,
+                        call.parse_time, call.duration, call.request_bytes,
+                        call.response_bytes, call.error, call.coalesced)
+
+
+class Histogram(object):
+    """
+    Counts of observed values by upper bound `buckets`, the last bucket
+    being unbounded.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative_counts(self):
+        total, counts = 0, []
+        for count in self.counts:
+            total += count
+            counts.append(total)
+        return counts
+
+
+class CallStats(object):
+    """
+    Aggregates of the calls with the same tags: a :class:`Histogram` per
+    phase, the bytes transferred, the retries, the number of calls per
+    status code (`None` for calls failing without response) and the number
+    of coalesced calls, which have no status code of their own.
+    """
+
+    def __init__(self, buckets):
+        self.histograms = dict((phase, Histogram(buckets))
+                               for phase in PHASES)
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.retries = 0
+        self.status_codes = {}
+        self.coalesced = 0
+
+    def add(self, call):
+        histograms = self.histograms
+        histograms['sign'].observe(call.sign_time)
+        histograms['network'].observe(call.network_time)
+        histograms['parse'].observe(call.parse_time)
+        histograms['duration'].observe(call.duration)
+        self.request_bytes += call.request_bytes
+        self.response_bytes += call.response_bytes
+        self.retries += call.retries
+        if call.coalesced:
+            self.coalesced += 1
+            return
+        self.status_codes[call.status_code] = \
+            self.status_codes.get(call.status_code, 0) + 1
+
+    @property
+    def count(self):
+        return self.histograms['duration'].count
+
+
+class HistogramExporter(BaseExporter):
+    """
+    Aggregates the calls in memory into :class:`CallStats` keyed by
+    `(realm, resource, operation)`.
+    """
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5,
+                       10)
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, call):
+        with self._lock:
+            stats = self.stats.get(call.tags)
+            if stats is None:
+                stats = self.stats[call.tags] = CallStats(self.buckets)
+            stats.add(call)
+
+    def get(self, realm, resource, operation):
+        return self.stats.get((realm, resource, operation))
+
+    def reset(self):
+        with self._lock:
+            self.stats = {}
+
+
+class PrometheusExporter(HistogramExporter):
+    """
+    A :class:`HistogramExporter` rendering its stats in the Prometheus text
+    exposition format, to be served by a metrics endpoint.
+    """
+
+    def __init__(self, buckets=HistogramExporter.DEFAULT_BUCKETS,
+                 prefix='quickbooks'):
+        super(PrometheusExporter, self).__init__(buckets)
+        self.prefix = prefix
+
+    def render(self):
+        with self._lock:
+            stats = sorted(self.stats.items(),
+                           key=lambda item: tuple(str(tag)
+                                                  for tag in item[0]))
+            lines = []
+            for phase in PHASES:
+                name = '%s_%s_seconds' % (self.prefix, phase)
+                lines.append('# TYPE %s histogram' % name)
+                for tags, call_stats in stats:
+                    lines.extend(self._histogram_lines(
+                        name, self._labels(tags),
+                        call_stats.histograms[phase]))
+
+            for metric, attr in (('request_bytes', 'request_bytes'),
+                                 ('response_bytes', 'response_bytes'),
+                                 ('retries', 'retries'),
+                                 ('coalesced', 'coalesced')):
+                name = '%s_%s_total' % (self.prefix, metric)
+                lines.append('# TYPE %s counter' % name)
+                for tags, call_stats in stats:
+                    lines.append('%s{%s} %d' % (name, self._labels(tags),
+                                                getattr(call_stats, attr)))
+
+            name = '%s_responses_total' % self.prefix
+            lines.append('# TYPE %s counter' % name)
+            for tags, call_stats in stats:
+                for status_code, count in sorted(
+                        call_stats.status_codes.items(),
+                        key=lambda item: str(item[0])):
+                    labels = self._labels(tags, status=status_code or 'none')
+                    lines.append('%s{%s} %d' % (name, labels, count))
+
+        return '\n'.join(lines) + '\n'
+
+    def _histogram_lines(self, name, labels, histogram):
+        bounds = ['%g' % bound for bound in histogram.buckets] + ['+Inf']
+        lines = ['%s_bucket{%s,le="%s"} %d' % (name, labels, bound, count)
+                 for bound, count in zip(bounds,
+                                         histogram.cumulative_counts())]
+        lines.append('%s_sum{%s} %.6f' % (name, labels, histogram.sum))
+        lines.append('%s_count{%s} %d' % (name, labels, histogram.count))
+        return lines
+
+    def _labels(self, tags, **extra):
+        labels = list(zip(('realm', 'resource', 'operation'), tags))
+        labels.extend(sorted(extra.items()))
+        return ','.join('%s="%s"' % (key, self._escape(value))
+                        for key, value in labels)
+
+    def _escape(self, value):
+        if value is None:
+            return ''
+        return str(value).replace('\\', '\\\\').replace('"', '\\"')\
+            .replace('\n', '\\n')
@@ -0,0 +1,441 @@
+# -*- coding: utf-8 -*-
+
+"""
+quickbook3.mirror
+~~~~~~~~~~~~~~~~~
+
+This module contains :class:`SQLiteMirror`, a local copy of the entities of
+a realm kept fresh with the change data capture endpoint, on which the
+queries of :class:`~quickbook3.querybuilder.QueryBuilder` run without
+calling quickbooks.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import datetime
+import json
+import logging
+import re
+import sqlite3
+import threading
+
+from .exceptions import InvalidQueryError
+from .models import model_for
+from .querybuilder import BoundQuery, string_types
+from .response import QueryResponse
+from .sync import CDCSyncer, SQLiteWatermarkStore
+
+logger = logging.getLogger(__name__)
+
+_COLUMN_RE = re.compile(r'^\w+(\.\w+)*$')
+
+_FILTER_RE = re.compile(r"^\s*([\w.]+)\s+(>=|<=|=|>|<|in|like)\s+(.+?)\s*$",
+                        re.IGNORECASE)
+
+_LITERAL_RE = re.compile(r"\s*(?:'((?:[^'\\]|\\.)*)'|(true|false)|"
+                         r"([-+]?[\d.]+))\s*(,|$)", re.IGNORECASE)
+
+_DATETIME_RE = re.compile(r'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}')
+
+
+def parse_filter(text):
+    """
+    Parses a filter of a where clause, as passed to
+    :meth:`~quickbook3.querybuilder.QueryBuilder.set_filters`, into a
+    `(column, operator, value)` clause.
+    """
+
+    match = _FILTER_RE.match(text)
+    if match is None:
+        raise InvalidQueryError("Unsupported filter: %s" % text)
+    column, op, literal = match.groups()
+    op = {'in': 'in', 'like': 'Like'}.get(op.lower(), op)
+
+    if op == 'in':
+        if not (literal.startswith('(') and literal.endswith(')')):
+            raise InvalidQueryError("Unsupported filter: %s" % text)
+        return column, op, _parse_literals(literal[1:-1], text)
+
+    values = _parse_literals(literal, text)
+    if len(values) != 1:
+        raise InvalidQueryError("Unsupported filter: %s" % text)
+    return column, op, values[0]
+
+
+def _parse_literals(text, filter_text):
+    values, position = [], 0
+    while position < len(text):
+        match = _LITERAL_RE.match(text, position)
+        if match is None:
+            raise InvalidQueryError("Unsupported filter: %s" % filter_text)
+        string, boolean, number = match.group(1, 2, 3)
+        if string is not None:
+            values.append(re.sub(r'\\(.)', r'\1', string))
+        elif boolean is not None:
+            values.append(boolean.lower() == 'true')
+        else:
+            values.append(number)
+        position = match.end()
+    return values
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class SQLiteMirror(object):
+    """
+    A copy of the entities of the realm of a client in a sqlite database,
+    answering the queries of :class:`~quickbook3.querybuilder.QueryBuilder`
+    (and :class:`~quickbook3.querybuilder.BoundQuery`) locally::
+
+        mirror = SQLiteMirror(client, 'realm.db')
+        mirror.sync()
+        customers = mirror.query(QueryBuilder('Customer')
+                                 .where('DisplayName').like('Jo%'))
+
+    The first :meth:`sync` reads every entity, the next ones only the
+    changes since the previous one, with a
+    :class:`~quickbook3.sync.CDCSyncer` whose watermarks are kept in the
+    same database. Once started, a background thread syncs the mirror
+    every `interval` seconds.
+
+    The entities are stored as json, the `where` clauses comparing their
+    fields as quickbooks does: dates and strings as text, amounts as
+    numbers, datetimes as points in time. The fields of :attr:`INDEXES`, and
+    those passed as `indexes`, are indexed, those of :attr:`DATETIMES` also
+    by their point in time so that the range filters on them use an index
+    whatever the offsets of the timestamps. Entities are returned ordered by
+    id, paginated as by quickbooks.
+    """
+
+    DEFAULT_PATH = 'quickbook3-mirror.db'
+
+    INDEXES = ('MetaData.LastUpdatedTime', 'Name', 'DisplayName',
+               'DocNumber', 'TxnDate', 'Active', 'CustomerRef.value',
+               'VendorRef.value')
+
+    DATETIMES = ('MetaData.CreateTime', 'MetaData.LastUpdatedTime')
+
+    def __init__(self, client, path=DEFAULT_PATH, resources=None,
+                 indexes=(), page_size=1000):
+        """
+        :param client: Client of the realm mirrored.
+        :type client: :class:`~quickbook3.quickbook.QuickBooks`
+        :param path: Path of the sqlite database, created if missing,
+            defaults to :attr:`DEFAULT_PATH` in the working directory.
+        :type path: str
+        :param resources: Resources mirrored, defaults to
+            :attr:`~quickbook3.quickbook.QuickBooks.ACCOUNTING_SERVICES`.
+        :type resources: list
+        :param indexes: Fields indexed on top of :attr:`INDEXES`, e.g.
+            `['PrimaryEmailAddr.Address']`.
+        :type indexes: list
+        :param page_size: Page size of the queries reading the entities,
+            defaults to `1000`.
+        :type page_size: int
+        """
+
+        self.client = client
+        self.path = path
+        self.entities = [model_for(resource).__name__
+                         for resource in resources or
+                         client.ACCOUNTING_SERVICES]
+        self.syncer = CDCSyncer(client, self.entities,
+                                store=SQLiteWatermarkStore(path),
+                                page_size=page_size)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._connection = sqlite3.connect(path, check_same_thread=False,
+                                           timeout=30)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS entities ('
+                'realm TEXT NOT NULL, entity TEXT NOT NULL, '
+                'id TEXT NOT NULL, number INTEGER, data TEXT NOT NULL, '
+                'PRIMARY KEY (realm, entity, id))')
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS entities_number '
+                'ON entities (realm, entity, number)')
+            for column in tuple(self.INDEXES) + tuple(indexes):
+                self._connection.execute(
+                    'CREATE INDEX IF NOT EXISTS "entities_%s" ON entities '
+                    '(realm, entity, %s)' % (column.replace('.', '_'),
+                                             self._field(column)))
+                if column in self.DATETIMES:
+                    self._connection.execute(
+                        'CREATE INDEX IF NOT EXISTS "entities_%s_moment" ON '
+                        'entities (realm, entity, %s)'
+                        % (column.replace('.', '_'),
+                           self._moment(self._field(column))))
+
+    @property
+    def realm(self):
+        return self.client.company_id
+
+    def sync(self):
+        """
+        Applies the changes of the mirrored entities since the previous sync
+        and returns the number of entities upserted or deleted per entity.
+        """
+
+        counts = dict((entity, 0) for entity in self.entities)
+        for batch in self.syncer.sync():
+            self.apply(batch.entity, batch.upsert, batch.delete)
+            counts[batch.entity] += len(batch.upsert) + len(batch.delete)
+        return counts
+
+    def load(self):
+        """
+        Reads every mirrored entity again, dropping those held, e.g. to drop
+        the entities deleted while the mirror was not synced for longer than
+        the change data capture endpoint goes back.
+        """
+
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM entities WHERE realm = ?',
+                                     (self.realm,))
+        self.syncer.reset()
+        return self.sync()
+
+    def apply(self, entity, upsert=(), delete=()):
+        """
+        Upserts the `upsert` objects of `entity` and deletes the `delete`
+        ones, as listed by a cdc response.
+        """
+
+        entity = entity.lower()
+        rows = []
+        for obj in upsert:
+            resource_id = '%s' % obj['Id']
+            rows.append((self.realm, entity, resource_id,
+                         int(resource_id) if resource_id.isdigit() else None,
+                         json.dumps(obj, separators=(',', ':'))))
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO entities (realm, entity, id, number, '
+                'data) VALUES (?, ?, ?, ?, ?)', rows)
+            self._connection.executemany(
+                'DELETE FROM entities WHERE realm = ? AND entity = ? '
+                'AND id = ?', [(self.realm, entity, '%s' % obj['Id'])
+                               for obj in delete])
+
+    def query(self, querybuilder):
+        """
+        Runs a query on the mirror. Returns a
+        :class:`~quickbook3.response.QueryResponse`, or the number of
+        entities of a count query, as
+        :meth:`~quickbook3.quickbook.QuickBooks.query` does.
+        """
+
+        entity = querybuilder.get_entity()
+        if isinstance(querybuilder, BoundQuery):
+            columns = querybuilder.template.columns
+            order = querybuilder.template.order
+            values = iter(querybuilder.values)
+            clauses = [(f[0], f[1], next(values)) if isinstance(f, tuple)
+                       else parse_filter(f)
+                       for f in querybuilder.template.filters]
+        else:
+            querybuilder._validate()
+            columns = querybuilder.get_columns()
+            order = querybuilder.get_order()
+            clauses = [clause if clause is not None else parse_filter(text)
+                       for clause, text in zip(querybuilder.clauses,
+                                               querybuilder.filters)]
+
+        where = ['realm = ?', 'entity = ?']
+        params = [self.realm, entity.lower()]
+        for column, op, value in clauses:
+            condition, condition_params = self._condition(column, op, value)
+            where.append(condition)
+            params.extend(condition_params)
+        where = ' AND '.join(where)
+
+        if querybuilder.is_count_query():
+            with self._lock:
+                return self._connection.execute(
+                    'SELECT COUNT(*) FROM entities WHERE %s' % where,
+                    params).fetchone()[0]
+
+        startposition = max(querybuilder.get_startposition(), 1)
+        maxresults = querybuilder.get_maxresults()
+        # a filtered query sorts its matches rather than scanning the
+        # entities in order, which the planner would otherwise prefer
+        order_by = '+number, id' if clauses else 'number, id'
+        if order:
+            column, _, direction = order.partition(' ')
+            if direction.upper() not in ('', 'ASC', 'DESC'):
+                raise InvalidQueryError("Invalid order: %s" % order)
+            order_by = '%s %s, %s' % (self._field_of(column, '>'),
+                                      direction.upper(), order_by)
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT data FROM entities WHERE %s ORDER BY %s '
+                'LIMIT ? OFFSET ?' % (where, order_by),
+                params + [maxresults, startposition - 1]).fetchall()
+
+        objects = [json.loads(row[0]) for row in rows]
+        if columns.strip() != '*':
+            fields = [column.strip().split('.', 1)[0]
+                      for column in columns.split(',')]
+            objects = [dict((field, obj[field]) for field in fields
+                            if field in obj) for obj in objects]
+        return QueryResponse(entity, {entity: objects,
+                                      'startPosition': startposition,
+                                      'maxResults': len(objects),
+                                      'totalCount': len(objects)})
+
+    def batch_query(self, querybuilder):
+        """
+        Yields the query responses of every page of the query, as
+        :meth:`~quickbook3.quickbook.QuickBooks.batch_query` does.
+        """
+
+        maxresults = querybuilder.get_maxresults()
+        querybuilder.offset(querybuilder.get_startposition())
+        while True:
+            query_response = self.query(querybuilder)
+            yield query_response
+            if query_response.total_count < maxresults:
+                return
+            querybuilder.offset(query_response.startposition + maxresults)
+
+    def count(self, entity=None):
+        """
+        Returns the number of entities held, of `entity` or of all of them.
+        """
+
+        sql, params = 'SELECT COUNT(*) FROM entities WHERE realm = ?', \
+            [self.realm]
+        if entity is not None:
+            sql += ' AND entity = ?'
+            params.append(entity.lower())
+        with self._lock:
+            return self._connection.execute(sql, params).fetchone()[0]
+
+    def start(self, interval=60):
+        """
+        Starts a background thread syncing the mirror every `interval`
+        seconds.
+        """
+
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run,
+                                            args=(interval,),
+                                            name='quickbook3-mirror')
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def close(self):
+        self.stop()
+        self.syncer.store.close()
+        self._connection.close()
+
+    def _run(self, interval):
+        while not self._stopped.is_set():
+            try:
+                self.sync()
+            except Exception:
+                logger.exception("Syncing the mirror of realm %s failed",
+                                 self.realm)
+            self._stopped.wait(interval)
+
+    def _field(self, column):
+        if not _COLUMN_RE.match(column):
+            raise InvalidQueryError("Invalid column: %s" % column)
+        # inlined rather than bound so that the indexes on it are used
+        return "json_extract(data, '$.%s')" % column
+
+    def _moment(self, field):
+        # the same expression in the indexes and the conditions, for the
+        # former to be used
+        return 'julianday(%s)' % field
+
+    def _condition(self, column, op, value):
+        if op == 'in':
+            if not isinstance(value, (list, tuple)) or not value:
+                raise InvalidQueryError("Contains operator requires at least "
+                                        "one value")
+            params = []
+            for item in value:
+                params.extend(self._equal_values(column, item))
+            return '%s IN (%s)' % (self._field_of(column, op),
+                                   ', '.join('?' * len(params))), params
+
+        if op == '=':
+            params = self._equal_values(column, value)
+            return '%s IN (%s)' % (self._field_of(column, op),
+                                   ', '.join('?' * len(params))), params
+
+        if op == 'Like':
+            if not isinstance(value, string_types):
+                raise InvalidQueryError("Like operator requires "
+                                        "value be of type string")
+            return '%s LIKE ?' % self._field_of(column, op), [value]
+
+        if op not in ('>', '>=', '<', '<='):
+            raise InvalidQueryError("Unsupported operator: %s" % op)
+
+        field = self._field_of(column, op)
+        if isinstance(value, datetime.datetime) or \
+                isinstance(value, string_types) and \
+                _DATETIME_RE.match(value):
+            if isinstance(value, datetime.datetime):
+                value = value.isoformat()
+            return '%s %s %s' % (self._moment(field), op,
+                                 self._moment('?')), [value]
+        if isinstance(value, datetime.date):
+            return '%s %s ?' % (field, op), [value.isoformat()]
+
+        number = _number(value)
+        if number is None:
+            raise InvalidQueryError("%s operator requires value of type "
+                                    "integer/float/date/datetime" % op)
+        return '%s %s ?' % (field, op), [number]
+
+    def _field_of(self, column, op):
+        if column == 'Id':
+            # ids are compared as numbers, and matched as strings
+            return 'number' if op in ('>', '>=', '<', '<=') else 'id'
+        return self._field(column)
+
+    def _equal_values(self, column, value):
+        if value is None:
+            value = ''
+        if isinstance(value, bool):
+            # json booleans are extracted as integers
+            return [int(value)]
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            return [value.isoformat()]
+
+        number = _number(value)
+        if column == 'Id' or number is None:
+            return ['%s' % (value,)]
+        # matches the field whether it holds a string or a number
+        return ['%s' % (value,), number]
+
+    def __repr__(self):
+        return "SQLiteMirror: Realm: %s, Path: %s" % (self.realm, self.path)
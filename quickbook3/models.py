@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+
+"""
+quickbook3.models
+~~~~~~~~~~~~~~~~~
+
+This module contains compact, typed models of the accounting entities, an
+alternative to the raw dicts returned by the client when many entities are
+held in memory::
+
+    invoices = [Invoice.from_dict(obj) for obj in query_response]
+    invoices[0].CustomerRef.value
+    client.update('invoice', invoices[0].to_dict())
+
+A model keeps its fields in ``__slots__`` instead of a per instance dict.
+Sub-objects (``Line``, ``MetaData``, ``...Ref``, addresses) are decoded into
+models on first access only. Fields the model does not declare are kept as
+is, so that :meth:`Model.to_dict` returns the dict the model was built from.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+
+class Nested(object):
+    """
+    Descriptor of a sub-object field, decoding the raw dict (or list of
+    dicts when `many`) stored in the slot `_<name>` on first access.
+    """
+
+    def __init__(self, name, model, many=False):
+        self.name = name
+        self.slot = '_' + name
+        self.model = model
+        self.many = many
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+
+        value = getattr(obj, self.slot, None)
+        if self.many:
+            if type(value) is list:
+                value = ModelList(self.decode(v) for v in value)
+                object.__setattr__(obj, self.slot, value)
+        elif isinstance(value, dict):
+            value = self.model.from_dict(value)
+            object.__setattr__(obj, self.slot, value)
+        return value
+
+    def __set__(self, obj, value):
+        object.__setattr__(obj, self.slot, value)
+
+    def __delete__(self, obj):
+        object.__delattr__(obj, self.slot)
+
+    def decode(self, value):
+        if isinstance(value, dict):
+            return self.model.from_dict(value)
+        return value
+
+
+class ModelList(list):
+    """
+    A list of decoded sub-objects, told apart from the raw list it replaces.
+    """
+
+
+class Model(object):
+    """
+    Base of the models. Subclasses declare their `fields`, and in `nested`
+    the model of their sub-object fields, see :func:`make_model`.
+    """
+
+    __slots__ = ('_extra',)
+
+    fields = ()
+    nested = {}
+    _slots = {}
+
+    def __init__(self, **values):
+        self._extra = None
+        for name, value in values.items():
+            setattr(self, name, value)
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Returns the model of `data`, a dict as returned by the api. Nested
+        dicts are kept undecoded until accessed.
+        """
+
+        obj = cls.__new__(cls)
+        obj._extra = None
+        slots = cls._slots
+        for name, value in data.items():
+            slot = slots.get(name)
+            if slot is not None:
+                object.__setattr__(obj, slot, value)
+            else:
+                if obj._extra is None:
+                    obj._extra = {}
+                obj._extra[name] = value
+        return obj
+
+    def to_dict(self):
+        """
+        Returns the dict of this model, as accepted by
+        :meth:`~quickbook3.quickbook.QuickBooks.create` and
+        :meth:`~quickbook3.quickbook.QuickBooks.update`.
+        """
+
+        data = {}
+        for name, slot in self._slots.items():
+            try:
+                value = object.__getattribute__(self, slot)
+            except AttributeError:
+                continue
+            data[name] = _encode(value)
+
+        if self._extra:
+            for name, value in self._extra.items():
+                data[name] = _encode(value)
+        return data
+
+    def __getattr__(self, name):
+        # only called for unset slots and undeclared fields
+        if name in self._slots:
+            return None
+        extra = object.__getattribute__(self, '_extra')
+        if extra is not None and name in extra:
+            return extra[name]
+        raise AttributeError("%s has no field %s" % (
+            self.__class__.__name__, name))
+
+    def __setattr__(self, name, value):
+        if name in self._slots or name == '_extra':
+            object.__setattr__(self, name, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[name] = value
+
+    def __eq__(self, other):
+        if not isinstance(other, Model):
+            return NotImplemented
+        return self.__class__ is other.__class__ and \
+            self.to_dict() == other.to_dict()
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    __hash__ = None
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        self._extra = None
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def __repr__(self):
+        identity = getattr(self, 'Id', None)
+        if identity is None:
+            return "<%s>" % self.__class__.__name__
+        return "<%s: %s>" % (self.__class__.__name__, identity)
+
+
+def as_dict(entity):
+    """
+    Returns `entity` as a dict, calling :meth:`Model.to_dict` on models.
+    """
+
+    if isinstance(entity, Model):
+        return entity.to_dict()
+    return entity
+
+
+def _encode(value):
+    if isinstance(value, Model):
+        return value.to_dict()
+    elif isinstance(value, ModelList):
+        return [_encode(v) for v in value]
+    return value
+
+
+def make_model(name, fields, nested=None, base=Model):
+    """
+    Returns a new model class.
+
+    :param fields: The names of the fields stored in slots, others being
+        kept in a dict.
+    :type fields: list
+    :param nested: The models of the sub-object fields, either a model or a
+        one item list of a model for lists of sub-objects. Fields ending in
+        ``Ref`` default to :class:`Ref`.
+    :type nested: dict
+    """
+
+    nested = dict(nested or {})
+    for field in fields:
+        if field.endswith('Ref') and field not in nested:
+            nested[field] = Ref
+
+    attrs = {'fields': tuple(fields), 'nested': nested}
+    slots = {}
+    for field in fields:
+        if field in nested:
+            model = nested[field]
+            many = isinstance(model, list)
+            attrs[str(field)] = Nested(field, model[0] if many else model,
+                                       many)
+            slots[field] = str('_' + field)
+        else:
+            slots[field] = str(field)
+
+    attrs['__slots__'] = tuple(slots.values())
+    attrs['_slots'] = slots
+    return type(str(name), (base,), attrs)
+
+
+Ref = make_model('Ref', ['value', 'name', 'type'])
+
+MetaData = make_model('MetaData', ['CreateTime', 'LastUpdatedTime'])
+
+CustomField = make_model('CustomField', ['DefinitionId', 'Name', 'Type',
+                                         'StringValue'])
+
+PhysicalAddress = make_model('PhysicalAddress', [
+    'Id', 'Line1', 'Line2', 'Line3', 'Line4', 'Line5', 'City',
+    'CountrySubDivisionCode', 'Country', 'PostalCode', 'Lat', 'Long'])
+
+EmailAddress = make_model('EmailAddress', ['Address'])
+
+TelephoneNumber = make_model('TelephoneNumber', ['FreeFormNumber'])
+
+WebSiteAddress = make_model('WebSiteAddress', ['URI'])
+
+LinkedTxn = make_model('LinkedTxn', ['TxnId', 'TxnType', 'TxnLineId'])
+
+Line = make_model('Line', ['Id', 'LineNum', 'Description', 'Amount',
+                           'DetailType', 'LinkedTxn'],
+                  {'LinkedTxn': [LinkedTxn]})
+
+TxnTaxDetail = make_model('TxnTaxDetail', ['TxnTaxCodeRef', 'TotalTax',
+                                           'TaxLine'],
+                          {'TaxLine': [Line]})
+
+
+ENTITY_FIELDS = ['Id', 'SyncToken', 'MetaData', 'domain', 'sparse']
+
+TRANSACTION_FIELDS = ENTITY_FIELDS + [
+    'DocNumber', 'TxnDate', 'PrivateNote', 'Line', 'TxnTaxDetail',
+    'CurrencyRef', 'ExchangeRate', 'DepartmentRef', 'LinkedTxn',
+    'CustomField', 'TotalAmt']
+
+NAME_FIELDS = ENTITY_FIELDS + [
+    'DisplayName', 'Title', 'GivenName', 'MiddleName', 'FamilyName',
+    'Suffix', 'CompanyName', 'PrintOnCheckName', 'Active', 'PrimaryPhone',
+    'Mobile', 'Fax', 'PrimaryEmailAddr', 'WebAddr', 'BillAddr']
+
+NESTED = {
+    'MetaData': MetaData,
+    'Line': [Line],
+    'LinkedTxn': [LinkedTxn],
+    'CustomField': [CustomField],
+    'TxnTaxDetail': TxnTaxDetail,
+    'BillAddr': PhysicalAddress,
+    'ShipAddr': PhysicalAddress,
+    'PrimaryAddr': PhysicalAddress,
+    'CompanyAddr': PhysicalAddress,
+    'PrimaryEmailAddr': EmailAddress,
+    'BillEmail': EmailAddress,
+    'PrimaryPhone': TelephoneNumber,
+    'AlternatePhone': TelephoneNumber,
+    'Mobile': TelephoneNumber,
+    'Fax': TelephoneNumber,
+    'WebAddr': WebSiteAddress,
+}
+
+ENTITIES = [
+    ('account', 'Account', ENTITY_FIELDS + [
+        'Name', 'SubAccount', 'ParentRef', 'FullyQualifiedName', 'Active',
+        'Classification', 'AccountType', 'AccountSubType', 'AcctNum',
+        'CurrentBalance', 'CurrentBalanceWithSubAccounts', 'CurrencyRef',
+        'Description']),
+    ('attachable', 'Attachable', ENTITY_FIELDS + [
+        'FileName', 'Note', 'Category', 'ContentType', 'Size',
+        'FileAccessUri', 'TempDownloadUri', 'AttachableRef']),
+    ('bill', 'Bill', TRANSACTION_FIELDS + [
+        'VendorRef', 'APAccountRef', 'SalesTermRef', 'DueDate', 'Balance']),
+    ('billpayment', 'BillPayment', TRANSACTION_FIELDS + [
+        'VendorRef', 'PayType', 'CheckPayment', 'CreditCardPayment',
+        'APAccountRef']),
+    ('class', 'Class', ENTITY_FIELDS + [
+        'Name', 'SubClass', 'ParentRef', 'FullyQualifiedName', 'Active']),
+    ('companyinfo', 'CompanyInfo', ENTITY_FIELDS + [
+        'CompanyName', 'LegalName', 'CompanyAddr', 'CustomerCommunicationAddr',
+        'LegalAddr', 'PrimaryPhone', 'CompanyStartDate',
+        'FiscalYearStartMonth', 'Country', 'Email', 'WebAddr',
+        'SupportedLanguages', 'NameValue']),
+    ('creditmemo', 'CreditMemo', TRANSACTION_FIELDS + [
+        'CustomerRef', 'BillAddr', 'ShipAddr', 'BillEmail', 'Balance',
+        'RemainingCredit', 'ClassRef', 'SalesTermRef']),
+    ('customer', 'Customer', NAME_FIELDS + [
+        'ShipAddr', 'AlternatePhone', 'Notes', 'Job', 'BillWithParent',
+        'ParentRef', 'Level', 'FullyQualifiedName', 'Taxable', 'Balance',
+        'BalanceWithJobs', 'CurrencyRef', 'PreferredDeliveryMethod',
+        'SalesTermRef', 'PaymentMethodRef']),
+    ('department', 'Department', ENTITY_FIELDS + [
+        'Name', 'SubDepartment', 'ParentRef', 'FullyQualifiedName',
+        'Active']),
+    ('deposit', 'Deposit', TRANSACTION_FIELDS + [
+        'DepositToAccountRef', 'CashBack']),
+    ('employee', 'Employee', NAME_FIELDS + [
+        'PrimaryAddr', 'EmployeeNumber', 'SSN', 'BillableTime', 'HiredDate',
+        'ReleasedDate', 'BirthDate', 'Gender']),
+    ('estimate', 'Estimate', TRANSACTION_FIELDS + [
+        'CustomerRef', 'BillAddr', 'ShipAddr', 'BillEmail', 'ClassRef',
+        'SalesTermRef', 'DueDate', 'ExpirationDate', 'AcceptedBy',
+        'AcceptedDate', 'TxnStatus', 'EmailStatus', 'PrintStatus']),
+    ('invoice', 'Invoice', TRANSACTION_FIELDS + [
+        'CustomerRef', 'CustomerMemo', 'BillAddr', 'ShipAddr', 'BillEmail',
+        'ClassRef', 'SalesTermRef', 'DueDate', 'ShipDate', 'TrackingNum',
+        'Balance', 'Deposit', 'DepositToAccountRef', 'AllowOnlinePayment',
+        'EmailStatus', 'PrintStatus', 'ApplyTaxAfterDiscount']),
+    ('item', 'Item', ENTITY_FIELDS + [
+        'Name', 'Sku', 'Description', 'Active', 'SubItem', 'ParentRef',
+        'Level', 'FullyQualifiedName', 'Taxable', 'UnitPrice', 'Type',
+        'IncomeAccountRef', 'PurchaseDesc', 'PurchaseCost',
+        'ExpenseAccountRef', 'AssetAccountRef', 'TrackQtyOnHand',
+        'QtyOnHand', 'InvStartDate']),
+    ('journalentry', 'JournalEntry', TRANSACTION_FIELDS + ['Adjustment']),
+    ('payment', 'Payment', TRANSACTION_FIELDS + [
+        'CustomerRef', 'ARAccountRef', 'DepositToAccountRef',
+        'PaymentMethodRef', 'PaymentRefNum', 'UnappliedAmt',
+        'ProcessPayment']),
+    ('paymentmethod', 'PaymentMethod', ENTITY_FIELDS + [
+        'Name', 'Active', 'Type']),
+    ('preferences', 'Preferences', ENTITY_FIELDS + [
+        'AccountingInfoPrefs', 'ProductAndServicesPrefs', 'SalesFormsPrefs',
+        'EmailMessagesPrefs', 'VendorAndPurchasesPrefs', 'TimeTrackingPrefs',
+        'TaxPrefs', 'CurrencyPrefs', 'ReportPrefs', 'OtherPrefs']),
+    ('purchase', 'Purchase', TRANSACTION_FIELDS + [
+        'AccountRef', 'PaymentType', 'EntityRef', 'Credit',
+        'PaymentMethodRef', 'RemitToAddr']),
+    ('purchaseorder', 'PurchaseOrder', TRANSACTION_FIELDS + [
+        'VendorRef', 'APAccountRef', 'ClassRef', 'SalesTermRef', 'DueDate',
+        'VendorAddr', 'ShipAddr', 'ShipMethodRef', 'POStatus', 'EmailStatus']),
+    ('salesreceipt', 'SalesReceipt', TRANSACTION_FIELDS + [
+        'CustomerRef', 'CustomerMemo', 'BillAddr', 'ShipAddr', 'BillEmail',
+        'ClassRef', 'PaymentMethodRef', 'PaymentRefNum',
+        'DepositToAccountRef', 'Balance', 'EmailStatus', 'PrintStatus']),
+    ('taxcode', 'TaxCode', ENTITY_FIELDS + [
+        'Name', 'Description', 'Active', 'Taxable', 'TaxGroup',
+        'SalesTaxRateList', 'PurchaseTaxRateList']),
+    ('taxrate', 'TaxRate', ENTITY_FIELDS + [
+        'Name', 'Description', 'Active', 'RateValue', 'AgencyRef',
+        'SpecialTaxType', 'DisplayType']),
+    ('term', 'Term', ENTITY_FIELDS + [
+        'Name', 'Active', 'Type', 'DueDays', 'DiscountDays',
+        'DiscountPercent', 'DayOfMonthDue', 'DiscountDayOfMonth',
+        'DueNextMonthDays']),
+    ('timeactivity', 'TimeActivity', ENTITY_FIELDS + [
+        'TxnDate', 'NameOf', 'EmployeeRef', 'VendorRef', 'CustomerRef',
+        'ItemRef', 'ClassRef', 'DepartmentRef', 'BillableStatus', 'Taxable',
+        'HourlyRate', 'Hours', 'Minutes', 'StartTime', 'EndTime',
+        'Description']),
+    ('vendor', 'Vendor', NAME_FIELDS + [
+        'AlternatePhone', 'OtherContactInfo', 'TaxIdentifier', 'AcctNum',
+        'Vendor1099', 'Balance', 'CurrencyRef', 'TermRef']),
+    ('vendorcredit', 'VendorCredit', TRANSACTION_FIELDS + [
+        'VendorRef', 'APAccountRef', 'Balance']),
+]
+
+NESTED.update({'VendorAddr': PhysicalAddress,
+               'RemitToAddr': PhysicalAddress,
+               'CustomerCommunicationAddr': PhysicalAddress,
+               'LegalAddr': PhysicalAddress})
+
+#: The model of each resource of
+#: :attr:`~quickbook3.quickbook.QuickBooks.ACCOUNTING_SERVICES`.
+MODELS = {}
+
+for _resource, _name, _fields in ENTITIES:
+    MODELS[_resource] = globals()[_name] = make_model(
+        _name, _fields, {f: NESTED[f] for f in _fields if f in NESTED})
+
+del _resource, _name, _fields
+
+
+def model_for(resource):
+    """
+    Returns the model of a resource, its name being case insensitive.
+    """
+
+    try:
+        return MODELS[resource.lower()]
+    except KeyError:
+        raise KeyError("No model for resource %s" % resource)
+
+
+def to_model(resource, data):
+    """
+    Returns the model of the entity dict `data` of `resource`.
+    """
+
+    return model_for(resource).from_dict(data)
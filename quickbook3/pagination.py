@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+
+"""
+quickbook3.pagination
+~~~~~~~~~~~~~~~~~~~~~
+
+This module contains paginators that walk over every page of a query.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .exceptions import InvalidQueryError
+from .response import QueryResponse
+from .sync import parse_timestamp
+
+
+class PrefetchingPaginator(object):
+    """
+    Fetches the pages of a query concurrently while still yielding the
+    :class:`~quickbook3.response.QueryResponse` objects in order.
+
+    The paginator first issues the ``count(*)`` form of the query to learn
+    the total number of rows, computes the ``StartPosition`` of every page
+    and then fetches up to `read_ahead` pages ahead of the consumer on a
+    pool of `workers` threads::
+
+        qb = QueryBuilder('Invoice').limit(1000)
+        for query_response in PrefetchingPaginator(client, qb, workers=8):
+            process(query_response.object_list)
+
+    A query matching no entity yields a single empty page, like
+    :meth:`~quickbook3.quickbook.QuickBooks.batch_query`. The querybuilder
+    passed is never mutated.
+    """
+
+    def __init__(self, client, querybuilder, workers=4, read_ahead=None,
+                 **params):
+        """
+        :param client: Client used to run the queries.
+        :type client: :class:`~quickbook3.quickbook.QuickBooks`
+        :param querybuilder: Query to paginate, its limit is used as page
+            size and its offset as the first position.
+        :type querybuilder: :class:`~quickbook3.querybuilder.QueryBuilder`
+        :param workers: Number of pages fetched concurrently, defaults to `4`.
+        :type workers: int
+        :param read_ahead: Maximum number of pages fetched but not yet
+            consumed, defaults to twice the number of workers.
+        :type read_ahead: int
+        """
+
+        self.client = client
+        self.querybuilder = querybuilder
+        self.workers = workers
+        self.read_ahead = max(read_ahead or workers * 2, 1)
+        self.params = params
+        self.total_count = None
+
+    def count(self):
+        if self.total_count is None:
+            querybuilder = self.querybuilder.copy()
+            querybuilder.paginationflag = False
+            querybuilder.count()
+            self.total_count = self.client.query(querybuilder, **self.params)
+
+        return self.total_count
+
+    def positions(self):
+        page_size = self.querybuilder.get_maxresults()
+        start = self.querybuilder.get_startposition() or 1
+        return range(start, self.count() + 1, page_size)
+
+    def __iter__(self):
+        if self.count() == 0:
+            entity = self.querybuilder.get_entity()
+            yield QueryResponse(entity, {
+                entity: [], 'maxResults': 0,
+                'startPosition': self.querybuilder.get_startposition() or 1})
+            return
+
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        pending = deque()
+        try:
+            for position in self.positions():
+                pending.append(executor.submit(self._fetch, position))
+                if len(pending) >= self.read_ahead:
+                    yield pending.popleft().result()
+
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def _fetch(self, position):
+        querybuilder = self.querybuilder.copy()
+        querybuilder.offset(position)
+        querybuilder.limit(self.querybuilder.get_maxresults())
+        return self.client.query(querybuilder, **self.params)
+
+
+class KeysetPaginator(object):
+    """
+    Walks over every page of a query ordered by `key`, each page being
+    requested with a filter on the key greater than the last one seen
+    instead of a ``StartPosition``::
+
+        qb = QueryBuilder('Invoice').where('Balance').gt(0).limit(1000)
+        for query_response in KeysetPaginator(client, qb):
+            process(query_response.object_list)
+
+    The server thus never skips over the rows of the previous pages, which
+    gets slower the deeper the offset, and entities created or deleted
+    during the scan don't shift the following pages, so that none is
+    yielded twice or missed.
+
+    The key is either `'Id'`, or `'MetaData.LastUpdatedTime'` to also pick
+    up the entities updated during the scan. Timestamps being shared by
+    several entities, those of the last timestamp of a full page are left
+    out of it and fetched ordered by id before going on.
+
+    The progress of the scan is kept in :attr:`pages`, :attr:`fetched` and
+    :attr:`last_key`, and passed to `progress` after every page, which may
+    call :meth:`count` for the total number of entities.
+
+    The querybuilder passed is never mutated.
+    """
+
+    KEYS = ('Id', 'MetaData.LastUpdatedTime')
+
+    def __init__(self, client, querybuilder, key='Id', progress=None,
+                 **params):
+        """
+        :param client: Client used to run the queries.
+        :type client: :class:`~quickbook3.quickbook.QuickBooks`
+        :param querybuilder: Query to paginate, its limit is used as page
+            size. It must neither be a count query nor be ordered.
+        :type querybuilder: :class:`~quickbook3.querybuilder.QueryBuilder`
+        :param key: Field the pages are ordered and filtered by, one of
+            :attr:`KEYS`, defaults to `'Id'`.
+        :type key: str
+        :param progress: Called with the paginator after every page.
+        :type progress: callable
+        """
+
+        if key not in self.KEYS:
+            raise InvalidQueryError("Unsupported key: %s" % key)
+        if not hasattr(querybuilder, 'where'):
+            raise InvalidQueryError("Keyset pagination requires a "
+                                    "QueryBuilder")
+        if querybuilder.is_count_query() or querybuilder.get_order():
+            raise InvalidQueryError("Keyset pagination requires a query "
+                                    "neither counted nor ordered")
+
+        self.client = client
+        self.querybuilder = querybuilder
+        self.key = key
+        self.progress = progress
+        self.params = params
+        self.total_count = None
+        self.pages = 0
+        self.fetched = 0
+        self.last_key = None
+
+    def count(self):
+        if self.total_count is None:
+            querybuilder = self.querybuilder.copy()
+            querybuilder.paginationflag = False
+            querybuilder.count()
+            self.total_count = self.client.query(querybuilder, **self.params)
+
+        return self.total_count
+
+    def __iter__(self):
+        page_size = self.querybuilder.get_maxresults()
+        # the timestamp shared by the entities being drained by id
+        tied = after_id = None
+        while True:
+            querybuilder = self.querybuilder.copy()
+            if tied is not None:
+                querybuilder.where(self.key).equals(
+                    parse_timestamp(tied).isoformat())
+                if after_id is not None:
+                    querybuilder.where('Id').gt(after_id)
+                querybuilder.order_by('Id')
+            else:
+                if self.last_key is not None:
+                    querybuilder.where(self.key).gt(
+                        self._compared(self.last_key))
+                querybuilder.order_by(self.key)
+            querybuilder.offset(1).limit(page_size)
+
+            query_response = self.client.query(querybuilder, **self.params)
+            entity = query_response.entity
+            objects = query_response.object_list
+            full = len(objects) >= page_size
+
+            if tied is not None:
+                if objects:
+                    after_id = objects[-1]['Id']
+                    yield self._page(entity, objects, tied)
+                if not full:
+                    # the tie is drained even when it yielded no page
+                    self.last_key = tied
+                    tied = after_id = None
+                continue
+
+            if full and self.key != 'Id':
+                # the entities of the last timestamp may go on in the next
+                # pages, they are all fetched ordered by id instead
+                tied = self._key_of(objects[-1])
+                objects = [obj for obj in objects
+                           if self._key_of(obj) != tied]
+            if objects:
+                yield self._page(entity, objects, self._key_of(objects[-1]))
+            if not full:
+                if self.pages == 0:
+                    yield self._page(entity, [], None)
+                return
+
+    def _page(self, entity, objects, last_key):
+        self.pages += 1
+        self.fetched += len(objects)
+        if last_key is not None:
+            self.last_key = last_key
+        if self.progress is not None:
+            self.progress(self)
+        return QueryResponse(entity, {
+            entity: objects, 'startPosition': self.fetched - len(objects) + 1,
+            'maxResults': len(objects)})
+
+    def _key_of(self, obj):
+        if self.key == 'Id':
+            return obj['Id']
+        return obj['MetaData']['LastUpdatedTime']
+
+    def _compared(self, key):
+        if self.key == 'Id':
+            return key
+        return parse_timestamp(key)
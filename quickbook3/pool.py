@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+
+"""
+quickbook3.pool
+~~~~~~~~~~~~~~~
+
+This module contains :class:`RealmPool` that runs jobs against many
+connected companies (realms) on a pool of threads or processes.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import copy
+import inspect
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, \
+    wait, FIRST_COMPLETED
+
+from .quickbook import QuickBooks
+from .transport import PooledTransport
+
+
+def query_all(client, querybuilder, **params):
+    """
+    A job returning every entity matched by the query, fetching its pages
+    with :meth:`~quickbook3.quickbook.QuickBooks.batch_query`. The
+    querybuilder passed is not mutated.
+    """
+
+    entities = []
+    for query_response in client.batch_query(querybuilder.copy(), **params):
+        entities.extend(query_response.object_list)
+    return entities
+
+
+def _call(client, job, args, kwargs):
+    if callable(job):
+        result = job(client, *args, **kwargs)
+    else:
+        result = getattr(client, job)(*args, **kwargs)
+
+    # generators such as batch_query are drained so that the job completes
+    # on the worker and its result can cross a process boundary
+    if inspect.isgenerator(result):
+        result = list(result)
+    return result
+
+
+_process_clients = {}
+
+
+def _run_in_process(realm, options, job, args, kwargs):
+    """
+    Runs a job in a worker process, reusing the client of the realm built by
+    a previous job of the same process.
+    """
+
+    cached = _process_clients.get(realm)
+    if cached is None or cached[0] != options:
+        cached = (options, QuickBooks(realm, **options))
+        _process_clients[realm] = cached
+    return _call(cached[1], job, args, kwargs)
+
+
+class JobResult(object):
+    """
+    The outcome of a job: its `value` when it succeeded, otherwise the
+    exception it raised in `error`.
+    """
+
+    def __init__(self, realm, job, args, kwargs, value=None, error=None):
+        self.realm = realm
+        self.job = job
+        self.args = args
+        self.kwargs = kwargs
+        self.value = value
+        self.error = error
+
+    @property
+    def name(self):
+        return getattr(self.job, '__name__', self.job)
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        return "JobResult: Realm: %s, Job: %s, Ok: %s" % (
+            self.realm, self.name, self.ok)
+
+
+class RealmResult(object):
+    """
+    The results of the jobs of one realm, in the order they were submitted.
+    """
+
+    def __init__(self, realm):
+        self.realm = realm
+        self.jobs = []
+
+    @property
+    def results(self):
+        return [job.value for job in self.jobs if job.ok]
+
+    @property
+    def errors(self):
+        return [job for job in self.jobs if not job.ok]
+
+    @property
+    def ok(self):
+        return all(job.ok for job in self.jobs)
+
+    def __iter__(self):
+        return iter(self.jobs)
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def __repr__(self):
+        return "RealmResult: Realm: %s, Jobs: %d, Errors: %d" % (
+            self.realm, len(self.jobs), len(self.errors))
+
+
+class RealmPool(object):
+    """
+    Holds one client per realm and runs the jobs submitted for them on a
+    pool of `workers` threads (or processes), never running more than
+    `per_realm` jobs of a realm at once. Realms are served round-robin so
+    that a realm with a long backlog does not starve the others::
+
+        pool = RealmPool(workers=8, per_realm=2)
+        for company_id, creds in realms:
+            pool.add_realm(company_id, **creds)
+
+        pool.map(query_all, QueryBuilder('Invoice').limit(1000))
+        pool.map('cdc', ['Customer', 'Invoice'], since)
+        for realm, result in pool.run().items():
+            if not result.ok:
+                log(realm, result.errors)
+
+    A job is either the name of a client method or a callable taking the
+    client as first argument. Generators, such as the one returned by
+    :meth:`~quickbook3.quickbook.QuickBooks.batch_query`, are drained into
+    lists.
+
+    In thread mode the clients share one
+    :class:`~quickbook3.transport.PooledTransport` and the `rate_limiter`
+    passed. In process mode (``executor='process'``) the clients are built
+    in the worker processes, so jobs, their arguments and results must be
+    picklable, jobs being method names or module level functions; transports
+    and rate limiters can not be shared across processes and are refused.
+    """
+
+    EXECUTORS = ('thread', 'process')
+
+    def __init__(self, workers=8, per_realm=2, executor='thread',
+                 transport=None, rate_limiter=None, **client_options):
+        """
+        :param workers: Number of jobs run concurrently, defaults to `8`.
+        :type workers: int
+        :param per_realm: Default number of jobs of a realm run
+            concurrently, defaults to `2`.
+        :type per_realm: int
+        :param executor: Either `thread` or `process`, defaults to
+            `thread`.
+        :type executor: str
+        :param transport: Pool of connections shared by the clients in
+            thread mode, defaults to a new
+            :class:`~quickbook3.transport.PooledTransport` sized for
+            `workers`.
+        :type transport: :class:`~quickbook3.transport.PooledTransport`
+        :param rate_limiter: Rate limiter shared by the clients in thread
+            mode, defaults to `None`.
+        :type rate_limiter: :class:`~quickbook3.throttle.RateLimiter`
+        :param client_options: Other arguments passed to every
+            :class:`~quickbook3.quickbook.QuickBooks` client, such as
+            `sandbox_mode` or `retry_policy`.
+        """
+
+        if executor not in self.EXECUTORS:
+            raise ValueError("executor must be one of %s" %
+                             ', '.join(self.EXECUTORS))
+
+        if executor == 'process' and (transport is not None or
+                                      rate_limiter is not None):
+            raise ValueError("transport and rate_limiter can not be shared "
+                             "across processes")
+
+        self.workers = workers
+        self.per_realm = per_realm
+        self.executor = executor
+        self.client_options = client_options
+
+        if executor == 'thread':
+            self.client_options['transport'] = transport or \
+                PooledTransport(pool_maxsize=workers)
+            self.client_options['rate_limiter'] = rate_limiter
+
+        self.realms = OrderedDict()
+        self.clients = {}
+        self.limits = {}
+        self.pending = OrderedDict()
+
+    def add_realm(self, company_id, per_realm=None, **options):
+        """
+        Adds a realm, `options` (credentials mostly) being passed to its
+        :class:`~quickbook3.quickbook.QuickBooks` client along with those of
+        the pool. Returns the client in thread mode.
+
+        :param per_realm: Number of jobs of this realm run concurrently,
+            defaults to the one of the pool.
+        :type per_realm: int
+        """
+
+        options = dict(self.client_options, **options)
+        self.realms[company_id] = options
+        self.limits[company_id] = per_realm or self.per_realm
+        self.pending.setdefault(company_id, deque())
+
+        if self.executor == 'thread':
+            self.clients[company_id] = QuickBooks(company_id, **options)
+            return self.clients[company_id]
+
+    def add_client(self, client, per_realm=None):
+        """
+        Adds a realm served by an already built client, in thread mode only.
+        """
+
+        if self.executor != 'thread':
+            raise ValueError("clients can only be added in thread mode")
+
+        self.realms[client.company_id] = None
+        self.clients[client.company_id] = client
+        self.limits[client.company_id] = per_realm or self.per_realm
+        self.pending.setdefault(client.company_id, deque())
+        return client
+
+    def remove_realm(self, company_id):
+        self.realms.pop(company_id)
+        self.clients.pop(company_id, None)
+        self.limits.pop(company_id)
+        self.pending.pop(company_id)
+
+    def submit(self, company_id, job, *args, **kwargs):
+        """
+        Queues a job for a realm, it runs on the next call to :meth:`run`.
+        """
+
+        if company_id not in self.realms:
+            raise KeyError("Unknown realm %s" % company_id)
+        self.pending[company_id].append((job, args, kwargs))
+
+    def map(self, job, *args, **kwargs):
+        """
+        Queues a job for every realm. Each realm gets its own copy of the
+        arguments so that jobs mutating them do not interfere.
+        """
+
+        for company_id in self.realms:
+            self.submit(company_id, job, *copy.deepcopy(args),
+                        **copy.deepcopy(kwargs))
+
+    def run(self):
+        """
+        Runs the queued jobs and returns a dict mapping every realm to its
+        :class:`RealmResult`. Errors raised by jobs are collected, not
+        raised.
+        """
+
+        results = OrderedDict((company_id, RealmResult(company_id))
+                              for company_id in self.realms)
+        queue = deque(company_id for company_id, jobs in self.pending.items()
+                      if jobs)
+        running = {}
+        inflight = dict((company_id, 0) for company_id in self.realms)
+
+        executor_class = ThreadPoolExecutor if self.executor == 'thread' \
+            else ProcessPoolExecutor
+
+        with executor_class(max_workers=self.workers) as executor:
+            while queue or running:
+                self._dispatch(executor, queue, running, inflight, results)
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_result = running.pop(future)
+                    inflight[job_result.realm] -= 1
+                    try:
+                        job_result.value = future.result()
+                    except Exception as e:
+                        job_result.error = e
+
+                    if self.pending[job_result.realm] and \
+                            job_result.realm not in queue:
+                        queue.append(job_result.realm)
+
+        return results
+
+    def _dispatch(self, executor, queue, running, inflight, results):
+        """
+        Submits jobs of the queued realms round-robin, one job per realm per
+        turn, until the pool is full or every realm is at its limit.
+        """
+
+        while queue and len(running) < self.workers:
+            company_id = queue.popleft()
+            if inflight[company_id] >= self.limits[company_id]:
+                # the realm is queued again once one of its jobs completes
+                continue
+
+            job, args, kwargs = self.pending[company_id].popleft()
+            job_result = JobResult(company_id, job, args, kwargs)
+            future = self._submit(executor, company_id, job, args, kwargs)
+            running[future] = job_result
+            results[company_id].jobs.append(job_result)
+            inflight[company_id] += 1
+
+            if self.pending[company_id]:
+                queue.append(company_id)
+
+    def _submit(self, executor, company_id, job, args, kwargs):
+        if self.executor == 'thread':
+            return executor.submit(_call, self.clients[company_id], job,
+                                   args, kwargs)
+        return executor.submit(_run_in_process, company_id,
+                               self.realms[company_id], job, args, kwargs)
+
+    def __len__(self):
+        return len(self.realms)
+
+    def __repr__(self):
+        return "RealmPool: Realms: %d, Workers: %d, Executor: %s" % (
+            len(self.realms), self.workers, self.executor)
@@ -2,8 +2,81 @@
 
 from __future__ import absolute_import
 from __future__ import division
+import copy
+import datetime
+
+from .lru import LRUCache
 from .exceptions import InvalidQueryError
 
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
+
+
+def quote(value):
+    """
+    Returns `value` as a quoted string literal, escaping backslashes and
+    quotes.
+    """
+
+    value = '%s' % (value,)
+    return "'%s'" % value.replace('\\', '\\\\').replace("'", "\\'")
+
+
+def _render_equals(value):
+    if value is None:
+        value = ''
+
+    if isinstance(value, bool):
+        return str(value).lower()
+    return quote(value)
+
+
+def _render_comparison(op):
+    def render(value):
+        if isinstance(value, datetime.date):
+            return quote(value.isoformat())
+
+        try:
+            float(value)
+        except (TypeError, ValueError):
+            raise InvalidQueryError("%s operator requires value of type "
+                                    "integer/float/date/datetime" % op)
+        return quote(value)
+    return render
+
+
+def _render_contains(values):
+    if not isinstance(values, (list, tuple)):
+        raise InvalidQueryError("Contains operator must "
+                                "receive a list/tuple of values")
+    if not values:
+        raise InvalidQueryError("Contains operator requires at least "
+                                "one value")
+    return "(%s)" % ', '.join(str(value).lower() if isinstance(value, bool)
+                              else quote(value) for value in values)
+
+
+def _render_like(value):
+    if not isinstance(value, string_types):
+        raise InvalidQueryError("Like operator requires "
+                                "value be of type string")
+    return quote(value)
+
+
+RENDERERS = {
+    '=': _render_equals,
+    '>': _render_comparison('>'),
+    '>=': _render_comparison('>='),
+    '<': _render_comparison('<'),
+    '<=': _render_comparison('<='),
+    'in': _render_contains,
+    'Like': _render_like,
+}
+
+TEMPLATE_CACHE = LRUCache(maxsize=256)
+
 
 class QueryBuilder(object):
     def __init__(self, entity):
@@ -11,8 +84,10 @@ class QueryBuilder(object):
         self.columns = '*'
         self.filterflag = False
         self.filters = []
+        self.clauses = []
         self.incomplete_filter_flag = False
         self.countflag = False
+        self.orderby = None
 
         self.paginationflag = False
         self.maxresults = 100
@@ -35,30 +110,14 @@ class QueryBuilder(object):
         self._validate()
         self.incomplete_filter_flag = True
         self.filters.append(column)
+        self.clauses.append(None)
         return self
 
     def equals(self, value):
-        self._validate_lhs()
-        if value is None:
-            value = ''
-
-        column = self.filters[-1]
-        if isinstance(value, bool):
-            self.filters[-1] = "%s = %s" % (column, str(value).lower())
-
-        else:
-            self.filters[-1] = "%s = '%s'" % (column, value)
-
-        self.incomplete_filter_flag = False
-        return self
+        return self._complete_where('=', value)
 
     def contains(self, values):
-        self._validate_lhs()
-        if not isinstance(values, (list, tuple)):
-            raise InvalidQueryError("Contains operator must "
-                                    "receive a list/tuple of values")
-
-        self._complete_where('in', str(values))
+        return self._complete_where('in', values)
 
     def gt(self, value):
         return self._operator('>', value)
@@ -73,29 +132,22 @@ class QueryBuilder(object):
         return self._operator('<=', value)
 
     def _operator(self, op, value):
-        self._validate_lhs()
-        try:
-            float(value)
-        except ValueError:
-            raise InvalidQueryError("%s operator requires "
-                                    "value of type integer/float" % op)
         return self._complete_where(op, value)
 
     def like(self, value):
-        self._validate_lhs()
-        if not isinstance(value, basestring):
-            raise InvalidQueryError("Like operator requires "
-                                    "value be of type string")
-        self._complete_where('Like', value)
+        return self._complete_where('Like', value)
 
-    def _complete_where(self, op, rhs):
+    def _complete_where(self, op, value):
+        self._validate_lhs()
         column = self.filters[-1]
-        self.filters[-1] = "%s %s '%s'" % (column, op, rhs)
+        self.filters[-1] = "%s %s %s" % (column, op, RENDERERS[op](value))
+        self.clauses[-1] = (column, op, value)
         self.incomplete_filter_flag = False
         return self
 
     def set_filters(self, where):
         self.filters = where.split(' AND ')
+        self.clauses = [None] * len(self.filters)
         self._validate()
 
     def get_filters(self):
@@ -110,6 +162,18 @@ class QueryBuilder(object):
     def is_count_query(self):
         return self.countflag
 
+    def order_by(self, column, descending=False):
+        """
+        Sorts the results by `column`, ascending unless `descending`.
+        """
+
+        self._validate()
+        self.orderby = '%s DESC' % column if descending else column
+        return self
+
+    def get_order(self):
+        return self.orderby
+
     def limit(self, maxresults):
         self._validate()
         self.paginationflag = True
@@ -127,8 +191,48 @@ class QueryBuilder(object):
 
     def get_startposition(self):
         return self.startposition
-    
-    
+
+    def copy(self):
+        return copy.deepcopy(self)
+
+    def get_values(self):
+        """
+        Returns the values compared in the where clause, in order.
+        """
+
+        return [clause[2] for clause in self.clauses if clause is not None]
+
+    def compile(self):
+        """
+        Returns the :class:`QueryTemplate` of the shape of this query: its
+        entity, columns and filters, the values compared being left as
+        placeholders. Templates are kept in a LRU cache so that builders of
+        the same shape share one::
+
+            template = (QueryBuilder('Invoice').where('CustomerRef')
+                        .equals('1').where('Balance').gt(0).compile())
+            for customer_id in customer_ids:
+                client.query(template.bind(customer_id, 0))
+        """
+
+        self._validate()
+        filters = tuple((clause[0], clause[1]) if clause is not None
+                        else text
+                        for clause, text in zip(self.clauses, self.filters))
+        return QueryTemplate.get(self.entity, self.get_columns(), filters,
+                                 self.countflag, self.orderby)
+
+    def bind(self):
+        """
+        Returns a :class:`BoundQuery` equivalent to this builder, which
+        renders its pages without formatting the whole query again.
+        """
+
+        bound = self.compile().bind(*self.get_values())
+        if self.paginationflag:
+            bound.offset(self.startposition).limit(self.maxresults)
+        return bound
+
     @classmethod
     def from_parts(cls, entity, columns='*', where=None, count=False, 
                    maxresults=100, startposition=0):
@@ -155,6 +259,9 @@ class QueryBuilder(object):
         if self.filters:
             query += ' Where %s' % ' AND '.join(self.filters)
 
+        if self.orderby:
+            query += ' ORDERBY %s' % self.orderby
+
         if self.paginationflag:
             query += ' StartPosition %d MaxResults %d' % (self.startposition,
                                                           self.maxresults)
@@ -169,3 +276,135 @@ class QueryBuilder(object):
     def _validate_lhs(self):
         if not self.incomplete_filter_flag:
             raise InvalidQueryError("Operator clause must be preceeded by where clause")
+
+
+class QueryTemplate(object):
+    """
+    A query whose compared values are placeholders, bound with
+    :meth:`bind`. Only the values are formatted (and validated, raising
+    :class:`~quickbook3.exceptions.InvalidQueryError` as
+    :class:`QueryBuilder` does) when a template is bound, the rest of the
+    query being formatted once when the template is built.
+    """
+
+    def __init__(self, entity, columns, filters, count=False, order=None):
+        """
+        :param filters: The filters of the where clause, either a
+            `(column, operator)` pair, whose value is a placeholder, or the
+            text of the filter.
+        :type filters: tuple
+        :param order: The `ORDERBY` clause, e.g. `'Id'` or `'Id DESC'`.
+        :type order: str
+        """
+
+        self.entity = entity
+        self.columns = columns
+        self.filters = filters
+        self.count = count
+        self.order = order
+
+        self.operators = []
+        self.parts = []
+        text = "Select %s From %s" % (columns, entity)
+        for i, f in enumerate(filters):
+            text += ' Where ' if i == 0 else ' AND '
+            if isinstance(f, tuple):
+                self.parts.append(text + '%s %s ' % f)
+                self.operators.append(f[1])
+                text = ''
+            else:
+                text += f
+        if order:
+            text += ' ORDERBY %s' % order
+        self.parts.append(text)
+
+    @classmethod
+    def get(cls, entity, columns, filters, count=False, order=None):
+        """
+        Returns the cached template of this shape, building it if needed.
+        """
+
+        key = (entity, columns, filters, count, order)
+        template = TEMPLATE_CACHE.get(key)
+        if template is None:
+            template = cls(entity, columns, filters, count, order)
+            TEMPLATE_CACHE.set(key, template)
+        return template
+
+    def render(self, values):
+        if len(values) != len(self.operators):
+            raise InvalidQueryError("Query requires %d values, %d given" % (
+                len(self.operators), len(values)))
+
+        query = [self.parts[0]]
+        for op, value, part in zip(self.operators, values, self.parts[1:]):
+            query.append(RENDERERS[op](value))
+            query.append(part)
+        return ''.join(query)
+
+    def bind(self, *values):
+        """
+        Returns a :class:`BoundQuery` of this template with `values` in
+        place of its placeholders.
+        """
+
+        return BoundQuery(self, values)
+
+    def count_template(self):
+        return self.get(self.entity, 'count(*)', self.filters, True)
+
+    def __repr__(self):
+        return "QueryTemplate: %s" % '?'.join(self.parts)
+
+
+class BoundQuery(object):
+    """
+    A :class:`QueryTemplate` bound to values. It can be passed wherever a
+    :class:`QueryBuilder` is to run a query, notably to
+    :meth:`~quickbook3.quickbook.QuickBooks.batch_query` which then only
+    formats the pagination of each page.
+    """
+
+    def __init__(self, template, values):
+        self.template = template
+        self.values = values
+        self.query = template.render(values)
+        self.paginationflag = False
+        self.maxresults = 100
+        self.startposition = 1
+
+    def get_entity(self):
+        return self.template.entity
+
+    def is_count_query(self):
+        return self.template.count
+
+    def count(self):
+        self.template = self.template.count_template()
+        self.query = self.template.render(self.values)
+        return self
+
+    def limit(self, maxresults):
+        self.paginationflag = True
+        self.maxresults = maxresults
+        return self
+
+    def get_maxresults(self):
+        return self.maxresults
+
+    def offset(self, startposition):
+        self.paginationflag = True
+        self.startposition = startposition
+        return self
+
+    def get_startposition(self):
+        return self.startposition
+
+    def copy(self):
+        return copy.copy(self)
+
+    def build(self):
+        if self.paginationflag:
+            return '%s StartPosition %d MaxResults %d' % (
+                self.query, self.startposition, self.maxresults)
+        return self.query
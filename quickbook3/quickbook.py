@@ -9,29 +9,37 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import copy
 import logging
 import os
 import sys
 import datetime
 import traceback
+from collections import OrderedDict
 
+from concurrent.futures import ThreadPoolExecutor
 from rauth import OAuth1Session
 
-from .response import ResponseParser, QueryResponse, CDCResponse
-
-
-try:
-    import configparser
-except ImportError:
-    import ConfigParser as configparser
+from .batch import Batch
+from .cache import cache_key, response_key, sync_token, Revalidation
+from .metrics import Call, TimedSignature, call_tags, timer
+from .models import as_dict, model_for
+from .pagination import PrefetchingPaginator, KeysetPaginator
+from .querybuilder import QueryBuilder, quote
+from .reports import ShardedReport
+from .signing import CachedHmacSha1Signature
+from .tokens import BearerSession
+from .response import ResponseParser, QueryResponse, CDCResponse, \
+    ReportResponse, ReadManyResponse
 
 from .exceptions import *
 
 
 def auth_required(func):
     def wrapper(self, *args, **kwargs):
-        if all([self.consumer_key, self.consumer_secret,
-                self.access_token, self.access_token_secret]):
+        if self.token_manager is not None or \
+                all([self.consumer_key, self.consumer_secret,
+                     self.access_token, self.access_token_secret]):
             return func(self, *args, **kwargs)
         else:
             raise MissingCredentialsException()
@@ -39,7 +47,13 @@ def auth_required(func):
     return wrapper
 
 
-class QuickBooks(object):
+class BaseQuickBooks(object):
+    """
+    The endpoints, credentials and logging shared by
+    :class:`QuickBooks` and :class:`~quickbook3.aio.AsyncQuickBooks`, which
+    add the api methods. It sends no request itself.
+    """
+
     production_url = "https://quickbooks.api.intuit.com/v3"
 
     sandbox_url = "https://sandbox-quickbooks.api.intuit.com/v3"
@@ -59,11 +73,143 @@ class QuickBooks(object):
     ACCESS_TOKEN_NAME = 'QB_ACCESS_TOKEN'
     ACCESS_TOKEN_SECRET_NAME = 'QB_ACCESS_TOKEN_SECRET'
 
+    DEFAULT_HEADERS = {'Accept': 'application/json',
+                       'Content-Type': 'application/json'}
+
+    # limits of the queries by id: quickbooks returns at most 1000 entities
+    # per query and the query is sent in the url
+    MAX_RESULTS = 1000
+    MAX_ID_LIST_LENGTH = 2000
+
     def __init__(self, company_id, consumer_key=None, consumer_secret=None,
                  access_token=None, access_token_secret=None,
                  cred_file=None, sandbox_mode=False,
                  logger=None, peform_logging=False,
-                 log_level=logging.ERROR):
+                 log_level=logging.ERROR, token_manager=None):
+        """
+        See :class:`QuickBooks` for the arguments.
+        """
+
+        self.sandbox_mode = sandbox_mode
+
+        self.base_url_v3 = self.sandbox_url if self.sandbox_mode \
+            else self.production_url
+
+        self.company_id = company_id
+
+        self.token_manager = token_manager
+
+        if token_manager is None:
+            self.set_credentials(cred_file, consumer_key, consumer_secret,
+                                 access_token, access_token_secret)
+        else:
+            self.consumer_key = self.consumer_secret = None
+            self.access_token = self.access_token_secret = None
+
+        self.peform_logging = peform_logging
+
+        self.logger = logger
+
+        self.log_level = log_level
+
+        if self.peform_logging and not self.logger:
+            self.logger = logging.getLogger()
+            self.logger.addHandler(logging.StreamHandler(sys.stdout))
+            self.logger.setLevel(self.log_level)
+
+        self.headers = dict(self.DEFAULT_HEADERS)
+
+    def _get_crud_url(self, resource, resource_id=None):
+        resource = resource.lower()
+        if not resource in self.ACCOUNTING_SERVICES:
+            raise InvalidResourceError
+
+        urlparts = [self.base_url_v3, 'company', self.company_id,
+                    resource]
+
+        if resource_id:
+            urlparts.append(resource_id)
+
+        return "/".join(urlparts)
+
+    def _id_query(self, entity, ids, columns='*'):
+        querybuilder = QueryBuilder(entity).select(columns).where('Id')\
+            .contains(ids)
+        if 'Active' in model_for(entity).fields:
+            # the inactive entities of name lists are only matched when
+            # asked for, they would otherwise look missing or deleted
+            querybuilder.where('Active').contains([True, False])
+        return querybuilder.limit(len(ids))
+
+    def _id_chunks(self, ids, chunk_size):
+        chunks = []
+        chunk, length = [], 0
+        for resource_id in ids:
+            size = len(quote(resource_id)) + 2
+            if chunk and (len(chunk) >= chunk_size or
+                          length + size > self.MAX_ID_LIST_LENGTH):
+                chunks.append(chunk)
+                chunk, length = [], 0
+            chunk.append(resource_id)
+            length += size
+
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def set_credentials(self, cred_file, consumer_key, consumer_secret,
+                        access_token, access_token_secret):
+
+        if cred_file:
+            self._read_creds_from_file(cred_file)
+        else:
+            try:
+                self.consumer_key = consumer_key or os.environ[
+                    self.CONSUMER_KEY_NAME]
+                self.consumer_secret = consumer_secret or os.environ[
+                    self.CONSUMER_SECRET_NAME]
+
+                self.access_token = access_token or os.environ[
+                    self.ACCESS_TOKEN_NAME]
+                self.access_token_secret = access_token_secret or os.environ[
+                    self.ACCESS_TOKEN_SECRET_NAME]
+
+            except KeyError:
+                raise MissingCredentialsException
+
+    def _read_creds_from_file(self, filename):
+        try:
+            import configparser
+        except ImportError:
+            import ConfigParser as configparser
+
+        config = configparser.RawConfigParser()
+        config.read(filename)
+
+        try:
+            self.consumer_key = config.get('credentials',
+                                           self.CONSUMER_KEY_NAME)
+            self.consumer_secret = config.get('credentials',
+                                              self.CONSUMER_SECRET_NAME)
+
+            self.access_token = config.get('credentials',
+                                           self.ACCESS_TOKEN_NAME)
+            self.access_token_secret = config.get('credentials',
+                                                  self.ACCESS_TOKEN_SECRET_NAME)
+
+        except (configparser.NoOptionError, configparser.NoSectionError):
+            raise MissingCredentialsException
+
+
+class QuickBooks(BaseQuickBooks):
+    def __init__(self, company_id, consumer_key=None, consumer_secret=None,
+                 access_token=None, access_token_secret=None,
+                 cred_file=None, sandbox_mode=False,
+                 logger=None, peform_logging=False,
+                 log_level=logging.ERROR, transport=None, cache=None,
+                 rate_limiter=None, retry_policy=None, metrics=None,
+                 token_manager=None, response_cache=None,
+                 single_flight=None):
 
         """
         :param company_id: This is the realmID obtained during authorization
@@ -94,105 +240,396 @@ class QuickBooks(object):
 
         :param log_level: Mininum Log Level to log
         :type log_level: int
+
+        :param transport: A pool of http connections, possibly shared with
+            other clients, defaults to a pool owned by the session.
+        :type transport: :class:`~quickbook3.transport.PooledTransport`
+
+        :param cache: A cache of entities consulted by :meth:`read`, filled
+            by :meth:`read` and :meth:`query` and refreshed by :meth:`create`,
+            :meth:`update` and :meth:`delete`, defaults to `None`.
+        :type cache: :class:`~quickbook3.lru.BaseCache`
+
+        :param rate_limiter: A rate limiter, usually shared by the clients of
+            all realms, through which every request goes, defaults to `None`.
+        :type rate_limiter: :class:`~quickbook3.throttle.RateLimiter`
+
+        :param retry_policy: The policy retrying throttled and failed
+            requests, defaults to `None` meaning no retries.
+        :type retry_policy: :class:`~quickbook3.throttle.RetryPolicy`
+
+        :param metrics: Exporters, or a single one, receiving a
+            :class:`~quickbook3.metrics.Call` timing each request, defaults
+            to `None` meaning requests are not instrumented.
+        :type metrics: list
+
+        :param token_manager: A manager of OAuth2 tokens, usually shared by
+            the clients of all realms, authenticating the requests instead of
+            the OAuth 1.0a credentials, defaults to `None`.
+        :type token_manager: :class:`~quickbook3.tokens.TokenManager`
+
+        :param response_cache: A cache of the responses of :meth:`report`
+            and of the queries run with ``cached=True``, usually shared by
+            the clients of all realms, defaults to `None`.
+        :type response_cache: :class:`~quickbook3.cache.SQLiteResponseCache`
+
+        :param single_flight: Coalesces the identical get requests sent
+            concurrently, usually shared by the clients of all realms,
+            defaults to `None`.
+        :type single_flight: :class:`~quickbook3.coalesce.SingleFlight`
         :return:
         """
 
-        self.sandbox_mode = sandbox_mode
+        super(QuickBooks, self).__init__(
+            company_id, consumer_key=consumer_key,
+            consumer_secret=consumer_secret, access_token=access_token,
+            access_token_secret=access_token_secret, cred_file=cred_file,
+            sandbox_mode=sandbox_mode, logger=logger,
+            peform_logging=peform_logging, log_level=log_level,
+            token_manager=token_manager)
 
-        self.base_url_v3 = self.sandbox_url if self.sandbox_mode \
-            else self.production_url
+        self.transport = transport
 
-        self.company_id = company_id
+        self.cache = cache
 
-        self.set_credentials(cred_file, consumer_key, consumer_secret,
-                             access_token, access_token_secret)
+        self.response_cache = response_cache
 
-        self.peform_logging = peform_logging
+        self.single_flight = single_flight
 
-        self.logger = logger
+        self.rate_limiter = rate_limiter
 
-        self.log_level = log_level
+        self.retry_policy = retry_policy
 
-        if self.peform_logging and not self.logger:
-            self.logger = logging.getLogger()
-            self.logger.addHandler(logging.StreamHandler(sys.stdout))
-            self.logger.setLevel(self.log_level)
+        if metrics is not None and not isinstance(metrics, (list, tuple)):
+            metrics = [metrics]
+        self.metrics = tuple(metrics) if metrics else None
 
         self._create_session()
 
     def create(self, resource, resource_dict, **params):
         url = self._get_crud_url(resource)
+        resource_dict = as_dict(resource_dict)
         response = self._execute(method='post', url=url,
                                  params=params or {},
                                  json=resource_dict)
 
+        self._cache_entity(resource, response[resource])
+        self._invalidate_responses(resource)
         return response[resource]
 
-    def read(self, resource, resource_id, **params):
+    def batch(self, workers=4):
+        """
+        Returns a :class:`~quickbook3.batch.Batch` to accumulate create,
+        update, delete and query operations that are then submitted together
+        to the batch endpoint.
+
+        :param workers: Number of chunks submitted concurrently, defaults to
+            `4`.
+        :type workers: int
+        """
+
+        return Batch(self, workers=workers)
+
+    def read(self, resource, resource_id, revalidate=False, **params):
+        """
+        Reads an entity. When the client has a cache and no extra `params`
+        are passed, the cached entity is returned if there is one.
+
+        :param revalidate: If `True` the cached entity is only returned
+            after checking with a metadata-only query that it has not
+            changed since, see :meth:`revalidate`, defaults to `False`.
+        :type revalidate: bool
+        """
+
         url = self._get_crud_url(resource, resource_id)
+
+        if self.cache is not None and not params:
+            key = cache_key(self.company_id, resource, resource_id)
+            if revalidate:
+                self.revalidate(resource, [resource_id])
+            entity = self.cache.get(key)
+            if entity is not None:
+                # a copy, the caller may modify it for an update
+                return copy.deepcopy(entity)
+
         response = self._execute(method='get', url=url, params=params or {})
+        self._cache_entity(resource, response[resource])
         return response[resource]
 
+    def read_many(self, resource, ids, workers=4,
+                  chunk_size=BaseQuickBooks.MAX_RESULTS):
+        """
+        Reads many entities with ``Select * ... Where Id in (...)`` queries
+        fetched concurrently, instead of one :meth:`read` per entity. The
+        ids are split so that a query stays under the url length limit and
+        matches at most `chunk_size` entities. Entities in the cache are not
+        fetched. Returns a :class:`~quickbook3.response.ReadManyResponse`.
+
+        :param workers: Number of queries run concurrently, defaults to `4`.
+        :type workers: int
+        :param chunk_size: Maximum number of ids per query, defaults to
+            `1000`.
+        :type chunk_size: int
+        """
+
+        self._get_crud_url(resource)
+        ids = list(OrderedDict.fromkeys(str(resource_id)
+                                        for resource_id in ids))
+        result = ReadManyResponse()
+
+        fetched = []
+        for resource_id in ids:
+            entity = None
+            if self.cache is not None:
+                entity = self.cache.get(cache_key(self.company_id, resource,
+                                                  resource_id))
+            if entity is not None:
+                result.entities[resource_id] = copy.deepcopy(entity)
+            else:
+                fetched.append(resource_id)
+
+        entity_name = model_for(resource).__name__
+        chunks = self._id_chunks(fetched, chunk_size)
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            for query_response in executor.map(
+                    lambda chunk: self.query(self._id_query(entity_name,
+                                                            chunk)),
+                    chunks):
+                for obj in query_response:
+                    result.entities[obj['Id']] = obj
+        finally:
+            executor.shutdown(wait=True)
+
+        result.missing = [resource_id for resource_id in ids
+                          if resource_id not in result.entities]
+        return result
+
+    def revalidate(self, resource, ids=None, chunk_size=500):
+        """
+        Checks the cached entities of a resource against quickbooks and
+        refreshes those that changed. The `SyncToken` of the entities, which
+        quickbooks increments on every write, is fetched with metadata-only
+        queries (``Select Id, SyncToken``) of `chunk_size` ids; entities
+        whose token differs are then fetched again in bulk, and those no
+        longer found are deleted from the cache. Returns a
+        :class:`~quickbook3.cache.Revalidation`.
+
+        :param ids: Ids of the entities, defaults to every cached entity of
+            the resource, which requires a cache listing its keys such as
+            :class:`~quickbook3.lru.LRUCache`.
+        :type ids: list
+        :param chunk_size: Number of ids per query, at most `1000`, defaults
+            to `500`.
+        :type chunk_size: int
+        """
+
+        self._get_crud_url(resource)
+        result = Revalidation()
+        if self.cache is None:
+            return result
+
+        if ids is None:
+            prefix = cache_key(self.company_id, resource, '')
+            ids = [key[len(prefix):] for key in self.cache.keys()
+                   if key.startswith(prefix)]
+
+        cached = {}
+        for resource_id in ids:
+            entity = self.cache.get(cache_key(self.company_id, resource,
+                                              resource_id))
+            if entity is not None:
+                cached[str(resource_id)] = entity
+
+        entity_name = model_for(resource).__name__
+        stale = []
+        for chunk in self._id_chunks(list(cached), chunk_size):
+            querybuilder = self._id_query(entity_name, chunk, 'Id, SyncToken')
+            tokens = dict((obj['Id'], obj.get('SyncToken'))
+                          for obj in self.query(querybuilder))
+
+            for resource_id in chunk:
+                if resource_id not in tokens:
+                    self.cache.delete(cache_key(self.company_id, resource,
+                                                resource_id))
+                    result.deleted.append(resource_id)
+                elif tokens[resource_id] != cached[resource_id]\
+                        .get('SyncToken'):
+                    stale.append(resource_id)
+                else:
+                    result.fresh.append(resource_id)
+
+        for chunk in self._id_chunks(stale, chunk_size):
+            # the entities of a select * query are cached by _query
+            for obj in self.query(self._id_query(entity_name, chunk)):
+                result.refreshed.append(obj['Id'])
+
+        return result
+
     def update(self, resource, resource_dict, **params):
         url = self._get_crud_url(resource)
+        resource_dict = as_dict(resource_dict)
         response = self._execute(method='post', url=url,
                                  params=params or {},
                                  json=resource_dict)
+        self._cache_entity(resource, response[resource])
+        self._invalidate_responses(resource)
         return response[resource]
 
     def delete(self, resource, resource_dict, **params):
         url = self._get_crud_url(resource)
+        resource_dict = as_dict(resource_dict)
         params = params or {}
         params['operation'] = 'delete'
         response = self._execute(method='post', url=url,
                                  params=params,
                                  json=resource_dict)
 
+        self._uncache_entity(resource, response[resource].get('Id') or
+                             resource_dict.get('Id'))
+        self._invalidate_responses(resource)
+
         return response[resource]
 
-    def query(self, querybuilder, **params):
+    def query(self, querybuilder, stream=False, cached=False, **params):
+        """
+        Runs the query built by `querybuilder`.
+
+        :param stream: If `True` returns a
+            :class:`~quickbook3.response.StreamingQueryResponse` yielding the
+            entities as they are decoded from the body, defaults to `False`.
+        :type stream: bool
+        :param cached: If `True` the response may come from the response
+            cache of the client, meant for the queries of reference entities
+            (accounts, tax codes, ...) that seldom change. Count queries are
+            never cached. Defaults to `False`.
+        :type cached: bool
+        """
+
         query = querybuilder.build()
         entity = querybuilder.get_entity()
         count = querybuilder.is_count_query()
-        return self._query(entity, query, count, params)
+        return self._query(entity, query, count, params, stream, cached)
 
-    def _query(self, entity, query, count=False, params=None):
+    def _query(self, entity, query, count=False, params=None, stream=False,
+               cached=False):
         params = params or {}
 
         params['query'] = query
 
         url = "/".join([self.base_url_v3, 'company', self.company_id, 'query'])
 
-        response = self._execute(method='get', url=url, params=params)
+        if stream and not count:
+            return self._execute(method='get', url=url, params=params,
+                                 stream_entity=entity)
+
+        if cached and not count:
+            response = self._get_cached(entity, url, params)
+        else:
+            response = self._execute(method='get', url=url, params=params)
 
         if count:
             return response['QueryResponse']['totalCount']
-        else:
-            return QueryResponse(entity, response['QueryResponse'])
 
-    def batch_query(self, querybuilder, **params):
+        query_response = QueryResponse(entity, response['QueryResponse'])
+        # only complete entities are cached, not those of a partial select
+        if self.cache is not None and query.lower().startswith('select * '):
+            for obj in query_response.object_list:
+                self._cache_entity(entity, obj)
+
+        return query_response
+
+    def batch_query(self, querybuilder, stream=False, keyset=None,
+                    progress=None, **params):
+        """
+        Yields the query responses of every page of the query. With
+        ``stream=True`` the entities of a page must be iterated over before
+        the next page is requested; those left are skipped.
+
+        :param keyset: Pages the query by this key, `'Id'` or
+            `'MetaData.LastUpdatedTime'`, rather than by ``StartPosition``,
+            for consistent and faster scans of large entities. See
+            :class:`~quickbook3.pagination.KeysetPaginator`.
+        :type keyset: str
+        :param progress: Called with the paginator after every page of a
+            keyset pagination.
+        :type progress: callable
+        """
+
         params = params or {}
+        if keyset is not None:
+            if stream:
+                raise InvalidQueryError("Keyset pagination can not stream "
+                                        "the pages")
+            for query_response in KeysetPaginator(self, querybuilder,
+                                                  key=keyset,
+                                                  progress=progress,
+                                                  **params):
+                yield query_response
+            return
+
         maxresults = querybuilder.get_maxresults()
         while True:
-            query_response = self.query(querybuilder, **params)
+            query_response = self.query(querybuilder, stream=stream, **params)
+            yield query_response
+            if stream:
+                query_response.close()
             total_count = query_response.total_count
             startposition = query_response.startposition
-            yield query_response
             if total_count == 0 or total_count < maxresults:
                 return
             else:
                 querybuilder.offset(startposition + maxresults)
 
-    def report(self, name, **params):
+    def parallel_batch_query(self, querybuilder, workers=4, read_ahead=None,
+                             **params):
+        """
+        Like :meth:`batch_query` but pages are fetched concurrently ahead of
+        the consumer. See :class:`~quickbook3.pagination.PrefetchingPaginator`.
+
+        :param workers: Number of pages fetched concurrently, defaults to `4`.
+        :type workers: int
+        :param read_ahead: Maximum number of pages fetched but not yet
+            consumed, defaults to twice the number of workers.
+        :type read_ahead: int
+        """
+
+        return PrefetchingPaginator(self, querybuilder, workers=workers,
+                                    read_ahead=read_ahead, **params)
+
+    def report(self, name, decode=False, **params):
+        """
+        Runs a report.
+
+        :param decode: If `True` returns a
+            :class:`~quickbook3.response.ReportResponse` decoding the report
+            into a table instead of the raw json, defaults to `False`.
+        :type decode: bool
+        """
+
         params = params or {}
 
         url = "/".join([self.base_url_v3, 'company', self.company_id,
                         'reports', name])
 
-        response = self._execute(method='get', url=url, params=params)
+        response = self._get_cached('reports/%s' % name, url, params)
 
+        if decode:
+            return ReportResponse(response)
         return response
 
+    def sharded_report(self, name, start_date, end_date, days=90, workers=4,
+                       retries=2, decode=True, **params):
+        """
+        Runs a transaction list report over a long period as concurrent
+        windows of `days` days merged into one report. See
+        :class:`~quickbook3.reports.ShardedReport`.
+        """
+
+        return ShardedReport(self, name, start_date, end_date, days=days,
+                             workers=workers, retries=retries,
+                             **params).fetch(decode)
+
     def cdc(self, entities, changed_since):
         if isinstance(changed_since, datetime.datetime):
             changed_since = changed_since.isoformat()
@@ -213,74 +650,171 @@ class QuickBooks(object):
         if resp['ErrorCode'] > 0:
             raise DisconnectionError(resp['ErrorCode'], resp['ErrorMessage'])
 
-
-
     @auth_required
     def _execute(self, method, url, **kwargs):
-        method = getattr(self.session, method)
-        headers = {'Accept': 'application/json',
-                   'Content-Type': 'application/json'}
+        if self.metrics is None:
+            return self._execute_shared(method, url, None, **kwargs)
 
-        response = method(url, header_auth=True,
-                          realm=self.company_id, headers=headers,
-                          verify=False, **kwargs)
-        return ResponseParser(response).parse()
+        call = Call(self.company_id, method,
+                    *call_tags(url, method, kwargs.get('params'),
+                               kwargs.get('json')))
+        started = timer()
+        try:
+            return self._execute_shared(method, url, call, **kwargs)
+        except Exception as e:
+            call.error = e.__class__.__name__
+            raise
+        finally:
+            call.duration = timer() - started
+            self._record(call)
+
+    def _execute_shared(self, method, url, call, **kwargs):
+        # streamed responses are read once, they can't be shared
+        if self.single_flight is None or method != 'get' or \
+                kwargs.get('stream_entity') is not None:
+            return self._execute_attempts(method, url, call, **kwargs)
+
+        sent = []
+
+        def send():
+            sent.append(True)
+            return self._execute_attempts(method, url, call, **kwargs)
+
+        key = 'GET ' + response_key(self.company_id, url,
+                                    kwargs.get('params'))
+        try:
+            return self.single_flight.do(key, send)[0]
+        finally:
+            if call is not None:
+                # the response (or error) is the one of another call
+                call.coalesced = not sent
+
+    def _execute_attempts(self, method, url, call, **kwargs):
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(self.company_id)
 
-    def _get_crud_url(self, resource, resource_id=None):
-        resource = resource.lower()
-        if not resource in self.ACCOUNTING_SERVICES:
-            raise InvalidResourceError
+            try:
+                return self._send(method, url, call=call, **kwargs)
+            except HttpQuickBookError as e:
+                if self.retry_policy is None or \
+                        not self.retry_policy.should_retry(e, method, attempt):
+                    raise
+
+                delay = self.retry_policy.delay(e, attempt)
+                if self.logger:
+                    self.logger.warning("Retrying %s %s in %.2fs after: %s",
+                                        method.upper(), url, delay, e)
+                self.retry_policy.sleep(delay)
+                attempt += 1
+                if call is not None:
+                    call.retries = attempt
+
+    def _send(self, method, url, stream_entity=None, call=None, **kwargs):
+        method = getattr(self.session, method)
+        if stream_entity is not None:
+            kwargs['stream'] = True
 
-        urlparts = [self.base_url_v3, 'company', self.company_id,
-                    resource]
+        if call is not None:
+            return self._send_timed(method, url, stream_entity, call,
+                                    **kwargs)
 
-        if resource_id:
-            urlparts.append(resource_id)
+        response = method(url, header_auth=True,
+                          realm=self.company_id, headers=self.headers,
+                          verify=False, **kwargs)
 
-        return "/".join(urlparts)
+        if stream_entity is not None:
+            return ResponseParser(response).parse_stream(stream_entity)
+        return ResponseParser(response).parse()
 
-    def _create_session(self):
-        self.session = OAuth1Session(self.consumer_key,
-                                     self.consumer_secret,
-                                     self.access_token,
-                                     self.access_token_secret)
+    def _send_timed(self, method, url, stream_entity, call, **kwargs):
+        signature = getattr(self.session, 'signature', None)
+        if isinstance(signature, TimedSignature):
+            signature.pop_elapsed()
 
-    def set_credentials(self, cred_file, consumer_key, consumer_secret,
-                        access_token, access_token_secret):
+        started = timer()
+        response = method(url, header_auth=True,
+                          realm=self.company_id, headers=self.headers,
+                          verify=False, **kwargs)
+        sign_time = signature.pop_elapsed() \
+            if isinstance(signature, TimedSignature) else 0.0
+        call.record_response(response, timer() - started, sign_time,
+                             stream_entity is not None)
 
-        if cred_file:
-            self._read_creds_from_file(cred_file)
-        else:
+        started = timer()
+        try:
+            if stream_entity is not None:
+                return ResponseParser(response).parse_stream(stream_entity)
+            return ResponseParser(response).parse()
+        finally:
+            call.parse_time += timer() - started
+
+    def _record(self, call):
+        for exporter in self.metrics:
             try:
-                self.consumer_key = consumer_key or os.environ[
-                    self.CONSUMER_KEY_NAME]
-                self.consumer_secret = consumer_secret or os.environ[
-                    self.CONSUMER_SECRET_NAME]
-
-                self.access_token = access_token or os.environ[
-                    self.ACCESS_TOKEN_NAME]
-                self.access_token_secret = access_token_secret or os.environ[
-                    self.ACCESS_TOKEN_SECRET_NAME]
-
-            except KeyError:
-                raise MissingCredentialsException
-
-    def _read_creds_from_file(self, filename):
-        config = configparser.RawConfigParser()
-        config.read(filename)
+                exporter.record(call)
+            except Exception:
+                # a failing exporter must not fail the request
+                if self.logger:
+                    self.logger.exception("Metrics exporter %r failed",
+                                          exporter)
+
+    def _get_cached(self, resource, url, params):
+        """
+        Sends a get request, answered from the response cache if the client
+        has one caching the responses of `resource`.
+        """
 
-        try:
-            self.consumer_key = config.get('credentials',
-                                           self.CONSUMER_KEY_NAME)
-            self.consumer_secret = config.get('credentials',
-                                              self.CONSUMER_SECRET_NAME)
+        ttl = None
+        if self.response_cache is not None:
+            ttl = self.response_cache.ttl_for(resource, params)
+        if ttl is None:
+            return self._execute(method='get', url=url, params=params)
+
+        key = response_key(self.company_id, url, params)
+        response = self.response_cache.get(key)
+        if response is None:
+            response = self._execute(method='get', url=url, params=params)
+            self.response_cache.set(key, self.company_id, resource, response,
+                                    ttl)
+        return response
 
-            self.access_token = config.get('credentials',
-                                           self.ACCESS_TOKEN_NAME)
-            self.access_token_secret = config.get('credentials',
-                                                  self.ACCESS_TOKEN_SECRET_NAME)
+    def _invalidate_responses(self, resource):
+        if self.response_cache is not None:
+            self.response_cache.invalidate(self.company_id, resource)
+
+    def _cache_entity(self, resource, entity):
+        if self.cache is None or not isinstance(entity, dict) \
+                or 'Id' not in entity:
+            return
+
+        key = cache_key(self.company_id, resource, entity['Id'])
+        cached = self.cache.peek(key)
+        # the response of an older request must not replace a newer entity
+        if cached is not None and \
+                sync_token(cached) > sync_token(entity):
+            return
+        # a copy, the caller may modify the entity it got for an update
+        self.cache.set(key, copy.deepcopy(entity))
+
+    def _uncache_entity(self, resource, resource_id):
+        if self.cache is not None and resource_id is not None:
+            self.cache.delete(cache_key(self.company_id, resource,
+                                        resource_id))
 
-        except configparser.NoOptionError, configparser.NoSectionError:
-            raise MissingCredentialsException
+    def _create_session(self):
+        if self.token_manager is not None:
+            self.session = BearerSession(self.token_manager, self.company_id)
+        else:
+            self.session = OAuth1Session(self.consumer_key,
+                                         self.consumer_secret,
+                                         self.access_token,
+                                         self.access_token_secret,
+                                         signature=CachedHmacSha1Signature)
 
+        if self.transport is not None:
+            self.transport.mount(self.session)
 
+        if self.metrics is not None and self.token_manager is None:
+            self.session.signature = TimedSignature(self.session.signature)
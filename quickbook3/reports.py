@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+
+"""
+quickbook3.reports
+~~~~~~~~~~~~~~~~~~
+
+This module contains :class:`ShardedReport` that fetches a report over a
+long period as several shorter windows, concurrently, and merges them back
+into one report.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from .exceptions import ServerError, ServiceUnavailable, ThrottleError, \
+    UnknownError
+from .response import ReportColumn, ReportResponse
+from .throttle import RetryPolicy
+
+DATE_FORMAT = '%Y-%m-%d'
+
+
+def _to_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    elif isinstance(value, datetime.date):
+        return value
+    return datetime.datetime.strptime(value, DATE_FORMAT).date()
+
+
+def date_windows(start_date, end_date, days=90):
+    """
+    Splits the period from `start_date` to `end_date`, both included, into
+    consecutive windows of at most `days` days. Returns a list of
+    `(start, end)` date pairs.
+    """
+
+    start, end = _to_date(start_date), _to_date(end_date)
+    if start > end:
+        raise ValueError("start_date %s is after end_date %s" % (start, end))
+
+    windows = []
+    step = datetime.timedelta(days=days)
+    while start <= end:
+        window_end = min(start + step - datetime.timedelta(days=1), end)
+        windows.append((start, window_end))
+        start = window_end + datetime.timedelta(days=1)
+    return windows
+
+
+def merge_reports(reports):
+    """
+    Merges the json payloads of a transaction list report run over
+    consecutive windows, in order. Sections are matched by their group or
+    title, keeping the order they first appear in. Data rows, one per
+    transaction, are concatenated. Summary rows add up the amounts of the
+    windows.
+
+    Reports whose rows are not transactions, such as the accounts of
+    ProfitAndLoss or the beginning balances of GeneralLedger, can't be
+    merged this way.
+    """
+
+    reports = list(reports)
+    if not reports:
+        return {}
+
+    merged = dict(reports[0])
+    header = dict(merged.get('Header', {}))
+    header['EndPeriod'] = reports[-1].get('Header', {}).get('EndPeriod')
+    merged['Header'] = header
+
+    columns = [ReportColumn(column) for column in
+               merged.get('Columns', {}).get('Column', [])]
+    rows = []
+    for report in reports:
+        _merge_rows(rows, report.get('Rows', {}).get('Row', []), columns)
+    merged['Rows'] = {'Row': rows}
+    return merged
+
+
+def _section_key(row):
+    header = row.get('Header')
+    title = None
+    if header and header.get('ColData'):
+        title = header['ColData'][0].get('value')
+    return row.get('group'), title
+
+
+def _merge_rows(merged, rows, columns):
+    sections = dict((_section_key(row), row) for row in merged
+                    if 'ColData' not in row)
+    for row in rows:
+        if 'ColData' in row:
+            merged.append(row)
+            continue
+
+        section = sections.get(_section_key(row))
+        if section is None:
+            section = dict(row)
+            section['Rows'] = {'Row': []}
+            section.pop('Summary', None)
+            sections[_section_key(row)] = section
+            merged.append(section)
+
+        _merge_rows(section['Rows']['Row'],
+                    row.get('Rows', {}).get('Row', []), columns)
+        if 'Summary' in row:
+            section['Summary'] = _merge_summary(section.get('Summary'),
+                                                row['Summary'], columns)
+
+
+def _merge_summary(summary, other, columns):
+    if summary is None:
+        return other
+
+    cells = []
+    for position, cell in enumerate(other.get('ColData', [])):
+        previous = summary['ColData'][position] \
+            if position < len(summary.get('ColData', [])) else {}
+        column = columns[position] if position < len(columns) else None
+        if column is None or not column.numeric:
+            cells.append(cell)
+            continue
+
+        total = 0.0
+        for value in (previous.get('value'), cell.get('value')):
+            try:
+                total += float(value)
+            except (TypeError, ValueError):
+                pass
+        merged = dict(cell)
+        merged['value'] = '%.2f' % total
+        cells.append(merged)
+    return {'ColData': cells}
+
+
+class ShardedReport(object):
+    """
+    Runs a report over a long period as windows of `days` days, fetched
+    concurrently on `workers` threads, and merges them, see
+    :func:`merge_reports`::
+
+        report = ShardedReport(client, 'TransactionList', '2012-01-01',
+                               '2016-12-31', days=180).fetch()
+
+    A window failing with one of :attr:`RETRIED_ERRORS`, such as a server
+    side timeout, is retried alone, up to `retries` times, before the error
+    is raised. The delay before a retry is the one of a default
+    :class:`~quickbook3.throttle.RetryPolicy` and honours the `Retry-After`
+    of throttled windows. When the client has a policy of its own, the
+    errors it retries have already been retried by the client and only the
+    others are retried here, with the delays of the client's policy.
+
+    Only the transaction list reports of :attr:`REPORTS` can be sharded,
+    since merging windows of the other reports would repeat their account
+    rows or beginning balances once per window.
+    """
+
+    REPORTS = ('TransactionList', 'TransactionListWithSplits',
+               'TransactionListByCustomer', 'TransactionListByVendor')
+
+    RETRIED_ERRORS = (ServerError, ServiceUnavailable, ThrottleError,
+                      UnknownError)
+
+    def __init__(self, client, name, start_date, end_date, days=90,
+                 workers=4, retries=2, **params):
+        """
+        :param client: Client used to run the report.
+        :type client: :class:`~quickbook3.quickbook.QuickBooks`
+        :param name: Name of the report, one of :attr:`REPORTS`.
+        :type name: str
+        :param days: Number of days of a window, defaults to `90`.
+        :type days: int
+        :param workers: Number of windows fetched concurrently, defaults to
+            `4`.
+        :type workers: int
+        :param retries: Number of times a failed window is retried, defaults
+            to `2`.
+        :type retries: int
+        :param params: Other parameters of the report.
+        """
+
+        if name.lower() not in [report.lower() for report in self.REPORTS]:
+            raise ValueError("The %s report can't be sharded, only %s can"
+                             % (name, ', '.join(self.REPORTS)))
+
+        self.client = client
+        self.name = name
+        self.windows = date_windows(start_date, end_date, days)
+        self.workers = workers
+        self.retries = retries
+        self.params = params
+
+    def fetch(self, decode=True):
+        """
+        Returns the merged report, a
+        :class:`~quickbook3.response.ReportResponse` or, if `decode` is
+        `False`, its json payload.
+        """
+
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        futures = []
+        try:
+            futures = [executor.submit(self._fetch, start, end)
+                       for start, end in self.windows]
+            merged = merge_reports([future.result() for future in futures])
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+        if decode:
+            return ReportResponse(merged)
+        return merged
+
+    def _fetch(self, start, end):
+        params = dict(self.params)
+        params['start_date'] = start.strftime(DATE_FORMAT)
+        params['end_date'] = end.strftime(DATE_FORMAT)
+
+        policy = getattr(self.client, 'retry_policy', None)
+        # the errors the client retried itself are not retried again
+        retried_by_client = policy.RETRIED_ERRORS if policy else ()
+        policy = policy or RetryPolicy()
+        attempt = 0
+        while True:
+            try:
+                return self.client.report(self.name, **params)
+            except self.RETRIED_ERRORS as e:
+                if attempt >= self.retries or \
+                        isinstance(e, retried_by_client):
+                    raise
+                if policy.max_retry_after is not None and \
+                        (getattr(e, 'retry_after', None) or 0) > \
+                        policy.max_retry_after:
+                    # quickbooks asks to wait longer than the policy allows
+                    raise
+                policy.sleep(policy.delay(e, attempt))
+                attempt += 1
@@ -3,11 +3,22 @@
 from __future__ import absolute_import
 from __future__ import division
 
+import time
+from array import array
+from decimal import Decimal
+from email.utils import mktime_tz, parsedate_tz
+
 import requests
-import xmltodict
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
 
 from .exceptions import AuthenticationError, PermissionDenied, NotFoundError, \
-    ServerError, ServiceUnavailable, ValidationFault, UnknownError
+    ServerError, ServiceUnavailable, ValidationFault, UnknownError, \
+    ServiceError, ThrottleError
+from .models import model_for
 
 
 class ResponseParser(object):
@@ -47,9 +58,26 @@ class ResponseParser(object):
             else:
                 return json_response
 
+    def parse_stream(self, entity):
+        """
+        Like :meth:`parse` but for a query response requested with
+        ``stream=True``: returns a :class:`StreamingQueryResponse` decoding
+        the body incrementally. Errors are raised before any entity is
+        yielded.
+        """
+
+        if self.response.status_code != requests.codes.ok or \
+                self.is_xml_response():
+            return self.parse()
+
+        return StreamingQueryResponse(entity, self.response)
+
     def parse_http_error(self):
         status_code = self.response.status_code
-        if status_code in self.HTTP_CODE_EXCEPTION_MAP:
+        if status_code == requests.codes.too_many_requests:
+            raise ThrottleError(self.response.reason, self.get_retry_after())
+
+        elif status_code in self.HTTP_CODE_EXCEPTION_MAP:
             exception = self.HTTP_CODE_EXCEPTION_MAP[status_code]
 
             raise exception(self.response.reason)
@@ -61,6 +89,9 @@ class ResponseParser(object):
 
     def parse_quickbooks_error(self):
         if self.is_xml_response():
+            # only the errors of the xml api need xmltodict, not worth
+            # importing for every client
+            import xmltodict
             parsed_error = xmltodict.parse(self.response.json)
             fault = parsed_error['IntuitResponse']['Fault']
             fault_type = fault['@type'].upper()
@@ -74,6 +105,36 @@ class ResponseParser(object):
 
         raise self.FAULT_TYPE_EXCEPTION_MAP[fault_type](fault['Error'])
 
+    @classmethod
+    def fault_exception(cls, fault):
+        """
+        Returns (without raising) the exception corresponding to a json
+        `Fault` object, as found in the items of a batch response.
+        """
+
+        exception = cls.FAULT_TYPE_EXCEPTION_MAP.get(fault['type'].upper(),
+                                                     ServiceError)
+        return exception(fault['Error'])
+
+    def get_retry_after(self):
+        """
+        Returns the seconds of the `Retry-After` header, if any, given either
+        as a number of seconds or as the http date after which to retry.
+        """
+
+        value = self.response.headers.get('retry-after')
+        if value is None:
+            return None
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            pass
+
+        moment = parsedate_tz(value)
+        if moment is None:
+            return None
+        return max(mktime_tz(moment) - time.time(), 0.0)
+
     def is_xml_response(self):
         return 'xml' in self.response.headers['content-type']
 
@@ -87,12 +148,141 @@ class QueryResponse(object):
         self.maxresults = query_response.get('maxResults', 0)
         self.total_count = query_response.get('totalCount', self.maxresults)
 
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def models(self):
+        """
+        Yields the entities as :mod:`~quickbook3.models` models.
+        """
+
+        model = model_for(self.entity)
+        for obj in self.object_list:
+            yield model.from_dict(obj)
+
     def __repr__(self):
         return "Entity: %s, StartPosition: %d, Count: %d, " \
                "MaxResults: %d" % (self.entity, self.startposition,
                                    self.total_count, self.maxresults)
 
 
+class _RawReader(object):
+    """
+    A file like object over the raw body of a streamed response that
+    transparently decodes gzip/deflate content encodings.
+    """
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def read(self, size=-1):
+        return self.raw.read(size if size >= 0 else None, decode_content=True)
+
+
+class StreamingQueryResponse(object):
+    """
+    A query response whose entities are decoded one at a time from the body
+    of the http response, instead of materializing the whole page::
+
+        for invoice in client.query(qb, stream=True):
+            process(invoice)
+
+    Only the entity being yielded is held in memory. A `Fault` in the body
+    is raised when the response is created, before any entity is yielded.
+    As quickbooks sends the pagination attributes after the entities,
+    `startposition`, `maxresults` and `total_count` are only known once the
+    entities have been iterated over or the response has been closed.
+    Requires the ijson package (``pip install quickbooks-py[stream]``).
+    """
+
+    def __init__(self, entity, response):
+        if ijson is None:
+            raise ImportError("Streaming query responses require ijson")
+
+        self.entity = entity
+        self.response = response
+        self.startposition = 1
+        self.maxresults = 0
+        self._total_count = None
+        self._item_prefix = 'QueryResponse.%s.item' % entity
+        self._events = ijson.parse(_RawReader(response.raw))
+        self._next = self._next_entity()
+
+    @property
+    def total_count(self):
+        if self._total_count is None:
+            return self.maxresults
+        return self._total_count
+
+    def __iter__(self):
+        while self._next is not None:
+            entity, self._next = self._next, self._next_entity()
+            yield entity
+
+    def models(self):
+        """
+        Like :meth:`__iter__` but yields the entities as
+        :mod:`~quickbook3.models` models.
+        """
+
+        model = model_for(self.entity)
+        for obj in self:
+            yield model.from_dict(obj)
+
+    def close(self):
+        """
+        Skips the entities not iterated over yet, so that the pagination
+        attributes are read, and releases the connection.
+        """
+
+        while self._next is not None:
+            self._next = self._next_entity()
+
+    def _next_entity(self):
+        for prefix, event, value in self._events:
+            if prefix == self._item_prefix:
+                return self._build(event, value)
+
+            elif prefix == '' and event == 'map_key' and value == 'Fault':
+                prefix, event, value = next(self._events)
+                self.response.close()
+                raise ResponseParser.fault_exception(self._build(event, value))
+
+            elif prefix == 'QueryResponse.startPosition':
+                self.startposition = value
+            elif prefix == 'QueryResponse.maxResults':
+                self.maxresults = value
+            elif prefix == 'QueryResponse.totalCount':
+                self._total_count = value
+
+        self.response.close()
+        return None
+
+    def _build(self, event, value):
+        if event == 'start_map':
+            obj = {}
+            for prefix, event, value in self._events:
+                if event == 'end_map':
+                    return obj
+                prefix, event, child = next(self._events)
+                obj[value] = self._build(event, child)
+
+        elif event == 'start_array':
+            array = []
+            for prefix, event, value in self._events:
+                if event == 'end_array':
+                    return array
+                array.append(self._build(event, value))
+
+        elif isinstance(value, Decimal):
+            return float(value)
+
+        return value
+
+    def __repr__(self):
+        return "Entity: %s, Streaming" % self.entity
+
+
 class CDCResponse(object):
     def __init__(self, entities, cdc_response):
         if isinstance(cdc_response, (list, tuple)):
@@ -121,4 +311,285 @@ class CDCResponse(object):
                  (str({entity: len(self.delete[entity])
                        for entity in self.delete.keys()}))
         
-        return "%s, %s" % (upsert, delete)
\ No newline at end of file
+        return "%s, %s" % (upsert, delete)
+
+
+class ReadManyResponse(object):
+    """
+    Entities read by :meth:`~quickbook3.quickbook.QuickBooks.read_many`
+    keyed by id. Ids that were not found are listed in :attr:`missing` and
+    raise :class:`~quickbook3.exceptions.NotFoundError`::
+
+        customers = client.read_many('customer', ['1', '2', '3'])
+        for customer_id in customers.missing:
+            ...
+    """
+
+    def __init__(self):
+        self.entities = {}
+        self.missing = []
+
+    def __getitem__(self, resource_id):
+        try:
+            return self.entities[str(resource_id)]
+        except KeyError:
+            raise NotFoundError()
+
+    def __contains__(self, resource_id):
+        return str(resource_id) in self.entities
+
+    def __iter__(self):
+        return iter(self.entities)
+
+    def __len__(self):
+        return len(self.entities)
+
+    def __repr__(self):
+        return "Found: %d, Missing: %d" % (len(self.entities),
+                                           len(self.missing))
+
+
+class BatchResponse(object):
+    """
+    Results of a batch request keyed by the batch item id (`bId`). Items
+    that failed are kept in :attr:`faults` as exceptions instead of
+    :attr:`results`::
+
+        try:
+            invoice = batch_response['invoice-1']
+        except ValidationFault as e:
+            ...
+    """
+
+    def __init__(self, entities=None):
+        self.entities = entities or {}
+        self.results = {}
+        self.faults = {}
+
+    def add_items(self, batch_item_responses):
+        for item in batch_item_responses:
+            bid = item['bId']
+            if 'Fault' in item:
+                self.faults[bid] = ResponseParser.fault_exception(item['Fault'])
+            elif 'QueryResponse' in item:
+                self.results[bid] = QueryResponse(self.entities.get(bid),
+                                                  item['QueryResponse'])
+            else:
+                self.results[bid] = next(value for key, value in item.items()
+                                         if key != 'bId')
+
+    def add_fault(self, bid, exception):
+        self.faults[bid] = exception
+
+    def __getitem__(self, bid):
+        if bid in self.faults:
+            raise self.faults[bid]
+        return self.results[bid]
+
+    def __contains__(self, bid):
+        return bid in self.results or bid in self.faults
+
+    def __len__(self):
+        return len(self.results) + len(self.faults)
+
+    def __repr__(self):
+        return "Results: %d, Faults: %d" % (len(self.results),
+                                            len(self.faults))
+
+
+class ReportColumn(object):
+    """
+    A column of a report. Values of numeric columns (amounts) are decoded
+    into floats, `nan` standing for a missing value; others are kept as
+    strings.
+    """
+
+    NUMERIC_TYPES = ('Money',)
+
+    NUMERIC_KEY_SUFFIXES = ('amount', '_amt', 'rbal', 'quantity', 'rate')
+
+    def __init__(self, column):
+        self.title = column.get('ColTitle', '')
+        self.type = column.get('ColType')
+        self.key = None
+        for meta in column.get('MetaData', []):
+            if meta.get('Name') == 'ColKey':
+                self.key = meta.get('Value')
+
+        self.numeric = self.type in self.NUMERIC_TYPES or \
+            bool(self.key and self.key.lower().endswith(
+                self.NUMERIC_KEY_SUFFIXES))
+
+    def empty(self):
+        return array('d') if self.numeric else []
+
+    def decode(self, value):
+        if not self.numeric:
+            return value
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return float('nan')
+
+    def __repr__(self):
+        return "ReportColumn: %s (%s)" % (self.key or self.title, self.type)
+
+
+class ReportSection(object):
+    """
+    A section of a report, such as `Income`. The rows of a section are those
+    whose :attr:`ReportResponse.row_sections` is its `index`, its header and
+    summary rows being :attr:`header_row` and :attr:`summary_row`.
+    """
+
+    def __init__(self, index, group, title, parent, depth):
+        self.index = index
+        self.group = group
+        self.title = title
+        self.parent = parent
+        self.depth = depth
+        self.header_row = None
+        self.summary_row = None
+
+    def __repr__(self):
+        return "ReportSection: %s" % (self.group or self.title)
+
+
+class ReportRow(object):
+    """
+    A row of a report, built on the fly by :class:`ReportResponse`.
+    """
+
+    __slots__ = ('index', 'kind', 'depth', 'section', 'id', 'values')
+
+    def __init__(self, index, kind, depth, section, id, values):
+        self.index = index
+        self.kind = kind
+        self.depth = depth
+        self.section = section
+        self.id = id
+        self.values = values
+
+    def __getitem__(self, position):
+        return self.values[position]
+
+    def __repr__(self):
+        return "ReportRow: %s %r" % (self.kind, self.values)
+
+
+class ReportResponse(object):
+    """
+    A report decoded into a table, one array per column, see
+    :class:`ReportColumn`. The nested sections of the report are flattened
+    into rows in the order quickbooks sends them: a section's header row,
+    its rows then its summary (total) row. The hierarchy is kept as indexes:
+    the kind (`Header`, `Data` or `Summary`), depth and section of each row,
+    sections being in :attr:`sections`::
+
+        report = client.report('ProfitAndLoss', decode=True)
+        for row in report.data_rows():
+            print(report.sections[row.section].group, row.values)
+
+    The payload is walked once, without recursion nor copies of its rows.
+    """
+
+    HEADER = 'Header'
+    DATA = 'Data'
+    SUMMARY = 'Summary'
+
+    def __init__(self, report):
+        header = report.get('Header', {})
+        self.name = header.get('ReportName')
+        self.start_period = header.get('StartPeriod')
+        self.end_period = header.get('EndPeriod')
+        self.currency = header.get('Currency')
+        self.options = dict((option.get('Name'), option.get('Value'))
+                            for option in header.get('Option', []))
+
+        self.columns = [ReportColumn(column) for column in
+                        report.get('Columns', {}).get('Column', [])]
+        self.data = [column.empty() for column in self.columns]
+        self.sections = []
+        self.row_kinds = []
+        self.row_depths = array('i')
+        self.row_sections = array('i')
+        self.row_ids = []
+        self._decode(report.get('Rows', {}).get('Row', []))
+
+    def _decode(self, rows):
+        stack = [(iter(rows), -1, 0, None)]
+        while stack:
+            rows, section, depth, summary = stack[-1]
+            row = next(rows, None)
+            if row is None:
+                stack.pop()
+                if summary is not None:
+                    self.sections[section].summary_row = len(self.row_kinds)
+                    self._add_row(self.SUMMARY, summary, section, depth - 1)
+
+            elif 'ColData' in row:
+                self._add_row(self.DATA, row, section, depth)
+
+            else:
+                index = len(self.sections)
+                header = row.get('Header')
+                title = None
+                if header and header.get('ColData'):
+                    title = header['ColData'][0].get('value')
+                child = ReportSection(index, row.get('group'), title,
+                                      section, depth)
+                self.sections.append(child)
+                if header is not None:
+                    child.header_row = len(self.row_kinds)
+                    self._add_row(self.HEADER, header, index, depth)
+                stack.append((iter(row.get('Rows', {}).get('Row', [])),
+                              index, depth + 1, row.get('Summary')))
+
+    def _add_row(self, kind, row, section, depth):
+        self.row_kinds.append(kind)
+        self.row_depths.append(depth)
+        self.row_sections.append(section)
+
+        row_id = None
+        cells = row.get('ColData', [])
+        for position, column in enumerate(self.columns):
+            cell = cells[position] if position < len(cells) else {}
+            if row_id is None:
+                row_id = cell.get('id')
+            self.data[position].append(column.decode(cell.get('value')))
+        self.row_ids.append(row_id)
+
+    def column(self, name):
+        """
+        Returns the values of a column, given its key or title.
+        """
+
+        for position, column in enumerate(self.columns):
+            if name in (column.key, column.title):
+                return self.data[position]
+        raise KeyError(name)
+
+    def row(self, index):
+        return ReportRow(index, self.row_kinds[index], self.row_depths[index],
+                         self.row_sections[index], self.row_ids[index],
+                         [values[index] for values in self.data])
+
+    def __iter__(self):
+        for index in range(len(self.row_kinds)):
+            yield self.row(index)
+
+    def data_rows(self):
+        """
+        Yields the data rows, leaving out section headers and summaries.
+        """
+
+        for index, kind in enumerate(self.row_kinds):
+            if kind == self.DATA:
+                yield self.row(index)
+
+    def __len__(self):
+        return len(self.row_kinds)
+
+    def __repr__(self):
+        return "Report: %s, Columns: %d, Rows: %d" % (
+            self.name, len(self.columns), len(self))
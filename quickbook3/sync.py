@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+
+"""
+quickbook3.sync
+~~~~~~~~~~~~~~~
+
+This module contains :class:`CDCSyncer`, an incremental sync engine built on
+top of the change data capture endpoint, along with the stores used to
+persist its per realm, per entity watermarks.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import datetime
+import re
+import sqlite3
+import threading
+
+from .exceptions import InvalidQueryError, QuickBooksError
+from .querybuilder import QueryBuilder
+
+
+class _UTC(datetime.tzinfo):
+
+    def utcoffset(self, dt):
+        return datetime.timedelta(0)
+
+    def tzname(self, dt):
+        return 'UTC'
+
+    def dst(self, dt):
+        return datetime.timedelta(0)
+
+
+UTC = _UTC()
+
+WATERMARK_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+_TIMESTAMP_RE = re.compile(r'^(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(?:\.\d+)?'
+                           r'(?:Z|([+-])(\d\d):(\d\d))?$')
+
+
+def format_watermark(moment):
+    """
+    Formats an utc datetime as stored in a watermark store.
+    """
+
+    return moment.replace(microsecond=0, tzinfo=UTC).isoformat()
+
+
+def parse_watermark(watermark):
+    """
+    Parses a watermark written by :func:`format_watermark` back into an
+    aware utc datetime.
+    """
+
+    return datetime.datetime.strptime(watermark[:19], WATERMARK_FORMAT)\
+        .replace(tzinfo=UTC)
+
+
+def parse_timestamp(value):
+    """
+    Parses a timestamp of the api, e.g. `'2016-01-01T10:00:00-08:00'`, into
+    an aware utc datetime.
+    """
+
+    match = _TIMESTAMP_RE.match(value or '')
+    if match is None:
+        raise InvalidQueryError("Invalid timestamp: %s" % value)
+
+    moment = datetime.datetime.strptime(match.group(1), WATERMARK_FORMAT)
+    if match.group(2):
+        offset = datetime.timedelta(hours=int(match.group(3)),
+                                    minutes=int(match.group(4)))
+        moment -= offset if match.group(2) == '+' else -offset
+    return moment.replace(tzinfo=UTC)
+
+
+class WatermarkStore(object):
+    """
+    Interface of the stores persisting the watermarks of :class:`CDCSyncer`.
+    A watermark is the utc time, formatted by :func:`format_watermark`, up to
+    which the changes of an entity of a realm have been synced.
+    """
+
+    def get(self, realm, entity):
+        raise NotImplementedError
+
+    def set(self, realm, entity, watermark):
+        raise NotImplementedError
+
+    def delete(self, realm, entity):
+        raise NotImplementedError
+
+
+class MemoryWatermarkStore(WatermarkStore):
+
+    def __init__(self):
+        self.watermarks = {}
+
+    def get(self, realm, entity):
+        return self.watermarks.get((realm, entity))
+
+    def set(self, realm, entity, watermark):
+        self.watermarks[(realm, entity)] = watermark
+
+    def delete(self, realm, entity):
+        self.watermarks.pop((realm, entity), None)
+
+
+class SQLiteWatermarkStore(WatermarkStore):
+    """
+    Persists the watermarks in a sqlite database, which may be shared by
+    several threads and processes.
+    """
+
+    DEFAULT_PATH = 'quickbook3-watermarks.db'
+
+    def __init__(self, path=DEFAULT_PATH):
+        """
+        :param path: Path of the sqlite database, created if missing,
+            defaults to :attr:`DEFAULT_PATH` in the working directory.
+        :type path: str
+        """
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False,
+                                           timeout=30)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS watermarks ('
+                'realm TEXT NOT NULL, entity TEXT NOT NULL, '
+                'watermark TEXT NOT NULL, PRIMARY KEY (realm, entity))')
+
+    def get(self, realm, entity):
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT watermark FROM watermarks '
+                'WHERE realm = ? AND entity = ?', (realm, entity)).fetchone()
+        return row[0] if row else None
+
+    def set(self, realm, entity, watermark):
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO watermarks (realm, entity, watermark) '
+                'VALUES (?, ?, ?)', (realm, entity, watermark))
+
+    def delete(self, realm, entity):
+        with self._lock, self._connection:
+            self._connection.execute(
+                'DELETE FROM watermarks WHERE realm = ? AND entity = ?',
+                (realm, entity))
+
+    def close(self):
+        self._connection.close()
+
+
+class SyncBatch(object):
+    """
+    A batch of changed objects of an entity emitted by :class:`CDCSyncer`.
+    `source` is either ``'cdc'`` or ``'query'`` for batches read by
+    paginating over `MetaData.LastUpdatedTime`, which carry no deletes.
+    """
+
+    def __init__(self, realm, entity, upsert, delete, source):
+        self.realm = realm
+        self.entity = entity
+        self.upsert = upsert
+        self.delete = delete
+        self.source = source
+
+    def __repr__(self):
+        return "Realm: %s, Entity: %s, Source: %s, Upsert: %d, " \
+               "Delete: %d" % (self.realm, self.entity, self.source,
+                               len(self.upsert), len(self.delete))
+
+
+class CDCSyncer(object):
+    """
+    Incrementally syncs entities of a realm, remembering in a
+    :class:`WatermarkStore` up to when each entity has been synced::
+
+        syncer = CDCSyncer(client, ['Customer', 'Invoice'],
+                           store=SQLiteWatermarkStore('watermarks.db'))
+        for batch in syncer.sync():
+            save(batch.entity, batch.upsert)
+            remove(batch.entity, batch.delete)
+
+    Entities sharing the same watermark are fetched with one cdc call. An
+    entity whose cdc response holds :attr:`CDC_MAX_OBJECTS` objects is
+    considered truncated: quickbooks returning the first changes since the
+    watermark, those before the last change time of the response are
+    emitted and the entity is fetched again from that time, until a
+    response isn't truncated. Entities never synced, or whose watermark is
+    older than :attr:`CDC_MAX_AGE`, are read by paginating over
+    `MetaData.LastUpdatedTime` since the cdc endpoint can't go that far
+    back; deletes are not reported in that case.
+
+    The watermark of an entity is only advanced over the changes whose
+    batches have been consumed, so a sync interrupted half way is resumed
+    from there.
+    """
+
+    CDC_MAX_AGE = datetime.timedelta(days=30)
+
+    CDC_MAX_OBJECTS = 1000
+
+    def __init__(self, client, entities, store=None, overlap=60,
+                 page_size=1000, clock=None):
+        """
+        :param client: Client of the realm to sync.
+        :type client: :class:`~quickbook3.quickbook.QuickBooks`
+        :param entities: Names of the entities to sync e.g. `['Customer']`.
+        :type entities: list
+        :param store: Store of the watermarks, defaults to a
+            :class:`SQLiteWatermarkStore` at its default path.
+        :type store: :class:`WatermarkStore`
+        :param overlap: Seconds substracted from the time of a sync to get its
+            watermark to account for clock skew, defaults to `60`.
+        :type overlap: int
+        :param page_size: Page size of the queries, defaults to `1000`.
+        :type page_size: int
+        :param clock: Callable returning the current utc datetime, defaults to
+            :meth:`datetime.datetime.utcnow`.
+        """
+
+        self.client = client
+        self.entities = list(entities)
+        self.store = store if store is not None else SQLiteWatermarkStore()
+        self.overlap = datetime.timedelta(seconds=overlap)
+        self.page_size = page_size
+        self.clock = clock or datetime.datetime.utcnow
+
+    @property
+    def realm(self):
+        return self.client.company_id
+
+    def sync(self):
+        """
+        Yields the :class:`SyncBatch` objects of every entity changed since
+        its watermark.
+        """
+
+        now = self.clock()
+        next_watermark = format_watermark(now - self.overlap)
+
+        cdc_groups = {}
+        for entity in self.entities:
+            watermark = self.store.get(self.realm, entity)
+            if watermark and now.replace(tzinfo=UTC) - \
+                    parse_watermark(watermark) < self.CDC_MAX_AGE:
+                cdc_groups.setdefault(watermark, []).append(entity)
+            else:
+                for batch in self._query_changes(entity, watermark):
+                    yield batch
+                self.store.set(self.realm, entity, next_watermark)
+
+        for watermark in sorted(cdc_groups):
+            entities = cdc_groups[watermark]
+            cdc_response = self.client.cdc(entities,
+                                           parse_watermark(watermark))
+            for entity in entities:
+                for batch in self._cdc_changes(entity, watermark,
+                                               cdc_response):
+                    yield batch
+                self.store.set(self.realm, entity, next_watermark)
+
+    def _cdc_changes(self, entity, watermark, cdc_response):
+        since = parse_watermark(watermark)
+        while True:
+            upsert = cdc_response.upsert[entity]
+            delete = cdc_response.delete[entity]
+            if len(upsert) + len(delete) < self.CDC_MAX_OBJECTS:
+                yield SyncBatch(self.realm, entity, upsert, delete, 'cdc')
+                return
+
+            # the changes of the last time may go on past the response, they
+            # are fetched again with the next window
+            last = max(self._changed_at(obj) for obj in upsert + delete)
+            if last <= since:
+                raise QuickBooksError(
+                    "More than %d changes of %s at %s" % (
+                        self.CDC_MAX_OBJECTS, entity, format_watermark(last)))
+
+            yield SyncBatch(self.realm, entity,
+                            [obj for obj in upsert
+                             if self._changed_at(obj) < last],
+                            [obj for obj in delete
+                             if self._changed_at(obj) < last], 'cdc')
+            since = last
+            self.store.set(self.realm, entity, format_watermark(since))
+            cdc_response = self.client.cdc([entity], since)
+
+    def _changed_at(self, obj):
+        return parse_timestamp(obj.get('MetaData', {}).get('LastUpdatedTime'))
+
+    def _query_changes(self, entity, watermark):
+        querybuilder = QueryBuilder(entity)
+        if watermark:
+            querybuilder.where('MetaData.LastUpdatedTime')\
+                .gte(parse_watermark(watermark))
+        querybuilder.limit(self.page_size).offset(1)
+
+        for query_response in self.client.batch_query(querybuilder):
+            if query_response.object_list:
+                yield SyncBatch(self.realm, entity,
+                                query_response.object_list, [], 'query')
+
+    def reset(self, entity=None):
+        """
+        Forgets the watermark of an entity, or of all the entities, so that
+        the next sync reads them in full.
+        """
+
+        for name in ([entity] if entity else self.entities):
+            self.store.delete(self.realm, name)
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+"""
+quickbook3.throttle
+~~~~~~~~~~~~~~~~~~~
+
+This module contains the client side rate limiter and the retry policy
+applied by :class:`~quickbook3.quickbook.QuickBooks` to every request.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import random
+import threading
+import time
+
+from .exceptions import ThrottleError, ServiceUnavailable, ServerError
+
+monotonic = getattr(time, 'monotonic', time.time)
+
+
+class TokenBucket(object):
+    """
+    A thread-safe token bucket refilled with `rate` tokens per second and
+    holding at most `burst` tokens.
+    """
+
+    def __init__(self, rate, burst, clock=monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.clock = clock
+        self.sleep = sleep
+        self.updated_at = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self, tokens=1):
+        """
+        Takes `tokens` tokens if available and returns `0`, otherwise returns
+        the number of seconds to wait for them.
+        """
+
+        with self._lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0
+            return (tokens - self.tokens) / self.rate
+
+    def acquire(self, tokens=1):
+        """
+        Blocks until `tokens` tokens are taken from the bucket.
+        """
+
+        wait = self.try_acquire(tokens)
+        while wait:
+            self.sleep(wait)
+            wait = self.try_acquire(tokens)
+
+
+class RateLimiter(object):
+    """
+    Holds one :class:`TokenBucket` per realm. A single rate limiter is meant
+    to be shared by all the clients and threads of a process, so that the
+    requests sent to a realm stay under the quickbooks throttling limits::
+
+        limiter = RateLimiter(rate=8, burst=10)
+        client = QuickBooks(company_id, rate_limiter=limiter, **creds)
+    """
+
+    def __init__(self, rate=500 / 60, burst=10, clock=monotonic,
+                 sleep=time.sleep):
+        """
+        :param rate: Requests per second allowed for a realm, defaults to
+            500 per minute.
+        :type rate: float
+        :param burst: Requests that may be sent at once after a pause,
+            defaults to `10`.
+        :type burst: int
+        """
+
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self.buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, realm):
+        bucket = self.buckets.get(realm)
+        if bucket is None:
+            with self._lock:
+                bucket = self.buckets.setdefault(
+                    realm, TokenBucket(self.rate, self.burst,
+                                       clock=self.clock, sleep=self.sleep))
+        return bucket
+
+    def acquire(self, realm):
+        self.bucket(realm).acquire()
+
+
+class RetryPolicy(object):
+    """
+    Decides whether a failed request is retried and how long to wait before.
+
+    Throttled requests (:class:`~quickbook3.exceptions.ThrottleError`) are
+    always retried since quickbooks did not process them, unless their
+    `Retry-After` header asks for more than `max_retry_after` seconds. Server
+    errors (:class:`~quickbook3.exceptions.ServerError` and
+    :class:`~quickbook3.exceptions.ServiceUnavailable`) are only retried for
+    idempotent methods. The delay grows exponentially from `backoff` up to
+    `max_backoff` seconds, with full jitter, and is never shorter than the
+    `Retry-After` of the response.
+    """
+
+    IDEMPOTENT_METHODS = ('get', 'head', 'options')
+
+    RETRIED_ERRORS = (ThrottleError, ServerError, ServiceUnavailable)
+
+    def __init__(self, max_retries=3, backoff=0.5, max_backoff=30,
+                 jitter=True, max_retry_after=300, sleep=time.sleep):
+        """
+        :param max_retries: Maximum number of retries of a request, defaults
+            to `3`.
+        :type max_retries: int
+        :param backoff: Base delay in seconds, defaults to `0.5`.
+        :type backoff: float
+        :param max_backoff: Maximum delay in seconds, defaults to `30`.
+        :type max_backoff: float
+        :param jitter: Whether to randomize the delays, defaults to `True`.
+        :type jitter: bool
+        :param max_retry_after: Longest `Retry-After` in seconds waited for
+            before retrying, the request fails on longer ones. Defaults to
+            `300`, `None` waits for any.
+        :type max_retry_after: float
+        """
+
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.max_retry_after = max_retry_after
+        self.sleep = sleep
+
+    def should_retry(self, exception, method, attempt):
+        if attempt >= self.max_retries:
+            return False
+
+        if isinstance(exception, ThrottleError):
+            retry_after = exception.retry_after
+            return self.max_retry_after is None or retry_after is None or \
+                retry_after <= self.max_retry_after
+
+        return isinstance(exception, self.RETRIED_ERRORS) and \
+            method.lower() in self.IDEMPOTENT_METHODS
+
+    def delay(self, exception, attempt):
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        if self.jitter:
+            delay = random.uniform(0, delay)
+
+        # retrying before the Retry-After would only be throttled again
+        retry_after = getattr(exception, 'retry_after', None)
+        if retry_after is not None:
+            return max(retry_after, delay)
+        return delay
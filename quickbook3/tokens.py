@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+
+"""
+quickbook3.tokens
+~~~~~~~~~~~~~~~~~
+
+This module contains :class:`TokenManager`, which keeps the OAuth2 tokens of
+many realms valid by refreshing them before they expire, the stores
+persisting the tokens and :class:`BearerSession`, the session through which
+a :class:`~quickbook3.quickbook.QuickBooks` client authenticates with them.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+import requests
+
+from .exceptions import TokenError
+
+logger = logging.getLogger(__name__)
+
+
+class OAuth2Token(object):
+    """
+    The tokens of a realm. `expires_at` and `refresh_expires_at` are the unix
+    times at which the access token and the refresh token expire.
+    """
+
+    def __init__(self, realm, access_token, refresh_token, expires_at,
+                 refresh_expires_at=None):
+        self.realm = realm
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        self.expires_at = expires_at
+        self.refresh_expires_at = refresh_expires_at
+
+    @classmethod
+    def from_response(cls, body, realm=None, now=None):
+        """
+        Returns the token of a response of the token endpoint.
+        """
+
+        now = time.time() if now is None else now
+        refresh_expires_in = body.get('x_refresh_token_expires_in')
+        return cls(realm, body['access_token'], body.get('refresh_token'),
+                   now + float(body.get('expires_in', 3600)),
+                   now + float(refresh_expires_in)
+                   if refresh_expires_in is not None else None)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['realm'], data['access_token'],
+                   data.get('refresh_token'), data['expires_at'],
+                   data.get('refresh_expires_at'))
+
+    def as_dict(self):
+        return {'realm': self.realm, 'access_token': self.access_token,
+                'refresh_token': self.refresh_token,
+                'expires_at': self.expires_at,
+                'refresh_expires_at': self.refresh_expires_at}
+
+    def expires_in(self, now=None):
+        return self.expires_at - (time.time() if now is None else now)
+
+    def __repr__(self):
+        return "Realm: %s, Expires at: %s" % (self.realm, self.expires_at)
+
+
+class TokenStore(object):
+    """
+    Interface of the stores persisting the tokens of :class:`TokenManager`,
+    keyed by realm.
+    """
+
+    def get(self, realm):
+        """
+        Returns the :class:`OAuth2Token` of `realm` or `None`.
+        """
+        raise NotImplementedError
+
+    def set(self, realm, token):
+        raise NotImplementedError
+
+    def delete(self, realm):
+        raise NotImplementedError
+
+    def realms(self):
+        raise NotImplementedError
+
+
+class MemoryTokenStore(TokenStore):
+
+    def __init__(self):
+        self.tokens = {}
+
+    def get(self, realm):
+        return self.tokens.get(realm)
+
+    def set(self, realm, token):
+        self.tokens[realm] = token
+
+    def delete(self, realm):
+        self.tokens.pop(realm, None)
+
+    def realms(self):
+        return list(self.tokens)
+
+
+class SQLiteTokenStore(TokenStore):
+    """
+    Persists the tokens in a sqlite database, which may be shared by several
+    threads and processes. Tokens are stored in clear, the database must be
+    protected accordingly.
+    """
+
+    DEFAULT_PATH = 'quickbook3-tokens.db'
+
+    def __init__(self, path=DEFAULT_PATH):
+        """
+        :param path: Path of the sqlite database, created if missing,
+            defaults to :attr:`DEFAULT_PATH` in the working directory.
+        :type path: str
+        """
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False,
+                                           timeout=30)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS tokens ('
+                'realm TEXT NOT NULL PRIMARY KEY, token TEXT NOT NULL)')
+
+    def get(self, realm):
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT token FROM tokens WHERE realm = ?',
+                (realm,)).fetchone()
+        return OAuth2Token.from_dict(json.loads(row[0])) if row else None
+
+    def set(self, realm, token):
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO tokens (realm, token) VALUES (?, ?)',
+                (realm, json.dumps(token.as_dict())))
+
+    def delete(self, realm):
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM tokens WHERE realm = ?',
+                                     (realm,))
+
+    def realms(self):
+        with self._lock:
+            return [row[0] for row in self._connection.execute(
+                'SELECT realm FROM tokens')]
+
+    def close(self):
+        self._connection.close()
+
+
+class TokenManager(object):
+    """
+    Hands out the access tokens of many realms, refreshing each token once
+    it expires in less than `refresh_margin` seconds. A single manager is
+    meant to be shared by all the clients and threads of a process::
+
+        service = QuickBookOAuth2Service(client_id, client_secret)
+        manager = TokenManager(service, SQLiteTokenStore('tokens.db'))
+        manager.add(service.get_tokens(code, realm=realm_id))
+        manager.start()
+        client = QuickBooks(realm_id, token_manager=manager)
+
+    Refreshes are single-flight: while a token is being refreshed, the
+    other threads needing it wait for the new token instead of calling the
+    token endpoint too. Once started, a background thread refreshes the
+    tokens ahead of time so that requests don't wait for it; otherwise they
+    are refreshed when requested. A token refreshed by another process
+    sharing the store is picked up instead of being refreshed again.
+    """
+
+    # minimum seconds between two runs of the background thread
+    MIN_WAIT = 1
+
+    def __init__(self, service, store=None, refresh_margin=300,
+                 retry_interval=30, poll_interval=60, clock=time.time):
+        """
+        :param service: Service refreshing the tokens.
+        :type service: :class:`~quickbook3.auth.QuickBookOAuth2Service`
+        :param store: Store of the tokens, defaults to a
+            :class:`MemoryTokenStore`.
+        :type store: :class:`TokenStore`
+        :param refresh_margin: Seconds before its expiry at which a token is
+            refreshed, defaults to `300`.
+        :type refresh_margin: float
+        :param retry_interval: Seconds the background thread waits before
+            retrying a failed refresh, defaults to `30`.
+        :type retry_interval: float
+        :param poll_interval: Maximum seconds between two checks of the
+            store by the background thread, defaults to `60`.
+        :type poll_interval: float
+        """
+
+        self.service = service
+        self.store = store if store is not None else MemoryTokenStore()
+        self.refresh_margin = refresh_margin
+        self.retry_interval = retry_interval
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self.tokens = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._retry_at = {}
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def add(self, token, realm=None):
+        """
+        Adds (or replaces) the token of a realm, `token.realm` by default.
+        """
+
+        realm = realm or token.realm
+        token.realm = realm
+        self.store.set(realm, token)
+        self.tokens[realm] = token
+        self._retry_at.pop(realm, None)
+        self._wakeup.set()
+
+    def get(self, realm):
+        """
+        Returns a valid :class:`OAuth2Token` of `realm`, refreshing it
+        first if it expires in less than :attr:`refresh_margin` seconds.
+        """
+
+        token = self.tokens.get(realm)
+        if token is None:
+            token = self._load(realm)
+        if token.expires_at - self.refresh_margin <= self.clock():
+            token = self.refresh(realm, token)
+        return token
+
+    def access_token(self, realm):
+        return self.get(realm).access_token
+
+    def refresh(self, realm, stale=None):
+        """
+        Refreshes the token of `realm` and returns the new one. When `stale`
+        is given, the token is only refreshed if it is still `stale` (or
+        about to expire), so that the threads refreshing the same token at
+        once call the token endpoint only once.
+        """
+
+        with self._realm_lock(realm):
+            token = self._load(realm)
+            if stale is not None and \
+                    token.access_token != stale.access_token and \
+                    token.expires_at - self.refresh_margin > self.clock():
+                self.tokens[realm] = token
+                return token
+
+            refreshed = self.service.refresh(token)
+            refreshed.realm = realm
+            if refreshed.refresh_token is None:
+                refreshed.refresh_token = token.refresh_token
+            self.store.set(realm, refreshed)
+            self.tokens[realm] = refreshed
+            self._retry_at.pop(realm, None)
+            return refreshed
+
+    def remove(self, realm):
+        self.store.delete(realm)
+        self.tokens.pop(realm, None)
+
+    def start(self):
+        """
+        Starts the background thread refreshing the tokens.
+        """
+
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run,
+                                            name='quickbook3-tokens')
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stopped.set()
+            self._wakeup.set()
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def refresh_due(self):
+        """
+        Refreshes the tokens due for a refresh and returns the seconds until
+        the next one is. Called by the background thread.
+        """
+
+        now = self.clock()
+        wait = self.poll_interval
+        for realm in self.store.realms():
+            token = self.store.get(realm)
+            if token is None:
+                continue
+            due_at = max(token.expires_at - self.refresh_margin,
+                         self._retry_at.get(realm, 0))
+            if due_at > now:
+                self.tokens[realm] = token
+                wait = min(wait, due_at - now)
+                continue
+
+            try:
+                self.refresh(realm, token)
+            except Exception:
+                logger.exception("Refreshing the token of realm %s failed",
+                                 realm)
+                self._retry_at[realm] = now + self.retry_interval
+                wait = min(wait, self.retry_interval)
+            else:
+                wait = min(wait, self.tokens[realm].expires_at -
+                           self.refresh_margin - now)
+        return max(wait, self.MIN_WAIT)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            wait = self.refresh_due()
+            self._wakeup.wait(wait)
+            self._wakeup.clear()
+
+    def _load(self, realm):
+        token = self.store.get(realm)
+        if token is None:
+            raise TokenError('missing_token', 'No token for realm %s' % realm)
+        return token
+
+    def _realm_lock(self, realm):
+        lock = self._locks.get(realm)
+        if lock is None:
+            with self._lock:
+                lock = self._locks.setdefault(realm, threading.Lock())
+        return lock
+
+
+class BearerSession(requests.Session):
+    """
+    A session authenticating the requests of a realm with the access token
+    handed out by a :class:`TokenManager`, read for each request so that
+    refreshed tokens are used as soon as they are available. A request
+    rejected with a 401 is sent again once with a refreshed token.
+    """
+
+    def __init__(self, token_manager, realm):
+        super(BearerSession, self).__init__()
+        self.token_manager = token_manager
+        self.realm = realm
+
+    def request(self, method, url, header_auth=None, realm=None,
+                headers=None, **kwargs):
+        # header_auth and realm are the arguments of rauth.OAuth1Session
+        token = self.token_manager.get(self.realm)
+        headers = dict(headers or {})
+        headers['Authorization'] = 'Bearer %s' % token.access_token
+        response = super(BearerSession, self).request(method, url,
+                                                      headers=headers,
+                                                      **kwargs)
+
+        if response.status_code == requests.codes.unauthorized:
+            response.close()
+            token = self.token_manager.refresh(self.realm, token)
+            headers['Authorization'] = 'Bearer %s' % token.access_token
+            response = super(BearerSession, self).request(method, url,
+                                                          headers=headers,
+                                                          **kwargs)
+        return response
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+"""
+quickbook3.transport
+~~~~~~~~~~~~~~~~~~~~
+
+This module contains :class:`PooledTransport`, a pool of keep-alive http
+connections that can be shared by several clients.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from requests.adapters import HTTPAdapter
+
+
+class PooledTransport(object):
+    """
+    A thin wrapper around :class:`requests.adapters.HTTPAdapter` that is
+    mounted on the session of every client it is passed to. As the connection
+    pools of the adapter are thread-safe, one transport can be shared by all
+    the clients (one per realm) of a multi-threaded worker, so that
+    connections and TLS sessions are reused across realms::
+
+        transport = PooledTransport(pool_maxsize=32)
+        clients = [QuickBooks(company_id, transport=transport, **creds)
+                   for company_id, creds in realms]
+    """
+
+    PREFIXES = ('https://', 'http://')
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, max_retries=0,
+                 pool_block=False):
+        """
+        :param pool_connections: Number of per host connection pools to keep,
+            defaults to `10`.
+        :type pool_connections: int
+        :param pool_maxsize: Maximum number of connections kept open per host,
+            defaults to `10`.
+        :type pool_maxsize: int
+        :param max_retries: Number of retries of failed connections, defaults
+            to `0`.
+        :type max_retries: int
+        :param pool_block: Whether to wait for a free connection when the pool
+            of a host is exhausted instead of opening a throwaway connection,
+            defaults to `False`.
+        :type pool_block: bool
+        """
+
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.adapter = HTTPAdapter(pool_connections=pool_connections,
+                                   pool_maxsize=pool_maxsize,
+                                   max_retries=max_retries,
+                                   pool_block=pool_block)
+
+    def mount(self, session):
+        for prefix in self.PREFIXES:
+            session.mount(prefix, self.adapter)
+        return session
+
+    def close(self):
+        self.adapter.close()
+
+    def __repr__(self):
+        return "PooledTransport: Pools: %d, MaxSize: %d" % (
+            self.pool_connections, self.pool_maxsize)
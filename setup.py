@@ -32,6 +32,11 @@ setup(
                  'quickbook3'},
     include_package_data=True,
     install_requires=requirements,
+    extras_require={
+        'async': ['aiohttp'],
+        'export': ['pyarrow'],
+        'stream': ['ijson'],
+    },
     license="ISCL",
     zip_safe=False,
     keywords='quickbooks-py',
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+"""
+A small threaded http server that stands in for the quickbooks v3 api in
+tests. Routes are registered as ``(method, path regex)`` pairs and handlers
+receive a :class:`FakeRequest` and return ``(status_code, body[, headers])``.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+import json
+import re
+import socket
+import threading
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlsplit, parse_qsl
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlsplit, parse_qsl
+
+
+class FakeRequest(object):
+
+    def __init__(self, method, path, query, headers, body):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body.decode('utf-8'))
+
+
+class _ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, *args, **kwargs):
+        HTTPServer.__init__(self, *args, **kwargs)
+        self.connections = set()
+
+    def process_request(self, request, client_address):
+        self.connections.add(request)
+        ThreadingMixIn.process_request(self, request, client_address)
+
+    def shutdown_request(self, request):
+        self.connections.discard(request)
+        HTTPServer.shutdown_request(self, request)
+
+    def close_connections(self):
+        # keep-alive connections would otherwise leave their handler
+        # threads blocked on a read until the interpreter exits
+        for connection in list(self.connections):
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, nagle would delay the body
+    disable_nagle_algorithm = True
+
+    def _dispatch(self):
+        parts = urlsplit(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        request = FakeRequest(self.command, parts.path,
+                              dict(parse_qsl(parts.query)),
+                              dict(self.headers.items()), body)
+
+        fake = self.server.fake
+        fake.record(request)
+        status_code, body, headers = fake.handle(request)
+
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body)
+            headers.setdefault('Content-Type', 'application/json')
+        if not isinstance(body, bytes):
+            body = body.encode('utf-8')
+
+        self.send_response(status_code)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _dispatch
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeQuickBooksServer(object):
+    """
+    Usage::
+
+        server = FakeQuickBooksServer()
+        server.route('GET', r'/v3/company/\\w+/customer/1',
+                     lambda request: (200, {'customer': {'Id': '1'}}))
+        server.start()
+        client.base_url_v3 = server.base_url_v3
+        ...
+        server.stop()
+    """
+
+    def __init__(self):
+        self.routes = []
+        self.requests = []
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return 'http://%s:%d' % (host, port)
+
+    @property
+    def base_url_v3(self):
+        return self.url + '/v3'
+
+    def route(self, method, path, handler):
+        self.routes.append((method.upper(), re.compile(path + '$'), handler))
+        return self
+
+    def record(self, request):
+        with self._lock:
+            self.requests.append(request)
+
+    def handle(self, request):
+        for method, pattern, handler in self.routes:
+            match = pattern.match(request.path)
+            if method == request.method and match:
+                result = handler(request, *match.groups())
+                if len(result) == 2:
+                    result = result + ({},)
+                status_code, body, headers = result
+                return status_code, body, dict(headers)
+
+        return 404, {'error': 'no route for %s' % request.path}, {}
+
+    def start(self):
+        self._httpd = _ThreadedHTTPServer(('127.0.0.1', 0), _Handler)
+        self._httpd.fake = self
+        self._thread = threading.Thread(target=self._httpd.serve_forever,
+                                        args=(0.05,))
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.close_connections()
+        self._httpd.server_close()
+        self._thread.join()
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+import re
+import sys
+import threading
+import time
+import unittest
+
+from quickbook3 import NotFoundError, ValidationFault, QueryBuilder, \
+    LRUCache, AuthenticationError, ReadManyResponse
+from tests.utils import ServerCase
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+if sys.version_info >= (3, 6) and aiohttp is not None:
+    import asyncio
+    from quickbook3.aio import AsyncQuickBooks, gather
+else:
+    AsyncQuickBooks = None
+
+
+@unittest.skipIf(AsyncQuickBooks is None, 'requires python 3.6+ and aiohttp')
+class TestAsyncQuickBooks(ServerCase):
+
+    def setUp(self):
+        super(TestAsyncQuickBooks, self).setUp()
+        self.loop = asyncio.new_event_loop()
+        self.set_default_client(AsyncQuickBooks(
+            company_id=self.COMPANY_ID, cred_file=self.CREDENTIAL_FILE))
+
+    def tearDown(self):
+        self.run_coro(self.qbclient.close())
+        self.loop.close()
+        super(TestAsyncQuickBooks, self).tearDown()
+
+    def run_coro(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def test_read_resource(self):
+        self.server.route('GET', r'/v3/company/company_id/customer/(\w+)',
+                          lambda request, customer_id:
+                          (200, {'customer': {'Id': customer_id}}))
+
+        resp = self.run_coro(self.qbclient.read('customer', '42'))
+        self.assertEqual(resp, {'Id': '42'})
+
+        auth = self.server.requests[0].headers['Authorization']
+        self.assertTrue(auth.startswith('OAuth realm="company_id"'))
+        self.assertIn('oauth_signature=', auth)
+        self.assertIn('oauth_consumer_key="consumer_key"', auth)
+
+    def test_create_resource(self):
+        resource_dict = {'customer': {'name': 'Name'}}
+        self.server.route('POST', r'/v3/company/company_id/customer',
+                          lambda request: (200, request.json()))
+
+        resp = self.run_coro(self.qbclient.create('customer', resource_dict))
+        self.assertEqual(resp, resource_dict['customer'])
+
+    def test_query(self):
+        self.server.route('GET', r'/v3/company/company_id/query',
+                          lambda request: (200, {'QueryResponse': {
+                              'customer': [{'Id': '1'}, {'Id': '2'}],
+                              'startPosition': 1,
+                              'maxResults': 2}}))
+
+        resp = self.run_coro(self.qbclient.query(QueryBuilder('customer')))
+        self.assertEqual(len(resp.object_list), 2)
+        self.assertEqual(self.server.requests[0].query['query'],
+                         'Select * From customer')
+
+    def test_http_error_mapping(self):
+        self.server.route('GET', r'/v3/company/company_id/customer/1',
+                          lambda request: (404, {}))
+
+        self.assertRaises(NotFoundError, self.run_coro,
+                          self.qbclient.read('customer', '1'))
+
+    def test_fault_mapping(self):
+        fault = {'Fault': {'type': 'ValidationFault',
+                           'Error': [{'Detail': 'Invalid name'}]}}
+        self.server.route('POST', r'/v3/company/company_id/customer',
+                          lambda request: (400, fault))
+
+        with self.assertRaises(ValidationFault) as cm:
+            self.run_coro(self.qbclient.create('customer', {}))
+
+        self.assertIn('Invalid name', str(cm.exception))
+
+    def test_gather_bounds_concurrency(self):
+        state = {'active': 0, 'peak': 0}
+        lock = threading.Lock()
+
+        def handler(request, customer_id):
+            with lock:
+                state['active'] += 1
+                state['peak'] = max(state['peak'], state['active'])
+            time.sleep(0.02)
+            with lock:
+                state['active'] -= 1
+            return 200, {'customer': {'Id': customer_id}}
+
+        self.server.route('GET', r'/v3/company/company_id/customer/(\w+)',
+                          handler)
+
+        reads = [self.qbclient.read('customer', str(i)) for i in range(12)]
+        resp = self.run_coro(self.qbclient.gather(*reads, concurrency=3))
+
+        self.assertEqual([r['Id'] for r in resp],
+                         [str(i) for i in range(12)])
+        self.assertLessEqual(state['peak'], 3)
+
+    def test_gather_return_exceptions(self):
+        self.server.route('GET', r'/v3/company/company_id/customer/1',
+                          lambda request: (404, {}))
+
+        resp = self.run_coro(gather(self.qbclient.read('customer', '1'),
+                                    return_exceptions=True))
+        self.assertIsInstance(resp[0], NotFoundError)
+
+    def test_unsupported_options(self):
+        self.assertRaises(TypeError, AsyncQuickBooks,
+                          company_id=self.COMPANY_ID,
+                          cred_file=self.CREDENTIAL_FILE,
+                          cache=LRUCache())
+
+    def test_unsupported_methods(self):
+        for name in ('revalidate', 'parallel_batch_query', 'sharded_report'):
+            self.assertFalse(hasattr(self.qbclient, name))
+        self.assertRaises(NotImplementedError, self.run_coro,
+                          self.qbclient.query(QueryBuilder('customer'),
+                                              stream=True))
+        self.assertRaises(NotImplementedError, self.run_coro,
+                          self.qbclient.read('customer', '1',
+                                             revalidate=True))
+        self.assertEqual(self.server.requests, [])
+
+    def test_none_params_not_sent(self):
+        self.server.route('GET', r'/v3/company/company_id/reports/(\w+)',
+                          lambda request, name: (200, {'Header': {}}))
+
+        self.run_coro(self.qbclient.report('ProfitAndLoss',
+                                           start_date='2016-01-01',
+                                           end_date=None))
+
+        self.assertEqual(self.server.requests[0].query,
+                         {'start_date': '2016-01-01'})
+
+    def test_batch(self):
+        def handler(request):
+            return 200, {'BatchItemResponse': [
+                {'bId': item['bId'], 'Customer': {'Id': item['bId']}}
+                for item in request.json()['BatchItemRequest']]}
+
+        self.server.route('POST', r'/v3/company/company_id/batch', handler)
+
+        batch = self.qbclient.batch(concurrency=2)
+        for i in range(31):
+            batch.create('Customer', {'DisplayName': str(i)})
+        resp = self.run_coro(batch.execute())
+
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(resp['30'], {'Id': '30'})
+        self.assertEqual(len(resp), 31)
+
+    def test_batch_failed_chunk(self):
+        self.server.route('POST', r'/v3/company/company_id/batch',
+                          lambda request: (401, {}))
+
+        batch = self.qbclient.batch()
+        bid = batch.create('Customer', {'DisplayName': 'Jane'})
+        resp = self.run_coro(batch.execute())
+
+        self.assertRaises(AuthenticationError, resp.__getitem__, bid)
+
+    def test_read_many(self):
+        def handler(request):
+            ids = re.findall(r"'(\d+)'", request.query['query'])
+            return 200, {'QueryResponse': {'Customer': [
+                {'Id': customer_id} for customer_id in ids
+                if customer_id != '3']}}
+
+        self.server.route('GET', r'/v3/company/company_id/query', handler)
+
+        result = self.run_coro(self.qbclient.read_many(
+            'customer', [1, '2', '3', '4', '1'], chunk_size=2))
+
+        self.assertIsInstance(result, ReadManyResponse)
+        self.assertEqual(sorted(result), ['1', '2', '4'])
+        self.assertEqual(result.missing, ['3'])
+        self.assertEqual(sorted(request.query['query']
+                                for request in self.server.requests), [
+            "Select * From Customer Where Id in ('1', '2') "
+            "AND Active in (true, false) StartPosition 1 MaxResults 2",
+            "Select * From Customer Where Id in ('3', '4') "
+            "AND Active in (true, false) StartPosition 1 MaxResults 2"])
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+
+from quickbook3 import QuickBooks, QueryBuilder, QueryResponse, Batch, \
+    BatchResponse, LRUCache, ValidationFault, AuthenticationError, \
+    InvalidBatchError, InvalidResourceError, cache_key
+from tests.utils import ServerCase
+
+
+def batch_endpoint(request):
+    """
+    Echoes created entities back with an Id and faults every item whose
+    entity has no `DisplayName`.
+    """
+
+    responses = []
+    for item in request.json()['BatchItemRequest']:
+        if 'Query' in item:
+            responses.append({'bId': item['bId'], 'QueryResponse': {
+                'Item': [{'Id': '1'}], 'startPosition': 1, 'maxResults': 1}})
+            continue
+
+        entity = item['Customer']
+        if 'DisplayName' not in entity:
+            responses.append({'bId': item['bId'], 'Fault': {
+                'type': 'ValidationFault',
+                'Error': [{'Detail': 'DisplayName is required'}]}})
+        else:
+            responses.append({'bId': item['bId'],
+                              'Customer': dict(entity, Id=item['bId'])})
+
+    return 200, {'BatchItemResponse': responses}
+
+
+class TestBatch(ServerCase):
+
+    def setUp(self):
+        super(TestBatch, self).setUp()
+        self.set_default_client()
+        self.server.route('POST', self.company_path('batch'), batch_endpoint)
+
+    def test_batch_chunks_requests(self):
+        batch = self.qbclient.batch()
+        for i in range(65):
+            batch.create('Customer', {'DisplayName': 'Name %d' % i})
+
+        response = batch.execute()
+
+        sizes = sorted(len(request.json()['BatchItemRequest'])
+                       for request in self.server.requests)
+        self.assertEqual(sizes, [5, 30, 30])
+        self.assertEqual(len(response.results), 65)
+        self.assertEqual(response['64'], {'DisplayName': 'Name 64',
+                                          'Id': '64'})
+
+    def test_partial_failure_chunk(self):
+        batch = Batch(self.qbclient, workers=2)
+        for i in range(40):
+            entity = {} if i % 10 == 3 else {'DisplayName': 'Name %d' % i}
+            batch.create('Customer', entity, bid='customer-%d' % i)
+
+        response = batch.execute()
+
+        self.assertIsInstance(response, BatchResponse)
+        self.assertEqual(sorted(response.faults),
+                         ['customer-13', 'customer-23', 'customer-3',
+                          'customer-33'])
+        self.assertEqual(len(response.results), 36)
+        self.assertIsInstance(response.faults['customer-3'], ValidationFault)
+        with self.assertRaises(ValidationFault) as cm:
+            response['customer-23']
+        self.assertIn('DisplayName is required', str(cm.exception))
+
+    def test_payload(self):
+        batch = self.qbclient.batch()
+        batch.update('Customer', {'Id': '1', 'DisplayName': 'A'}, bid='u')
+        batch.delete('Customer', {'Id': '2', 'DisplayName': 'B'}, bid='d')
+        batch.query(QueryBuilder('Item'), bid='q')
+
+        response = batch.execute()
+
+        self.assertEqual(self.server.requests[0].json(), {'BatchItemRequest': [
+            {'bId': 'u', 'operation': 'update',
+             'Customer': {'Id': '1', 'DisplayName': 'A'}},
+            {'bId': 'd', 'operation': 'delete',
+             'Customer': {'Id': '2', 'DisplayName': 'B'}},
+            {'bId': 'q', 'Query': 'Select * From Item'}]})
+        self.assertIsInstance(response['q'], QueryResponse)
+        self.assertEqual(response['q'].object_list, [{'Id': '1'}])
+
+    def test_failed_chunk_faults_each_item(self):
+        self.server.routes = []
+        self.server.route('POST', self.company_path('batch'),
+                          lambda request: (401, {}))
+        batch = self.qbclient.batch()
+        batch.create('Customer', {'DisplayName': 'A'}, bid='a')
+        batch.create('Customer', {'DisplayName': 'B'}, bid='b')
+
+        response = batch.execute()
+
+        self.assertEqual(len(response.faults), 2)
+        self.assertRaises(AuthenticationError, response.__getitem__, 'b')
+
+    def test_writes_invalidate_cache(self):
+        cache = LRUCache()
+        self.set_default_client(QuickBooks(company_id=self.COMPANY_ID,
+                                           cred_file=self.CREDENTIAL_FILE,
+                                           cache=cache))
+        for resource_id in '123':
+            cache.set(cache_key(self.COMPANY_ID, 'Customer', resource_id),
+                      {'Id': resource_id, 'SyncToken': '0'})
+        batch = self.qbclient.batch()
+        batch.update('Customer', {'Id': '1', 'DisplayName': 'A'})
+        batch.delete('Customer', {'Id': '2', 'DisplayName': 'B'})
+        batch.query(QueryBuilder('Customer').where('Id').equals('3'))
+
+        batch.execute()
+
+        self.assertEqual(cache.keys(), [cache_key(self.COMPANY_ID,
+                                                  'Customer', '3')])
+
+    def test_duplicate_bid(self):
+        batch = self.qbclient.batch()
+        batch.create('Customer', {}, bid='a')
+        self.assertRaises(InvalidBatchError, batch.create, 'Customer', {},
+                          bid='a')
+
+    def test_invalid_resource(self):
+        batch = self.qbclient.batch()
+        self.assertRaises(InvalidResourceError, batch.create, 'invalid', {})
+
+    def test_empty_batch(self):
+        response = self.qbclient.batch().execute()
+        self.assertEqual(len(response), 0)
+        self.assertEqual(self.server.requests, [])
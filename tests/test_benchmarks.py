@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from benchmarks.api import FakeQuickBooksApi
+from benchmarks.imports import import_times, total_time
+from benchmarks.runner import Case, History, Result, compare, percentile, \
+    run_case
+from benchmarks.suite import CASES, client_for
+from quickbook3 import QueryBuilder, RetryPolicy, ThrottleError, \
+    ValidationFault
+
+
+class TestFakeQuickBooksApi(TestCase):
+
+    def start(self, **options):
+        api = FakeQuickBooksApi(**options).start()
+        self.addCleanup(api.stop)
+        return api
+
+    def test_pagination(self):
+        client = client_for(self.start(entities={'Customer': 250}))
+
+        pages = list(client.batch_query(QueryBuilder('Customer').limit(100)))
+
+        self.assertEqual([len(page.object_list) for page in pages],
+                         [100, 100, 50])
+        self.assertEqual(pages[-1].object_list[-1]['Id'], '250')
+        self.assertEqual(client.query(QueryBuilder('Customer').count()), 250)
+
+    def test_crud_and_cdc(self):
+        client = client_for(self.start())
+
+        customer = client.read('Customer', '3')
+        self.assertEqual(customer['Id'], '3')
+        self.assertEqual(client.update('Customer', customer)['SyncToken'],
+                         '1')
+        cdc = client.cdc(['Customer'], '2016-01-01')
+        self.assertEqual(len(cdc.upsert['Customer']), 100)
+
+    def test_throttling_and_faults(self):
+        client = client_for(self.start(throttle_every=2))
+        client.query(QueryBuilder('Customer'))
+        self.assertRaises(ThrottleError, client.query,
+                          QueryBuilder('Customer'))
+        client.retry_policy = RetryPolicy(backoff=0, jitter=False)
+        client.query(QueryBuilder('Customer'))
+
+        client = client_for(self.start(fault_rate=1))
+        self.assertRaises(ValidationFault, client.read, 'Customer', '1')
+
+
+class TestRunner(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([], 0.5), 0)
+
+    def test_run_case(self):
+        calls = []
+        case = Case('count', lambda api, size, concurrency:
+                    lambda: calls.append(size), {'size': [1, 2],
+                                                 'concurrency': [2]},
+                    server=False)
+
+        results = [run_case(case, params, operations=10, repeat=2)
+                   for params in case.params()]
+
+        self.assertEqual([result.key for result in results],
+                         ['count[concurrency=2,size=1]',
+                          'count[concurrency=2,size=2]'])
+        self.assertEqual(len(results[0].latencies), 20)
+        self.assertEqual(len(calls), 2 * (1 + 20 + 1))
+
+    def test_history_and_compare(self):
+        history = History(os.path.join(self.directory, 'history.jsonl'))
+        self.assertIsNone(history.last())
+
+        before = Result('query', {'page_size': 100}, [0.01] * 10, 0.1, 0,
+                        1000)
+        history.append([before], latency=0)
+        after = Result('query', {'page_size': 100}, [0.02] * 10, 0.2, 0,
+                       1000)
+
+        previous = history.last()
+        self.assertEqual(previous['latency'], 0)
+        regressions = compare(previous['results'],
+                              {after.key: after.as_dict()})
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(regressions[0].startswith(
+            'query[page_size=100]: throughput'))
+        self.assertEqual(compare(previous['results'],
+                                 {before.key: before.as_dict()}), [])
+
+    def test_operations_capped(self):
+        case = Case('slow', lambda api: lambda: None, {}, server=False,
+                    operations=5)
+        result = run_case(case, {}, operations=10, repeat=2)
+        self.assertEqual(len(result.latencies), 10)
+
+    def test_import_times(self):
+        times = import_times('import quickbook3.querybuilder')
+
+        modules = dict((module, depth) for module, depth, self_us,
+                       cumulative_us in times)
+        self.assertEqual(modules['quickbook3.querybuilder'], 0)
+        self.assertEqual(modules['quickbook3'], 1)
+        self.assertEqual(modules['quickbook3.lru'], 1)
+        self.assertNotIn('sys', modules)
+        self.assertTrue(0 < total_time(times) < 1)
+
+    def test_suite_names_unique(self):
+        names = [case.name for case in CASES]
+        self.assertEqual(len(names), len(set(names)))
@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from quickbook3 import QuickBooks, QueryBuilder, LRUCache, cache_key, \
+    SQLiteResponseCache, response_key
+from tests.utils import BaseCase
+
+
+class FakeTimer(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLRUCache(TestCase):
+
+    def test_get_set(self):
+        cache = LRUCache()
+        cache.set('a', {'Id': '1'})
+        self.assertEqual(cache.get('a'), {'Id': '1'})
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1,
+                                         'evictions': 0, 'expirations': 0,
+                                         'size': 1})
+
+    def test_least_recently_used_evicted(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_ttl(self):
+        timer = FakeTimer()
+        cache = LRUCache(ttl=60, timer=timer)
+        cache.set('a', 1)
+
+        timer.now += 59
+        self.assertEqual(cache.get('a'), 1)
+        timer.now += 1
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.expirations, 1)
+        self.assertEqual(len(cache), 0)
+
+    def test_delete_and_clear(self):
+        cache = LRUCache()
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.delete('a')
+        self.assertEqual(cache.keys(), ['b'])
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+
+class TestQuickBooksCache(BaseCase):
+
+    def setUp(self):
+        super(TestQuickBooksCache, self).setUp()
+        self.cache = LRUCache()
+        self.set_default_client(QuickBooks(company_id=self.COMPANY_ID,
+                                           cred_file=self.CREDENTIAL_FILE,
+                                           cache=self.cache))
+
+    def key(self, resource_id):
+        return cache_key(self.COMPANY_ID, 'customer', resource_id)
+
+    def test_read_through(self):
+        customer = {'Id': '1', 'SyncToken': '0'}
+        self.response('customer', {'customer': customer})
+
+        self.assertEqual(self.qbclient.read('customer', '1'), customer)
+        self.assertEqual(self.qbclient.read('customer', '1'), customer)
+
+        self.assertEqual(self.request.call_count, 1)
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.misses, 1)
+
+    def test_read_modify_does_not_touch_cache(self):
+        customer = {'Id': '1', 'SyncToken': '0', 'DisplayName': 'Jane'}
+        self.response('customer', {'customer': customer})
+
+        # from the response, then from the cache
+        self.qbclient.read('customer', '1')['DisplayName'] = 'Unsaved'
+        self.qbclient.read('customer', '1')['DisplayName'] = 'Unsaved'
+
+        self.assertEqual(self.qbclient.read('customer', '1')['DisplayName'],
+                         'Jane')
+
+    def test_older_response_not_cached(self):
+        self.cache.set(self.key('1'), {'Id': '1', 'SyncToken': '3'})
+        self.response('customer', {'QueryResponse': {
+            'customer': [{'Id': '1', 'SyncToken': '2'}]}})
+
+        self.qbclient.query(QueryBuilder('customer'))
+
+        self.assertEqual(self.cache.get(self.key('1'))['SyncToken'], '3')
+
+    def test_read_with_params_bypasses_cache(self):
+        self.cache.set(self.key('1'), {'Id': '1'})
+        self.response('customer', {'customer': {'Id': '1', 'SyncToken': '1'}})
+
+        resp = self.qbclient.read('customer', '1', minorversion=4)
+
+        self.assertEqual(resp['SyncToken'], '1')
+        self.assertEqual(self.request.call_count, 1)
+
+    def test_query_populates_cache(self):
+        self.response('customer', {'QueryResponse': {
+            'customer': [{'Id': '1'}, {'Id': '2'}]}})
+
+        self.qbclient.query(QueryBuilder('customer'))
+
+        self.assertEqual(self.cache.get(self.key('2')), {'Id': '2'})
+
+    def test_partial_select_not_cached(self):
+        self.response('customer', {'QueryResponse': {
+            'customer': [{'Id': '1'}]}})
+
+        self.qbclient.query(QueryBuilder('customer').select('Id'))
+
+        self.assertEqual(len(self.cache), 0)
+
+    def test_update_refreshes_cache(self):
+        self.cache.set(self.key('1'), {'Id': '1', 'SyncToken': '0'})
+        self.response('customer', {'customer': {'Id': '1', 'SyncToken': '1'}})
+
+        self.qbclient.update('customer', {'Id': '1', 'SyncToken': '0'})
+
+        self.assertEqual(self.cache.get(self.key('1'))['SyncToken'], '1')
+
+    def test_create_populates_cache(self):
+        self.response('customer', {'customer': {'Id': '9', 'SyncToken': '0'}})
+        self.qbclient.create('customer', {'DisplayName': 'Name'})
+        self.assertEqual(self.cache.get(self.key('9'))['SyncToken'], '0')
+
+    def test_delete_invalidates_cache(self):
+        self.cache.set(self.key('1'), {'Id': '1', 'SyncToken': '0'})
+        self.response('customer', {'customer': {'Id': '1',
+                                                'status': 'Deleted'}})
+
+        self.qbclient.delete('customer', {'Id': '1', 'SyncToken': '0'})
+
+        self.assertIsNone(self.cache.get(self.key('1')))
+
+    def responses(self, *bodies):
+        responses = []
+        for body in bodies:
+            self.response('Customer', body)
+            responses.append(self.request.return_value)
+        self.request.side_effect = responses
+
+    def queries(self):
+        return [kwargs['params']['query']
+                for args, kwargs in self.request.call_args_list]
+
+    def test_revalidate(self):
+        for resource_id, token in [('1', '0'), ('2', '0'), ('3', '0')]:
+            self.cache.set(self.key(resource_id), {'Id': resource_id,
+                                                   'SyncToken': token})
+        self.responses(
+            {'QueryResponse': {'Customer': [{'Id': '1', 'SyncToken': '0'},
+                                            {'Id': '2', 'SyncToken': '1'}]}},
+            {'QueryResponse': {'Customer': [{'Id': '2', 'SyncToken': '1',
+                                             'DisplayName': 'Jane'}]}})
+
+        result = self.qbclient.revalidate('customer')
+
+        self.assertEqual(result.fresh, ['1'])
+        self.assertEqual(result.refreshed, ['2'])
+        self.assertEqual(result.deleted, ['3'])
+        self.assertEqual(self.queries(), [
+            "Select Id, SyncToken From Customer Where Id in ('1', '2', '3') "
+            "AND Active in (true, false) StartPosition 1 MaxResults 3",
+            "Select * From Customer Where Id in ('2') "
+            "AND Active in (true, false) StartPosition 1 MaxResults 1"])
+        self.assertEqual(self.cache.get(self.key('2'))['DisplayName'], 'Jane')
+        self.assertIsNone(self.cache.get(self.key('3')))
+
+    def test_revalidate_inactive(self):
+        self.cache.set(self.key('1'), {'Id': '1', 'SyncToken': '0',
+                                       'Active': False})
+
+        def query(method, url, **kwargs):
+            # quickbooks leaves the inactive entities out unless asked for
+            inactive = 'Active in (true, false)' in kwargs['params']['query']
+            self.response('Customer', {'QueryResponse': {'Customer': [
+                {'Id': '1', 'SyncToken': '0'}] if inactive else []}})
+            return self.request.return_value
+        self.request.side_effect = query
+
+        result = self.qbclient.revalidate('customer')
+
+        self.assertEqual(result.fresh, ['1'])
+        self.assertEqual(result.deleted, [])
+        self.assertIsNotNone(self.cache.get(self.key('1')))
+
+    def test_revalidate_chunks(self):
+        for resource_id in '123':
+            self.cache.set(self.key(resource_id), {'Id': resource_id,
+                                                   'SyncToken': '0'})
+        self.responses(
+            {'QueryResponse': {'Customer': [{'Id': '1', 'SyncToken': '0'},
+                                            {'Id': '2', 'SyncToken': '0'}]}},
+            {'QueryResponse': {'Customer': [{'Id': '3', 'SyncToken': '0'}]}})
+
+        result = self.qbclient.revalidate('customer', ['1', '2', '3'],
+                                          chunk_size=2)
+
+        self.assertEqual(result.fresh, ['1', '2', '3'])
+        self.assertEqual(self.request.call_count, 2)
+
+    def test_read_revalidate_fresh(self):
+        self.cache.set(self.key('1'), {'Id': '1', 'SyncToken': '0'})
+        self.responses({'QueryResponse': {'Customer': [
+            {'Id': '1', 'SyncToken': '0'}]}})
+
+        resp = self.qbclient.read('customer', '1', revalidate=True)
+
+        self.assertEqual(resp, {'Id': '1', 'SyncToken': '0'})
+        self.assertEqual(self.request.call_count, 1)
+
+    def test_read_revalidate_stale(self):
+        self.cache.set(self.key('1'), {'Id': '1', 'SyncToken': '0'})
+        self.responses(
+            {'QueryResponse': {'Customer': [{'Id': '1', 'SyncToken': '1'}]}},
+            {'QueryResponse': {'Customer': [{'Id': '1', 'SyncToken': '1'}]}})
+
+        resp = self.qbclient.read('customer', '1', revalidate=True)
+
+        self.assertEqual(resp['SyncToken'], '1')
+        self.assertEqual(self.request.call_count, 2)
+
+
+class TestSQLiteResponseCache(TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'responses.db')
+        self.timer = FakeTimer()
+
+    def open(self, **options):
+        cache = SQLiteResponseCache(self.path, timer=self.timer, **options)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_response_key(self):
+        self.assertEqual(response_key('1', 'https://host/reports/PL/',
+                                      {'b': '2', 'a': 'x y', 'c': None}),
+                         '1 https://host/reports/PL?a=x+y&b=2')
+        self.assertEqual(response_key('1', 'https://host/query'),
+                         '1 https://host/query?')
+
+    def test_ttls(self):
+        cache = self.open(ttls={'Reports': 60, 'reports/balancesheet': 10,
+                                'account': 3600,
+                                'reports/profitandloss': lambda params:
+                                    60 if params.get('end_date') < '2016'
+                                    else None})
+
+        self.assertEqual(cache.ttl_for('reports/GeneralLedger'), 60)
+        self.assertEqual(cache.ttl_for('reports/BalanceSheet'), 10)
+        self.assertEqual(cache.ttl_for('Account'), 3600)
+        self.assertIsNone(cache.ttl_for('customer'))
+        self.assertEqual(cache.ttl_for('reports/ProfitAndLoss',
+                                       {'end_date': '2015-12-31'}), 60)
+        self.assertIsNone(cache.ttl_for('reports/ProfitAndLoss',
+                                        {'end_date': '2016-12-31'}))
+        self.assertEqual(self.open(default_ttl=5).ttl_for('customer'), 5)
+
+    def test_get_set_expire(self):
+        cache = self.open()
+        cache.set('key', 'realm', 'Account', {'Account': [1.5, 'a']}, 60)
+
+        self.assertEqual(cache.get('key'), {'Account': [1.5, 'a']})
+        self.assertIsNone(cache.get('other'))
+        self.timer.now += 60
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 2,
+                                         'evictions': 0, 'expirations': 1,
+                                         'size': 0, 'count': 0})
+
+    def test_shared_between_processes(self):
+        cache = self.open()
+        cache.set('key', 'realm', 'account', {'QueryResponse': {}}, 60)
+
+        # a restarted worker starts warm
+        other = self.open()
+        self.assertEqual(other.get('key'), {'QueryResponse': {}})
+        other.invalidate('realm', 'Account')
+        self.assertIsNone(cache.get('key'))
+
+    def test_least_recently_used_evicted(self):
+        value = {'Rows': ['row %d' % i for i in range(100)]}
+        cache = self.open()
+        cache.set('a', 'realm', 'account', value, 60)
+        size = cache.size()
+        self.assertTrue(0 < size < len(str(value)))
+
+        cache.max_size = 2 * size
+        self.timer.now += 1
+        cache.set('b', 'realm', 'account', value, 60)
+        self.timer.now += 1
+        cache.get('a')
+        self.timer.now += 1
+        cache.set('c', 'realm', 'account', value, 60)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), value)
+        self.assertEqual(cache.get('c'), value)
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(cache.size(), 2 * size)
+
+
+class TestQuickBooksResponseCache(BaseCase):
+
+    def setUp(self):
+        super(TestQuickBooksResponseCache, self).setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.cache = SQLiteResponseCache(
+            os.path.join(directory, 'responses.db'),
+            ttls={'reports': 3600, 'account': 3600})
+        self.addCleanup(self.cache.close)
+        self.set_default_client(QuickBooks(company_id=self.COMPANY_ID,
+                                           cred_file=self.CREDENTIAL_FILE,
+                                           response_cache=self.cache))
+
+    def test_report_cached(self):
+        self.response('report', {'Header': {'ReportName': 'ProfitAndLoss'}})
+
+        first = self.qbclient.report('ProfitAndLoss', start_date='2015-01-01')
+        second = self.qbclient.report('ProfitAndLoss',
+                                      start_date='2015-01-01')
+        self.qbclient.report('ProfitAndLoss', start_date='2016-01-01')
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.request.call_count, 2)
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_reference_query_cached(self):
+        self.response('account', {'QueryResponse': {
+            'Account': [{'Id': '1'}], 'totalCount': 1}})
+
+        for _ in range(2):
+            response = self.qbclient.query(QueryBuilder('Account'),
+                                           cached=True)
+            self.assertEqual(response.object_list, [{'Id': '1'}])
+        self.assertEqual(self.request.call_count, 1)
+
+        self.qbclient.query(QueryBuilder('Customer'), cached=True)
+        self.qbclient.query(QueryBuilder('Customer'), cached=True)
+        self.assertEqual(self.request.call_count, 3)
+
+    def test_queries_not_opted_in_bypass_cache(self):
+        self.response('account', {'QueryResponse': {
+            'Account': [{'Id': '1', 'SyncToken': '0'}], 'totalCount': 1}})
+
+        self.qbclient.query(QueryBuilder('Account'))
+        self.qbclient.query(QueryBuilder('Account'))
+        self.qbclient.query(QueryBuilder('Account').count(), cached=True)
+        self.qbclient.query(QueryBuilder('Account').count(), cached=True)
+        self.qbclient.read_many('Account', ['1'])
+        list(self.qbclient.batch_query(QueryBuilder('Account'), keyset='Id'))
+
+        self.assertEqual(self.request.call_count, 6)
+        self.assertEqual(self.cache.stats()['count'], 0)
+
+    def test_write_invalidates(self):
+        self.response('account', {'QueryResponse': {
+            'Account': [{'Id': '1'}]}, 'Account': {'Id': '1'}})
+
+        self.qbclient.query(QueryBuilder('Account'), cached=True)
+        self.qbclient.update('Account', {'Id': '1', 'SyncToken': '0'})
+        self.qbclient.query(QueryBuilder('Account'), cached=True)
+
+        self.assertEqual(self.request.call_count, 3)
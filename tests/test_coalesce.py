@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+import threading
+import time
+from unittest import TestCase
+
+from quickbook3 import QuickBooks, QueryBuilder, SingleFlight, \
+    HistogramExporter, NotFoundError
+from tests.utils import ServerCase
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.005)
+
+
+def run_threads(target, count):
+    results = [None] * count
+
+    def run(index):
+        try:
+            results[index] = target()
+        except Exception as e:
+            results[index] = e
+
+    threads = [threading.Thread(target=run, args=(index,))
+               for index in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+class TestSingleFlight(TestCase):
+
+    def test_concurrent_calls_coalesced(self):
+        single_flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def function():
+            calls.append(1)
+            release.wait()
+            return {'Id': '1'}
+
+        threads, results = run_threads(
+            lambda: single_flight.do('key', function), 5)
+        wait_for(lambda: single_flight.coalesced == 4)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([result for result, shared in results],
+                         [{'Id': '1'}] * 5)
+        self.assertTrue(all(shared for result, shared in results))
+        self.assertEqual(single_flight.stats(), {'calls': 5, 'coalesced': 4,
+                                                 'in_flight': 0})
+
+    def test_each_caller_gets_own_copy(self):
+        single_flight = SingleFlight()
+        release = threading.Event()
+        result = {'Id': '1', 'Line': [{'Amount': 10}]}
+
+        def function():
+            release.wait()
+            return result
+
+        threads, results = run_threads(
+            lambda: single_flight.do('key', function)[0], 3)
+        wait_for(lambda: single_flight.coalesced == 2)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        results[0]['Line'][0]['Amount'] = 20
+        self.assertEqual(results[1:], [{'Id': '1',
+                                        'Line': [{'Amount': 10}]}] * 2)
+        self.assertEqual(len(set(map(id, results + [result]))), 4)
+
+    def test_error_shared(self):
+        single_flight = SingleFlight()
+        release = threading.Event()
+
+        def function():
+            release.wait()
+            raise ValueError('failed')
+
+        threads, results = run_threads(
+            lambda: single_flight.do('key', function), 3)
+        wait_for(lambda: single_flight.coalesced == 2)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertTrue(all(isinstance(result, ValueError)
+                            for result in results))
+
+    def test_sequential_calls_not_coalesced(self):
+        single_flight = SingleFlight()
+        self.assertEqual(single_flight.do('key', lambda: 1), (1, False))
+        self.assertEqual(single_flight.do('key', lambda: 2), (2, False))
+        self.assertEqual(single_flight.do('other', lambda: 3), (3, False))
+        self.assertEqual(single_flight.coalesced, 0)
+
+
+class TestQuickBooksSingleFlight(ServerCase):
+
+    def setUp(self):
+        super(TestQuickBooksSingleFlight, self).setUp()
+        self.single_flight = SingleFlight()
+        self.histogram = HistogramExporter()
+        self.set_default_client(QuickBooks(company_id=self.COMPANY_ID,
+                                           cred_file=self.CREDENTIAL_FILE,
+                                           single_flight=self.single_flight,
+                                           metrics=self.histogram))
+        self.release = threading.Event()
+
+    def route(self, path, status_code=200, body=None):
+        def handle(request):
+            self.release.wait(5)
+            return status_code, body
+        self.server.route('GET', path, handle)
+
+    def run_concurrently(self, target, count):
+        threads, results = run_threads(target, count)
+        wait_for(lambda: self.single_flight.coalesced == count - 1)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_identical_reads_coalesced(self):
+        self.route(self.company_path('customer', '1'),
+                   body={'Customer': {'Id': '1'}})
+
+        results = self.run_concurrently(
+            lambda: self.qbclient.read('Customer', '1'), 6)
+
+        self.assertEqual(results, [{'Id': '1'}] * 6)
+        self.assertEqual(len(self.server.requests), 1)
+        stats = self.histogram.get(self.COMPANY_ID, 'customer', 'read')
+        self.assertEqual(stats.count, 6)
+        self.assertEqual(stats.coalesced, 5)
+        self.assertEqual(stats.status_codes, {200: 1})
+
+    def test_error_shared(self):
+        self.route(self.company_path('customer', '1'), 404, {})
+
+        results = self.run_concurrently(
+            lambda: self.qbclient.read('Customer', '1'), 3)
+
+        self.assertTrue(all(isinstance(result, NotFoundError)
+                            for result in results))
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_different_params_not_coalesced(self):
+        self.release.set()
+        self.route(self.company_path('query'),
+                   body={'QueryResponse': {'Customer': []}})
+
+        self.qbclient.query(QueryBuilder('Customer'))
+        self.qbclient.query(QueryBuilder('Customer').limit(10))
+
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.single_flight.coalesced, 0)
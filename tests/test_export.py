@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+import csv
+import io
+import os
+import shutil
+import tempfile
+from unittest import TestCase, skipIf
+
+from quickbook3 import QueryBuilder, QueryResponse, Flattener, Exporter, \
+    BaseSink, CSVSink, ArrowSink, ParquetSink, export_query, export_realm
+from quickbook3.export import pyarrow
+
+
+INVOICES = [
+    {'Id': '1', 'TotalAmt': 10, 'CustomerRef': {'value': '3', 'name': 'Jane'},
+     'Line': [{'Amount': 4.5, 'DetailType': 'SalesItemLineDetail'},
+              {'Amount': 5.5, 'DetailType': 'SalesItemLineDetail'}]},
+    {'Id': '2', 'TotalAmt': 2.5, 'CustomerRef': {'value': '4'},
+     'CustomField': [{'Name': 'PO'}]},
+]
+
+
+class ListSink(BaseSink):
+
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+
+    def write(self, columns, data):
+        self.chunks.append((list(columns), data))
+
+    def close(self):
+        self.closed = True
+
+
+class FakeClient(object):
+
+    ACCOUNTING_SERVICES = ['invoice', 'customer']
+
+    def __init__(self):
+        self.queries = []
+
+    def batch_query(self, querybuilder, stream=False):
+        self.queries.append(querybuilder.build())
+        entity = querybuilder.get_entity()
+        objects = INVOICES if entity == 'Invoice' else []
+        yield QueryResponse(entity, {entity: objects[:1]})
+        yield QueryResponse(entity, {entity: objects[1:]})
+
+
+class TestFlattener(TestCase):
+
+    def test_nested_objects(self):
+        rows = Flattener().rows(INVOICES[1])
+
+        self.assertEqual(rows, [{'Id': '2', 'TotalAmt': 2.5,
+                                 'CustomerRef.value': '4',
+                                 'CustomField': '[{"Name": "PO"}]'}])
+
+    def test_explode(self):
+        rows = Flattener(explode='Line').rows(INVOICES[0])
+
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1], {'Id': '1', 'TotalAmt': 10,
+                                   'CustomerRef.value': '3',
+                                   'CustomerRef.name': 'Jane',
+                                   'Line.Amount': 5.5,
+                                   'Line.DetailType': 'SalesItemLineDetail'})
+
+    def test_explode_missing(self):
+        rows = Flattener(explode='Line').rows(INVOICES[1])
+        self.assertEqual(len(rows), 1)
+
+    def test_separator(self):
+        rows = Flattener(separator='_').rows({'CustomerRef': {'value': '1'}})
+        self.assertEqual(rows, [{'CustomerRef_value': '1'}])
+
+
+class TestExporter(TestCase):
+
+    def test_chunked_flushes(self):
+        sink = ListSink()
+        exporter = Exporter(sink, explode='Line', chunk_size=2)
+        exporter.write(INVOICES)
+
+        self.assertEqual(len(sink.chunks), 1)
+        exporter.close()
+        self.assertTrue(sink.closed)
+        self.assertEqual(exporter.row_count, 3)
+
+        columns, data = sink.chunks[1]
+        self.assertEqual(columns, sink.chunks[0][0] + ['CustomField'])
+        self.assertEqual(data['Id'], ['2'])
+        self.assertEqual(data['Line.Amount'], [None])
+        self.assertEqual(data['CustomField'], ['[{"Name": "PO"}]'])
+
+    def test_columns(self):
+        sink = ListSink()
+        with Exporter(sink, columns=['Id', 'CustomerRef.name']) as exporter:
+            exporter.write(INVOICES)
+
+        self.assertEqual(sink.chunks, [(['Id', 'CustomerRef.name'],
+                                        {'Id': ['1', '2'],
+                                         'CustomerRef.name': ['Jane', None]})])
+
+    def test_export_query(self):
+        client = FakeClient()
+        querybuilder = QueryBuilder('Invoice')
+        sink = ListSink()
+
+        self.assertEqual(export_query(client, querybuilder, sink), 2)
+        self.assertEqual(client.queries, ['Select * From Invoice'])
+        self.assertTrue(sink.closed)
+
+
+class TestCSVSink(TestCase):
+
+    def test_write(self):
+        output = io.StringIO()
+        exporter = Exporter(CSVSink(output), columns=['Id', 'TotalAmt',
+                                                      'CustomerRef.name'])
+        exporter.write(INVOICES)
+        exporter.close()
+
+        output.seek(0)
+        self.assertEqual(list(csv.reader(output)),
+                         [['Id', 'TotalAmt', 'CustomerRef.name'],
+                          ['1', '10', 'Jane'], ['2', '2.5', '']])
+
+    def test_late_columns(self):
+        output = io.StringIO()
+        exporter = Exporter(CSVSink(output), chunk_size=1)
+        exporter.write([{'Id': '1'}, {'Id': '2', 'Notes': 'Paid'}])
+        exporter.close()
+
+        output.seek(0)
+        self.assertEqual(list(csv.reader(output)),
+                         [['Id', 'Notes'], ['1', ''], ['2', 'Paid']])
+
+
+class TestExportRealm(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_export_realm(self):
+        counts = export_realm(FakeClient(), self.directory)
+
+        self.assertEqual(counts, {'Invoice': 2, 'Customer': 0})
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ['Customer.csv', 'Invoice.csv'])
+        with io.open(os.path.join(self.directory, 'Invoice.csv')) as f:
+            self.assertEqual(len(list(csv.reader(f))), 3)
+
+
+@skipIf(pyarrow is None, 'requires pyarrow')
+class TestArrowSinks(TestCase):
+
+    def test_arrow_table(self):
+        sink = ArrowSink()
+        exporter = Exporter(sink, explode='Line', chunk_size=2)
+        exporter.write(INVOICES)
+        exporter.close()
+
+        table = sink.table()
+        self.assertEqual(table.num_rows, 3)
+        self.assertEqual(table.column('TotalAmt').to_pylist(),
+                         [10.0, 10.0, 2.5])
+        self.assertEqual(len(sink.batches), 2)
+
+    def test_parquet(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'invoices.parquet')
+
+        exporter = Exporter(ParquetSink(path), chunk_size=1)
+        exporter.write(INVOICES)
+        exporter.close()
+
+        table = pyarrow.parquet.read_table(path)
+        self.assertEqual(table.column('Id').to_pylist(), ['1', '2'])
+
+    def test_late_and_initially_null_columns(self):
+        rows = [{'Id': '1', 'Balance': None}, {'Id': '2', 'Balance': 12.5},
+                {'Id': '3', 'Balance': 3, 'Notes': 'Paid'},
+                {'Id': '4', 'Balance': 1.5, 'Notes': None}]
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'invoices.parquet')
+        sink = ArrowSink()
+
+        for target in (sink, ParquetSink(path)):
+            exporter = Exporter(target, chunk_size=1)
+            exporter.write(rows)
+            exporter.close()
+
+        for table in (sink.table(), pyarrow.parquet.read_table(path)):
+            self.assertEqual(table.column_names, ['Id', 'Balance', 'Notes'])
+            self.assertEqual(table.schema.field('Balance').type,
+                             pyarrow.float64())
+            self.assertEqual(table.column('Balance').to_pylist(),
+                             [None, 12.5, 3.0, 1.5])
+            self.assertEqual(table.column('Notes').to_pylist(),
+                             [None, None, 'Paid', None])
+        self.assertEqual(os.listdir(directory), ['invoices.parquet'])
+
+    def test_conflicting_types_become_strings(self):
+        sink = ArrowSink()
+        exporter = Exporter(sink, chunk_size=1)
+        exporter.write([{'Value': 1.5}, {'Value': 'N/A'}])
+        exporter.close()
+
+        self.assertEqual(sink.table().column('Value').to_pylist(),
+                         ['1.5', 'N/A'])
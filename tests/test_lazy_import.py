@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+import importlib
+import subprocess
+import sys
+from unittest import TestCase, skipIf
+
+import quickbook3
+from quickbook3.models import ENTITIES
+
+HEAVY_MODULES = ('rauth', 'requests', 'xmltodict', 'pyarrow', 'ijson',
+                 'sqlite3', 'zlib', 'json')
+
+
+def run_isolated(statement):
+    """
+    Runs `statement` in a new interpreter and returns the modules it
+    imported.
+    """
+
+    code = ('import sys\n'
+            'before = set(sys.modules)\n'
+            '%s\n'
+            'sys.stdout.write("\\n".join(sorted(set(sys.modules) - '
+            'before)))' % statement)
+    output = subprocess.check_output([sys.executable, '-c', code])
+    return output.decode('utf-8').split()
+
+
+def heavy(modules):
+    return sorted(module for module in modules
+                  if module.split('.')[0] in HEAVY_MODULES)
+
+
+@skipIf(sys.version_info < (3, 7), 'requires module __getattr__')
+class TestLazyImport(TestCase):
+
+    def test_package_import_is_light(self):
+        modules = run_isolated('import quickbook3')
+        self.assertEqual([module for module in modules
+                          if module.startswith('quickbook3')], ['quickbook3'])
+        self.assertEqual(heavy(modules), [])
+
+    def test_querybuilder_import_is_light(self):
+        modules = run_isolated(
+            'from quickbook3 import QueryBuilder\n'
+            'QueryBuilder("Customer").where("Id").equals("1").build()')
+        self.assertEqual(sorted(module for module in modules
+                                if module.startswith('quickbook3')),
+                         ['quickbook3', 'quickbook3.exceptions',
+                          'quickbook3.lru', 'quickbook3.querybuilder'])
+        self.assertEqual(heavy(modules), [])
+
+    def test_client_import_loads_dependencies(self):
+        modules = run_isolated('from quickbook3 import QuickBooks')
+        self.assertIn('rauth', modules)
+        self.assertIn('requests', modules)
+        self.assertNotIn('xmltodict', modules)
+        self.assertNotIn('pyarrow', modules)
+
+    def test_exports(self):
+        for name in quickbook3.__all__:
+            module = importlib.import_module('quickbook3.%s'
+                                             % quickbook3._MODULES[name])
+            self.assertIs(getattr(quickbook3, name), getattr(module, name))
+        self.assertTrue(set(name for resource, name, fields in ENTITIES)
+                        <= set(quickbook3.__all__))
+        self.assertIn('QuickBooks', dir(quickbook3))
+        self.assertRaises(AttributeError, getattr, quickbook3, 'Unknown')
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+import logging
+from unittest import TestCase
+
+from quickbook3 import QuickBooks, QueryBuilder, RetryPolicy, \
+    ServiceUnavailable, Call, HistogramExporter, PrometheusExporter, \
+    LoggingExporter, TimedSignature, call_tags
+from tests.test_throttle import http_response
+from tests.utils import BaseCase, ServerCase
+
+URL = 'https://quickbooks.api.intuit.com/v3/company/123'
+
+
+class ListExporter(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def record(self, call):
+        self.calls.append(call)
+
+
+class TestCallTags(TestCase):
+
+    def test_crud(self):
+        self.assertEqual(call_tags(URL + '/customer/1', 'get'),
+                         ('customer', 'read'))
+        self.assertEqual(call_tags(URL + '/customer', 'post', {}, {}),
+                         ('customer', 'create'))
+        self.assertEqual(call_tags(URL + '/customer', 'post', {},
+                                   {'Id': '1'}), ('customer', 'update'))
+        self.assertEqual(call_tags(URL + '/customer', 'post',
+                                   {'operation': 'delete'}, {'Id': '1'}),
+                         ('customer', 'delete'))
+
+    def test_endpoints(self):
+        self.assertEqual(call_tags(URL + '/query', 'get', {
+            'query': 'Select * From Invoice Where Id = \'1\''}),
+            ('invoice', 'query'))
+        self.assertEqual(call_tags(URL + '/reports/ProfitAndLoss', 'get'),
+                         ('ProfitAndLoss', 'report'))
+        self.assertEqual(call_tags(URL + '/cdc', 'get',
+                                   {'entities': 'Customer,Invoice'}),
+                         ('Customer,Invoice', 'cdc'))
+        self.assertEqual(call_tags(URL + '/batch', 'post'), (None, 'batch'))
+        self.assertEqual(call_tags(QuickBooks.disconnect_url, 'get'),
+                         (None, 'disconnect'))
+
+
+class TestExporters(TestCase):
+
+    def call(self, duration, status_code=200, resource='customer'):
+        call = Call('123', 'get', resource, 'read')
+        call.status_code = status_code
+        call.network_time = call.duration = duration
+        call.response_bytes = 10
+        return call
+
+    def test_histogram(self):
+        exporter = HistogramExporter(buckets=(0.1, 1))
+        for duration in (0.05, 0.5, 0.5, 5):
+            exporter.record(self.call(duration))
+        exporter.record(self.call(0.05, 404))
+
+        stats = exporter.get('123', 'customer', 'read')
+        self.assertEqual(stats.count, 5)
+        self.assertEqual(stats.histograms['duration'].counts, [2, 2, 1])
+        self.assertEqual(stats.histograms['duration'].cumulative_counts(),
+                         [2, 4, 5])
+        self.assertEqual(stats.response_bytes, 50)
+        self.assertEqual(stats.status_codes, {200: 4, 404: 1})
+        self.assertIsNone(exporter.get('123', 'invoice', 'read'))
+
+    def test_prometheus(self):
+        exporter = PrometheusExporter(buckets=(0.1, 1))
+        exporter.record(self.call(0.5))
+        exporter.record(self.call(0.05, None, 'in"voice'))
+        coalesced = self.call(0.2, None)
+        coalesced.coalesced = True
+        exporter.record(coalesced)
+
+        text = exporter.render()
+
+        labels = 'realm="123",resource="customer",operation="read"'
+        self.assertIn('# TYPE quickbooks_duration_seconds histogram', text)
+        self.assertIn('quickbooks_duration_seconds_bucket{%s,le="0.1"} 0'
+                      % labels, text)
+        self.assertIn('quickbooks_duration_seconds_bucket{%s,le="+Inf"} 2'
+                      % labels, text)
+        self.assertIn('quickbooks_duration_seconds_count{%s} 2' % labels,
+                      text)
+        self.assertIn('quickbooks_response_bytes_total{%s} 20' % labels, text)
+        self.assertIn('quickbooks_coalesced_total{%s} 1' % labels, text)
+        self.assertIn('quickbooks_responses_total{%s,status="200"} 1'
+                      % labels, text)
+        self.assertIn('resource="in\\"voice",operation="read",'
+                      'status="none"} 1', text)
+
+    def test_logging(self):
+        logger = logging.getLogger('tests.metrics')
+        logger.setLevel(logging.DEBUG)
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        logger.addHandler(handler)
+        try:
+            LoggingExporter(logger).record(self.call(0.5))
+        finally:
+            logger.removeHandler(handler)
+
+        self.assertEqual(len(records), 1)
+        self.assertIn('123 read customer status=200',
+                      records[0].getMessage())
+
+
+class TestInstrumentation(BaseCase):
+
+    def setUp(self):
+        super(TestInstrumentation, self).setUp()
+        self.exporter = ListExporter()
+        self.set_default_client(QuickBooks(company_id=self.COMPANY_ID,
+                                           cred_file=self.CREDENTIAL_FILE,
+                                           metrics=self.exporter))
+
+    def test_disabled_by_default(self):
+        client = QuickBooks(company_id=self.COMPANY_ID,
+                            cred_file=self.CREDENTIAL_FILE)
+        self.assertIsNone(client.metrics)
+        self.assertNotIsInstance(client.session.signature, TimedSignature)
+        self.assertIsInstance(self.qbclient.session.signature,
+                              TimedSignature)
+
+    def test_call_recorded(self):
+        self.response('Customer', {'QueryResponse': {'Customer': []}},
+                      **{'Content-Length': '42'})
+
+        self.qbclient.query(QueryBuilder('Customer'))
+
+        call, = self.exporter.calls
+        self.assertEqual(call.tags, (self.COMPANY_ID, 'customer', 'query'))
+        self.assertEqual(call.status_code, 200)
+        self.assertEqual(call.response_bytes, 42)
+        self.assertEqual(call.retries, 0)
+        self.assertIsNone(call.error)
+        self.assertTrue(call.duration >= call.network_time + call.parse_time)
+
+    def test_retries_and_error_recorded(self):
+        self.qbclient.retry_policy = RetryPolicy(max_retries=1, jitter=False,
+                                                 sleep=lambda delay: None)
+        self.request.side_effect = [http_response(503)] * 2
+
+        self.assertRaises(ServiceUnavailable, self.qbclient.read,
+                          'customer', '1')
+
+        call, = self.exporter.calls
+        self.assertEqual(call.tags, (self.COMPANY_ID, 'customer', 'read'))
+        self.assertEqual(call.status_code, 503)
+        self.assertEqual(call.retries, 1)
+        self.assertEqual(call.error, 'ServiceUnavailable')
+
+    def test_failing_exporter_ignored(self):
+        class FailingExporter(object):
+            def record(self, call):
+                raise ValueError()
+
+        self.qbclient.metrics = (FailingExporter(), self.exporter)
+        self.response('customer', {'customer': {'Id': '1'}})
+
+        self.assertEqual(self.qbclient.read('customer', '1'), {'Id': '1'})
+        self.assertEqual(len(self.exporter.calls), 1)
+
+
+class TestInstrumentationOverHttp(ServerCase):
+
+    def test_phases_and_bytes(self):
+        self.server.route('POST', self.company_path('customer'),
+                          lambda request: (200, {'Customer': {'Id': '1'}}))
+        exporter = ListExporter()
+        self.set_default_client(QuickBooks(company_id=self.COMPANY_ID,
+                                           cred_file=self.CREDENTIAL_FILE,
+                                           metrics=[exporter]))
+
+        self.qbclient.create('Customer', {'DisplayName': 'Name'})
+
+        call, = exporter.calls
+        self.assertEqual(call.tags, (self.COMPANY_ID, 'customer', 'create'))
+        self.assertTrue(call.sign_time > 0)
+        self.assertTrue(call.network_time > 0)
+        self.assertEqual(call.request_bytes, len(b'{"DisplayName": "Name"}'))
+        self.assertEqual(call.response_bytes,
+                         len(b'{"Customer": {"Id": "1"}}'))
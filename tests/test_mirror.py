@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+import datetime
+import os
+import re
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+from quickbook3 import QuickBooks, QueryBuilder, SQLiteMirror, \
+    InvalidQueryError, UTC, parse_filter
+from tests.utils import ServerCase
+
+
+def customer(index, **fields):
+    obj = {'Id': str(index), 'DisplayName': 'Customer %d' % index,
+           'Active': index % 2 == 0, 'Balance': index * 10,
+           'CustomerRef': {'value': str(index % 3)},
+           'TxnDate': '2016-01-%02d' % index,
+           'MetaData': {'LastUpdatedTime':
+                        '2016-01-01T%02d:00:00-08:00' % index}}
+    obj.update(fields)
+    return obj
+
+
+class TestParseFilter(TestCase):
+
+    def test_parse(self):
+        self.assertEqual(parse_filter("DisplayName = 'O\\'Brien'"),
+                         ('DisplayName', '=', "O'Brien"))
+        self.assertEqual(parse_filter("Active = true"),
+                         ('Active', '=', True))
+        self.assertEqual(parse_filter("Id IN ('1', '2')"),
+                         ('Id', 'in', ['1', '2']))
+        self.assertEqual(parse_filter("Balance >= '10.5'"),
+                         ('Balance', '>=', '10.5'))
+        self.assertEqual(parse_filter("Name LIKE 'A%'"),
+                         ('Name', 'Like', 'A%'))
+        self.assertRaises(InvalidQueryError, parse_filter, 'Name')
+
+
+class TestSQLiteMirror(ServerCase):
+
+    def setUp(self):
+        super(TestSQLiteMirror, self).setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'mirror.db')
+
+        self.customers = [customer(i) for i in range(1, 13)]
+        self.changes = {'Customer': [], 'Invoice': []}
+        self.server.route('GET', self.company_path('query'), self.query)
+        self.server.route('GET', self.company_path('cdc'), self.cdc)
+        self.set_default_client(QuickBooks(company_id=self.COMPANY_ID,
+                                           cred_file=self.CREDENTIAL_FILE))
+
+        self.mirror = SQLiteMirror(self.qbclient, self.path,
+                                   resources=['customer', 'invoice'],
+                                   page_size=5)
+        self.addCleanup(self.mirror.close)
+
+    def query(self, request):
+        query = request.query['query']
+        entity = re.search(r'From (\w+)', query).group(1)
+        start = int(re.search(r'StartPosition (\d+)', query).group(1))
+        maxresults = int(re.search(r'MaxResults (\d+)', query).group(1))
+        objects = self.customers if entity == 'Customer' else []
+        page = objects[start - 1:start - 1 + maxresults]
+        return 200, {'QueryResponse': {entity: page, 'startPosition': start,
+                                       'maxResults': len(page)}}
+
+    def cdc(self, request):
+        entities = request.query['entities'].split(',')
+        return 200, {'CDCResponse': [{'QueryResponse': [
+            {entity: self.changes[entity]} for entity in entities]}]}
+
+    def ids(self, query_response):
+        return [obj['Id'] for obj in query_response]
+
+    def test_sync(self):
+        self.assertEqual(self.mirror.sync(), {'Customer': 12, 'Invoice': 0})
+        self.assertEqual(self.mirror.count('Customer'), 12)
+
+        self.changes['Customer'] = [
+            customer(3, DisplayName='Renamed'),
+            {'Id': '4', 'status': 'Deleted'}, customer(13)]
+        self.assertEqual(self.mirror.sync(), {'Customer': 3, 'Invoice': 0})
+
+        self.assertEqual(self.mirror.count('customer'), 12)
+        response = self.mirror.query(QueryBuilder('Customer')
+                                     .where('Id').contains(['3', '4']))
+        self.assertEqual([obj['DisplayName'] for obj in response],
+                         ['Renamed'])
+        queries = [request.query.get('query') for request
+                   in self.server.requests]
+        self.assertEqual(len(queries), 5)
+        self.assertIsNone(queries[-1])
+
+    def test_load_again(self):
+        self.mirror.sync()
+        self.mirror.apply('Customer', [customer(99)])
+        self.assertEqual(self.mirror.count(), 13)
+
+        self.assertEqual(self.mirror.load()['Customer'], 12)
+        self.assertEqual(self.mirror.count(), 12)
+
+    def test_query(self):
+        self.mirror.apply('Customer', self.customers)
+
+        def ids(querybuilder):
+            return self.ids(self.mirror.query(querybuilder))
+
+        self.assertEqual(ids(QueryBuilder('Customer').where('DisplayName')
+                             .equals('Customer 2')), ['2'])
+        self.assertEqual(ids(QueryBuilder('Customer').where('Active')
+                             .equals(True).where('Id').lte(6)),
+                         ['2', '4', '6'])
+        self.assertEqual(ids(QueryBuilder('Customer').where('Balance')
+                             .gt(95)), ['10', '11', '12'])
+        self.assertEqual(ids(QueryBuilder('Customer').where('Balance')
+                             .equals('30')), ['3'])
+        self.assertEqual(ids(QueryBuilder('Customer').where('DisplayName')
+                             .like('%er 1%')), ['1', '10', '11', '12'])
+        self.assertEqual(ids(QueryBuilder('Customer')
+                             .where('CustomerRef.value').contains(['0'])),
+                         ['3', '6', '9', '12'])
+        self.assertEqual(ids(QueryBuilder('Customer').where('TxnDate')
+                             .gte(datetime.date(2016, 1, 11))), ['11', '12'])
+        # 2016-01-01T10:00:00-08:00 is 18:00 utc
+        self.assertEqual(ids(QueryBuilder('Customer')
+                             .where('MetaData.LastUpdatedTime')
+                             .gt(datetime.datetime(2016, 1, 1, 18,
+                                                   tzinfo=UTC))),
+                         ['11', '12'])
+        self.assertEqual(ids(QueryBuilder('Customer').where('Id').gt(8)
+                             .order_by('DisplayName', descending=True)),
+                         ['9', '12', '11', '10'])
+        self.assertEqual(self.mirror.query(QueryBuilder('Customer')
+                                           .where('Active').equals(False)
+                                           .count()), 6)
+        self.assertEqual(self.mirror.query(QueryBuilder('Invoice').count()),
+                         0)
+
+    def test_raw_filters_and_bound_queries(self):
+        self.mirror.apply('Customer', self.customers)
+
+        querybuilder = QueryBuilder('Customer')
+        querybuilder.set_filters("Balance > '100' AND Active = true")
+        self.assertEqual(self.ids(self.mirror.query(querybuilder)), ['12'])
+
+        template = QueryBuilder('Customer').where('Balance').lt(0)\
+            .where('Active').equals(False).compile()
+        self.assertEqual(self.ids(self.mirror.query(template.bind(40,
+                                                                  False))),
+                         ['1', '3'])
+
+    def test_select_and_pagination(self):
+        self.mirror.apply('Customer', self.customers)
+
+        response = self.mirror.query(QueryBuilder('Customer')
+                                     .select(['Id', 'DisplayName'])
+                                     .limit(2).offset(3))
+        self.assertEqual(response.object_list,
+                         [{'Id': '3', 'DisplayName': 'Customer 3'},
+                          {'Id': '4', 'DisplayName': 'Customer 4'}])
+        self.assertEqual(response.startposition, 3)
+
+        pages = list(self.mirror.batch_query(QueryBuilder('Customer')
+                                             .limit(5)))
+        self.assertEqual([len(page.object_list) for page in pages],
+                         [5, 5, 2])
+        self.assertEqual(self.ids(pages[-1]), ['11', '12'])
+
+    def test_invalid_queries(self):
+        querybuilder = QueryBuilder('Customer')
+        querybuilder.set_filters("Balance > 'x'")
+        self.assertRaises(InvalidQueryError, self.mirror.query, querybuilder)
+        self.assertRaises(InvalidQueryError, self.mirror.query,
+                          QueryBuilder('Customer').where("Name') OR (1")
+                          .equals('x'))
+
+    def test_indexes_used(self):
+        self.mirror.apply('Customer', self.customers)
+        statements = []
+        self.mirror._connection.set_trace_callback(statements.append)
+        self.mirror.query(QueryBuilder('Customer').where('DisplayName')
+                          .equals('Customer 2'))
+        self.mirror._connection.set_trace_callback(None)
+
+        # the traced statement has its parameters expanded
+        plan = self.mirror._connection.execute(
+            'EXPLAIN QUERY PLAN ' + statements[-1]).fetchall()
+        self.assertIn('entities_DisplayName', str(plan))
+
+    def test_datetime_index_used(self):
+        self.mirror.apply('Customer', self.customers)
+        statements = []
+        self.mirror._connection.set_trace_callback(statements.append)
+        self.mirror.query(QueryBuilder('Customer')
+                          .where('MetaData.LastUpdatedTime')
+                          .gt(datetime.datetime(2016, 1, 1, 18,
+                                                tzinfo=UTC)))
+        self.mirror._connection.set_trace_callback(None)
+
+        plan = self.mirror._connection.execute(
+            'EXPLAIN QUERY PLAN ' + statements[-1]).fetchall()
+        self.assertIn('entities_MetaData_LastUpdatedTime_moment', str(plan))
+
+    def test_background_sync(self):
+        with self.mirror.start(interval=0.01):
+            deadline = time.time() + 5
+            while self.mirror.count() < 12 and time.time() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(self.mirror.count(), 12)
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+import copy
+import pickle
+from unittest import TestCase
+
+from quickbook3 import QuickBooks, QueryResponse, ModelList, \
+    Invoice, Customer, Line, Ref, MetaData, MODELS, model_for, to_model
+from tests.utils import BaseCase
+
+
+INVOICE = {
+    'Id': '130',
+    'SyncToken': '0',
+    'MetaData': {'CreateTime': '2016-01-01T10:00:00-08:00',
+                 'LastUpdatedTime': '2016-01-02T10:00:00-08:00'},
+    'DocNumber': '1037',
+    'TxnDate': '2016-01-01',
+    'CustomerRef': {'value': '24', 'name': 'Jane'},
+    'Line': [{'Id': '1', 'LineNum': 1, 'Amount': 362.07,
+              'DetailType': 'SalesItemLineDetail',
+              'SalesItemLineDetail': {'ItemRef': {'value': '11'}}},
+             {'Amount': 362.07, 'DetailType': 'SubTotalLineDetail',
+              'SubTotalLineDetail': {}}],
+    'BillAddr': {'Id': '2', 'Line1': '1 Main St', 'City': 'Mountain View'},
+    'TotalAmt': 362.07,
+    'Balance': 362.07,
+    'HomeBalance': 362.07,
+}
+
+
+class TestModels(TestCase):
+
+    def test_model_for_every_resource(self):
+        self.assertEqual(sorted(MODELS), sorted(QuickBooks.ACCOUNTING_SERVICES))
+        self.assertIs(model_for('Invoice'), Invoice)
+        self.assertRaises(KeyError, model_for, 'Unknown')
+
+    def test_compact(self):
+        invoice = Invoice.from_dict(INVOICE)
+        self.assertFalse(hasattr(invoice, '__dict__'))
+
+    def test_fields(self):
+        invoice = Invoice.from_dict(INVOICE)
+
+        self.assertEqual(invoice.Id, '130')
+        self.assertEqual(invoice.TotalAmt, 362.07)
+        self.assertIsNone(invoice.DueDate)
+        self.assertEqual(invoice.HomeBalance, 362.07)
+        self.assertRaises(AttributeError, getattr, invoice, 'Unknown')
+
+    def test_nested_decoded_lazily(self):
+        invoice = Invoice.from_dict(INVOICE)
+        self.assertIs(invoice._Line, INVOICE['Line'])
+
+        self.assertIsInstance(invoice.Line, ModelList)
+        self.assertIsInstance(invoice.Line[0], Line)
+        self.assertIs(invoice.Line, invoice.Line)
+        self.assertEqual(invoice.Line[0].SalesItemLineDetail,
+                         {'ItemRef': {'value': '11'}})
+        self.assertIsInstance(invoice.CustomerRef, Ref)
+        self.assertEqual(invoice.CustomerRef.value, '24')
+        self.assertIsInstance(invoice.MetaData, MetaData)
+        self.assertEqual(invoice.BillAddr.City, 'Mountain View')
+
+    def test_round_trip(self):
+        invoice = to_model('invoice', INVOICE)
+        self.assertEqual(invoice.to_dict(), INVOICE)
+
+        invoice.Line, invoice.CustomerRef
+        self.assertEqual(invoice.to_dict(), INVOICE)
+
+    def test_set_fields(self):
+        invoice = Invoice.from_dict(INVOICE)
+        invoice.Line[0].Amount = 10
+        invoice.CustomerRef = Ref(value='25')
+        invoice.sparse = True
+        invoice.CustomField = []
+
+        data = invoice.to_dict()
+        self.assertEqual(data['Line'][0]['Amount'], 10)
+        self.assertEqual(data['CustomerRef'], {'value': '25'})
+        self.assertEqual(data['sparse'], True)
+        self.assertEqual(data['CustomField'], [])
+        self.assertEqual(INVOICE['Line'][0]['Amount'], 362.07)
+
+    def test_equality_copy_and_pickle(self):
+        invoice = Invoice.from_dict(INVOICE)
+
+        self.assertEqual(invoice, Invoice.from_dict(INVOICE))
+        self.assertNotEqual(invoice, Customer.from_dict(INVOICE))
+        self.assertEqual(copy.deepcopy(invoice), invoice)
+        self.assertEqual(pickle.loads(pickle.dumps(invoice)), invoice)
+
+    def test_repr(self):
+        self.assertEqual(repr(Invoice.from_dict(INVOICE)), '<Invoice: 130>')
+        self.assertEqual(repr(Ref(value='1')), '<Ref>')
+
+    def test_query_response_models(self):
+        response = QueryResponse('Invoice', {'Invoice': [INVOICE]})
+        invoices = list(response.models())
+
+        self.assertEqual(invoices, [Invoice.from_dict(INVOICE)])
+
+
+class TestClientModels(BaseCase):
+
+    def test_update_model(self):
+        self.set_default_client()
+        self.response('Invoice', {'Invoice': INVOICE})
+
+        invoice = Invoice.from_dict(INVOICE)
+        self.qbclient.update('Invoice', invoice)
+
+        self.assertEqual(self.request.call_args[1]['json'], INVOICE)
@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+import re
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from quickbook3 import QueryBuilder, PrefetchingPaginator, QueryResponse, \
+    KeysetPaginator, InvalidQueryError
+from tests.utils import BaseCase
+
+
+def json_response(body):
+    response = requests.Response()
+    response.status_code = 200
+    response.json = lambda: body
+    response.headers = CaseInsensitiveDict({'Content-Type': 'application/json'})
+    return response
+
+
+class FakeQueryEndpoint(object):
+    """
+    Answers `Select` queries over `total` invoices from the mocked session.
+    """
+
+    def __init__(self, total, delay=0):
+        self.total = total
+        self.delay = delay
+        self.queries = []
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, method, url, **kwargs):
+        query = kwargs['params']['query']
+        with self.lock:
+            self.queries.append(query)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+
+        time.sleep(self.delay)
+
+        with self.lock:
+            self.active -= 1
+
+        if 'count(*)' in query:
+            return json_response({'QueryResponse': {'totalCount': self.total}})
+
+        start, maxresults = map(int, re.search(
+            r'StartPosition (\d+) MaxResults (\d+)', query).groups())
+        ids = range(start, min(start + maxresults, self.total + 1))
+        return json_response({'QueryResponse': {
+            'Invoice': [{'Id': str(i)} for i in ids],
+            'startPosition': start,
+            'maxResults': len(ids)}})
+
+
+class TestPrefetchingPaginator(BaseCase):
+
+    def setUp(self):
+        super(TestPrefetchingPaginator, self).setUp()
+        self.set_default_client()
+
+    def test_count_query_issued_first_without_pagination(self):
+        endpoint = FakeQueryEndpoint(total=25)
+        self.request.side_effect = endpoint
+        qb = QueryBuilder('Invoice').where('Balance').gt(0).limit(10)
+
+        list(self.qbclient.parallel_batch_query(qb))
+
+        self.assertEqual(endpoint.queries[0],
+                         "Select count(*) From Invoice Where Balance > '0'")
+        self.assertEqual(len(endpoint.queries), 4)
+
+    def test_pages_yielded_in_order(self):
+        self.request.side_effect = FakeQueryEndpoint(total=95, delay=0.005)
+        qb = QueryBuilder('Invoice').limit(10)
+
+        pages = list(self.qbclient.parallel_batch_query(qb, workers=4))
+
+        self.assertEqual(len(pages), 10)
+        for page in pages:
+            self.assertIsInstance(page, QueryResponse)
+        self.assertEqual([page.startposition for page in pages],
+                         list(range(1, 96, 10)))
+        ids = [obj['Id'] for page in pages for obj in page.object_list]
+        self.assertEqual(ids, [str(i) for i in range(1, 96)])
+
+    def test_querybuilder_not_mutated(self):
+        self.request.side_effect = FakeQueryEndpoint(total=30)
+        qb = QueryBuilder('Invoice').limit(10)
+        query = qb.build()
+
+        list(PrefetchingPaginator(self.qbclient, qb))
+
+        self.assertEqual(qb.build(), query)
+        self.assertFalse(qb.is_count_query())
+
+    def test_workers_bound_concurrency(self):
+        endpoint = FakeQueryEndpoint(total=200, delay=0.01)
+        self.request.side_effect = endpoint
+        qb = QueryBuilder('Invoice').limit(10)
+
+        list(PrefetchingPaginator(self.qbclient, qb, workers=3))
+
+        self.assertLessEqual(endpoint.peak, 3)
+        self.assertGreater(endpoint.peak, 1)
+
+    def test_read_ahead_bounds_unconsumed_pages(self):
+        endpoint = FakeQueryEndpoint(total=100)
+        self.request.side_effect = endpoint
+        qb = QueryBuilder('Invoice').limit(10)
+
+        pages = iter(PrefetchingPaginator(self.qbclient, qb, workers=2,
+                                          read_ahead=3))
+        next(pages)
+
+        # the count query plus at most `read_ahead` pages
+        self.assertLessEqual(len(endpoint.queries), 4)
+        pages.close()
+
+    def test_empty_result(self):
+        self.request.side_effect = FakeQueryEndpoint(total=0)
+        qb = QueryBuilder('Invoice').limit(10)
+
+        pages = list(self.qbclient.parallel_batch_query(qb))
+
+        self.assertEqual(len(pages), 1)
+        self.assertEqual(pages[0].object_list, [])
+        self.assertEqual(pages[0].entity, 'Invoice')
+        self.assertEqual(pages[0].startposition, 1)
+
+
+def invoice(number, hour=0):
+    # local times at -08:00, kept along their utc time
+    return {'Id': str(number), 'MetaData': {
+        'LastUpdatedTime': '2016-01-01T%02d:00:00-08:00' % hour},
+        'utc': '2016-01-01T%02d:00:00' % (hour + 8)}
+
+
+class FakeKeysetEndpoint(object):
+    """
+    Answers `Select` queries over `invoices` filtered and ordered by `Id`
+    or `MetaData.LastUpdatedTime`, calling `on_query` before answering.
+    """
+
+    def __init__(self, invoices, on_query=None):
+        self.invoices = invoices
+        self.on_query = on_query
+        self.queries = []
+
+    def __call__(self, method, url, **kwargs):
+        query = kwargs['params']['query']
+        self.queries.append(query)
+        if self.on_query is not None:
+            self.on_query(self)
+
+        if 'count(*)' in query:
+            return json_response({'QueryResponse': {
+                'totalCount': len(self.invoices)}})
+
+        invoices = list(self.invoices)
+        match = re.search(r"Id > '(\d+)'", query)
+        if match:
+            invoices = [obj for obj in invoices
+                        if int(obj['Id']) > int(match.group(1))]
+        match = re.search(r"LastUpdatedTime ([>=]) '([^']{19})", query)
+        if match:
+            op, utc = match.groups()
+            invoices = [obj for obj in invoices
+                        if (obj['utc'] == utc if op == '='
+                            else obj['utc'] > utc)]
+
+        if 'ORDERBY MetaData.LastUpdatedTime' in query:
+            invoices.sort(key=lambda obj: (obj['utc'], int(obj['Id'])))
+        else:
+            invoices.sort(key=lambda obj: int(obj['Id']))
+        maxresults = int(re.search(r'MaxResults (\d+)', query).group(1))
+        page = invoices[:maxresults]
+        return json_response({'QueryResponse': {
+            'Invoice': page, 'startPosition': 1, 'maxResults': len(page)}})
+
+
+class TestKeysetPaginator(BaseCase):
+
+    def setUp(self):
+        super(TestKeysetPaginator, self).setUp()
+        self.set_default_client()
+
+    def ids(self, pages):
+        return [obj['Id'] for page in pages for obj in page.object_list]
+
+    def test_pages_filtered_by_last_id(self):
+        endpoint = FakeKeysetEndpoint([invoice(i) for i in range(1, 26)])
+        self.request.side_effect = endpoint
+        qb = QueryBuilder('Invoice').where('Balance').gt(0).limit(10)
+
+        pages = list(self.qbclient.batch_query(qb, keyset='Id'))
+
+        self.assertEqual(self.ids(pages), [str(i) for i in range(1, 26)])
+        self.assertEqual([page.startposition for page in pages], [1, 11, 21])
+        self.assertEqual(endpoint.queries, [
+            "Select * From Invoice Where Balance > '0' ORDERBY Id "
+            "StartPosition 1 MaxResults 10",
+            "Select * From Invoice Where Balance > '0' AND Id > '10' "
+            "ORDERBY Id StartPosition 1 MaxResults 10",
+            "Select * From Invoice Where Balance > '0' AND Id > '20' "
+            "ORDERBY Id StartPosition 1 MaxResults 10"])
+        self.assertEqual(qb.build(), "Select * From Invoice Where "
+                         "Balance > '0' StartPosition 1 MaxResults 10")
+
+    def test_consistent_while_entities_change(self):
+        invoices = [invoice(i) for i in range(1, 21)]
+
+        def change(endpoint):
+            if len(endpoint.queries) == 2:
+                # an entity of the first page is deleted and one created
+                del endpoint.invoices[0]
+                endpoint.invoices.append(invoice(21))
+
+        self.request.side_effect = FakeKeysetEndpoint(invoices, change)
+        pages = list(self.qbclient.batch_query(QueryBuilder('Invoice')
+                                               .limit(10), keyset='Id'))
+
+        self.assertEqual(self.ids(pages), [str(i) for i in range(1, 22)])
+
+    def test_progress(self):
+        self.request.side_effect = FakeKeysetEndpoint(
+            [invoice(i) for i in range(1, 16)])
+        progress = []
+
+        def report(paginator):
+            progress.append((paginator.pages, paginator.fetched,
+                             paginator.last_key, paginator.count()))
+
+        list(self.qbclient.batch_query(QueryBuilder('Invoice').limit(10),
+                                       keyset='Id', progress=report))
+
+        self.assertEqual(progress, [(1, 10, '10', 15), (2, 15, '15', 15)])
+
+    def test_pages_filtered_by_last_update(self):
+        # several invoices updated at the same time across pages
+        hours = [1, 2, 2, 2, 2, 3, 3, 4]
+        endpoint = FakeKeysetEndpoint([invoice(i, hour) for i, hour
+                                       in enumerate(hours, 1)])
+        self.request.side_effect = endpoint
+        paginator = KeysetPaginator(self.qbclient,
+                                    QueryBuilder('Invoice').limit(3),
+                                    key='MetaData.LastUpdatedTime')
+
+        pages = list(paginator)
+
+        self.assertEqual([[obj['Id'] for obj in page] for page in pages],
+                         [['1'], ['2', '3', '4'], ['5'], ['6', '7'], ['8']])
+        self.assertEqual(paginator.last_key, '2016-01-01T04:00:00-08:00')
+        self.assertEqual([re.sub(r'Select \* From Invoice |MetaData\.|'
+                                 r'T\d\d:00:00\+00:00| StartPosition.*',
+                                 '', query) for query in endpoint.queries], [
+            "ORDERBY LastUpdatedTime",
+            "Where LastUpdatedTime = '2016-01-01' ORDERBY Id",
+            "Where LastUpdatedTime = '2016-01-01' AND Id > '4' ORDERBY Id",
+            "Where LastUpdatedTime > '2016-01-01' ORDERBY LastUpdatedTime",
+            "Where LastUpdatedTime = '2016-01-01' ORDERBY Id",
+            "Where LastUpdatedTime > '2016-01-01' ORDERBY LastUpdatedTime"])
+        self.assertIn("LastUpdatedTime > '2016-01-01T10:00:00+00:00'",
+                      endpoint.queries[3])
+
+    def test_entities_updated_at_once(self):
+        self.request.side_effect = FakeKeysetEndpoint(
+            [invoice(i, 1) for i in range(1, 6)])
+
+        pages = list(self.qbclient.batch_query(
+            QueryBuilder('Invoice').limit(2),
+            keyset='MetaData.LastUpdatedTime'))
+
+        self.assertEqual(self.ids(pages), [str(i) for i in range(1, 6)])
+
+    def test_tie_drained_without_rows(self):
+        def update(endpoint):
+            if len(endpoint.queries) == 2:
+                # the tied invoices are updated before being drained
+                endpoint.invoices[:3] = [invoice(i, 5) for i in range(1, 4)]
+
+        endpoint = FakeKeysetEndpoint([invoice(i, 1) for i in range(1, 4)] +
+                                      [invoice(4, 2)], update)
+        self.request.side_effect = endpoint
+        paginator = KeysetPaginator(self.qbclient,
+                                    QueryBuilder('Invoice').limit(3),
+                                    key='MetaData.LastUpdatedTime')
+
+        pages = list(paginator)
+
+        self.assertEqual(self.ids(pages), ['4', '1', '2', '3'])
+        self.assertIn("LastUpdatedTime > '2016-01-01T09:00:00+00:00'",
+                      endpoint.queries[2])
+
+    def test_empty_result(self):
+        self.request.side_effect = FakeKeysetEndpoint([])
+
+        pages = list(self.qbclient.batch_query(QueryBuilder('Invoice'),
+                                               keyset='Id'))
+
+        self.assertEqual(len(pages), 1)
+        self.assertEqual(pages[0].object_list, [])
+
+    def test_invalid(self):
+        qb = QueryBuilder('Invoice')
+        self.assertRaises(InvalidQueryError, KeysetPaginator, self.qbclient,
+                          qb, key='DisplayName')
+        self.assertRaises(InvalidQueryError, KeysetPaginator, self.qbclient,
+                          qb.copy().order_by('Id'))
+        self.assertRaises(InvalidQueryError, KeysetPaginator, self.qbclient,
+                          qb.bind())
+        self.assertRaises(InvalidQueryError, list, self.qbclient.batch_query(
+            qb, stream=True, keyset='Id'))
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+import pickle
+import threading
+import time
+from unittest import TestCase
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from quickbook3 import RealmPool, QueryBuilder, QuickBooks, RateLimiter, \
+    PooledTransport, query_all, NotFoundError, ValidationFault, \
+    UnknownError, DisconnectionError, MissingCredentialsException
+from tests.utils import BaseCase
+
+
+CREDENTIAL_FILE = BaseCase.CREDENTIAL_FILE
+
+
+def json_response(body):
+    response = requests.Response()
+    response.status_code = 200
+    response.json = lambda: body
+    response.headers = CaseInsensitiveDict({'Content-Type': 'application/json'})
+    return response
+
+
+def company_id(client):
+    return client.company_id
+
+
+def fail(client):
+    raise ValidationFault([{'Detail': client.company_id}])
+
+
+class TestRealmPool(BaseCase):
+
+    def setUp(self):
+        super(TestRealmPool, self).setUp()
+        self.request.side_effect = self.answer
+        self.pool = RealmPool(workers=4, per_realm=2)
+        for realm in ('realm1', 'realm2'):
+            self.pool.add_realm(realm, cred_file=self.CREDENTIAL_FILE)
+
+    def answer(self, method, url, **kwargs):
+        realm = url.split('/company/')[1].split('/')[0]
+        return json_response({'QueryResponse': {
+            'Customer': [{'Id': realm}], 'startPosition': 1,
+            'maxResults': 1}})
+
+    def test_clients_share_transport(self):
+        client1 = self.pool.clients['realm1']
+        client2 = self.pool.clients['realm2']
+        self.assertIsInstance(client1, QuickBooks)
+        self.assertIs(client1.transport, client2.transport)
+        self.assertIsInstance(client1.transport, PooledTransport)
+
+    def test_map_method_name(self):
+        self.pool.map('query', QueryBuilder('Customer'))
+
+        results = self.pool.run()
+
+        self.assertEqual(list(results), ['realm1', 'realm2'])
+        self.assertEqual(results['realm2'].results[0].object_list,
+                         [{'Id': 'realm2'}])
+
+    def test_generators_drained(self):
+        self.pool.submit('realm1', 'batch_query', QueryBuilder('Customer'))
+
+        result = self.pool.run()['realm1'].results[0]
+
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0].object_list, [{'Id': 'realm1'}])
+
+    def test_query_all(self):
+        querybuilder = QueryBuilder('Customer').limit(10)
+        self.pool.map(query_all, querybuilder)
+
+        results = self.pool.run()
+
+        self.assertEqual(results['realm1'].results, [[{'Id': 'realm1'}]])
+        self.assertEqual(querybuilder.build(),
+                         'Select * From Customer StartPosition 1 '
+                         'MaxResults 10')
+
+    def test_errors_aggregated_per_realm(self):
+        self.pool.submit('realm1', company_id)
+        self.pool.submit('realm1', fail)
+        self.pool.submit('realm2', company_id)
+
+        results = self.pool.run()
+
+        self.assertFalse(results['realm1'].ok)
+        self.assertEqual(results['realm1'].results, ['realm1'])
+        self.assertIsInstance(results['realm1'].errors[0].error,
+                              ValidationFault)
+        self.assertTrue(results['realm2'].ok)
+
+    def test_jobs_run_once(self):
+        self.pool.submit('realm1', company_id)
+        self.pool.run()
+        self.assertEqual(len(self.pool.run()['realm1']), 0)
+
+    def test_unknown_realm(self):
+        self.assertRaises(KeyError, self.pool.submit, 'realm3', company_id)
+
+    def test_round_robin(self):
+        pool = RealmPool(workers=1, per_realm=1)
+        order = []
+        for realm in ('a', 'b'):
+            pool.add_realm(realm, cred_file=self.CREDENTIAL_FILE)
+        for _ in range(3):
+            pool.submit('a', lambda client: order.append(client.company_id))
+        pool.submit('b', lambda client: order.append(client.company_id))
+
+        pool.run()
+
+        self.assertEqual(order, ['a', 'b', 'a', 'a'])
+
+    def test_per_realm_limit(self):
+        pool = RealmPool(workers=4, per_realm=1)
+        lock = threading.Lock()
+        running = {'a': 0, 'b': 0}
+        peaks = {'a': 0, 'b': 0}
+
+        def job(client):
+            realm = client.company_id
+            with lock:
+                running[realm] += 1
+                peaks[realm] = max(peaks[realm], running[realm])
+            time.sleep(0.01)
+            with lock:
+                running[realm] -= 1
+
+        pool.add_realm('a', cred_file=self.CREDENTIAL_FILE)
+        pool.add_realm('b', per_realm=3, cred_file=self.CREDENTIAL_FILE)
+        for _ in range(4):
+            pool.submit('a', job)
+            pool.submit('b', job)
+
+        pool.run()
+
+        self.assertEqual(peaks['a'], 1)
+        self.assertEqual(peaks['b'], 3)
+
+    def test_add_client(self):
+        client = QuickBooks('realm3', cred_file=self.CREDENTIAL_FILE)
+        self.pool.add_client(client)
+        self.pool.submit('realm3', company_id)
+        self.assertEqual(self.pool.run()['realm3'].results, ['realm3'])
+
+    def test_remove_realm(self):
+        self.pool.remove_realm('realm2')
+        self.assertEqual(len(self.pool), 1)
+
+
+class TestProcessRealmPool(TestCase):
+
+    def test_process_executor(self):
+        pool = RealmPool(workers=2, executor='process')
+        pool.add_realm('realm1', cred_file=CREDENTIAL_FILE)
+        pool.add_realm('realm2', cred_file=CREDENTIAL_FILE)
+        pool.map(company_id)
+        pool.submit('realm2', fail)
+
+        results = pool.run()
+
+        self.assertEqual(results['realm1'].results, ['realm1'])
+        self.assertEqual(results['realm2'].results, ['realm2'])
+        self.assertEqual(results['realm2'].errors[0].error.errors,
+                         [{'Detail': 'realm2'}])
+
+    def test_shared_objects_refused(self):
+        self.assertRaises(ValueError, RealmPool, executor='process',
+                          rate_limiter=RateLimiter())
+        self.assertRaises(ValueError, RealmPool, executor='fiber')
+
+    def test_exceptions_picklable(self):
+        for error in (NotFoundError(), UnknownError(418, 'Teapot'),
+                      ValidationFault([{'Detail': 'Invalid'}]),
+                      DisconnectionError(22, 'Failed'),
+                      MissingCredentialsException()):
+            copied = pickle.loads(pickle.dumps(error))
+            self.assertIs(type(copied), type(error))
+            self.assertEqual(str(copied), str(error))
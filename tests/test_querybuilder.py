@@ -2,7 +2,10 @@
 
 from __future__ import absolute_import
 from __future__ import division
-from quickbook3 import QueryBuilder, InvalidQueryError
+import datetime
+
+from quickbook3 import QueryBuilder, QueryTemplate, BoundQuery, \
+    InvalidQueryError, TEMPLATE_CACHE
 from tests.utils import BaseCase
 
 
@@ -92,13 +95,28 @@ class TestQueryBuilder(BaseCase):
         qb = QueryBuilder('company')
         values = [1, 2, 3]
         qb.where('a').contains(values)
-        self._test_clause(qb, "a", 'in', str(values))
+        self._test_clause(qb, "a", 'in', "('1', '2', '3')")
 
     def test_contains_clause_tuple(self):
         qb = QueryBuilder('company')
         values = (1, 2, 3)
         qb.where('a').contains(values)
-        self._test_clause(qb, "a", 'in', str(values))
+        self._test_clause(qb, "a", 'in', "('1', '2', '3')")
+
+    def test_contains_clause_booleans(self):
+        qb = QueryBuilder('company')
+        qb.where('Active').contains([True, False])
+        self._test_clause(qb, "Active", 'in', "(true, false)")
+
+    def test_contains_clause_quoted(self):
+        qb = QueryBuilder('company')
+        qb.where('a').contains(["O'Hara"])
+        self._test_clause(qb, "a", 'in', "('O\\'Hara')")
+
+    def test_contains_clause_raises_exception_empty(self):
+        qb = QueryBuilder('company').where('a')
+        self.assertRaisesRegexp(InvalidQueryError, "at least one value",
+                                qb.contains, [])
 
     def test_contains_clause_raises_exception_str_value(self):
         qb = QueryBuilder('company')
@@ -112,6 +130,22 @@ class TestQueryBuilder(BaseCase):
         qb.where("a").gt("5")
         self._test_clause(qb, "a", ">", "'5'")
         
+    def test_gt_clause_datetime(self):
+        qb = QueryBuilder('company')
+        qb.where("a").gt(datetime.datetime(2016, 1, 2, 3, 4, 5))
+        self._test_clause(qb, "a", ">", "'2016-01-02T03:04:05'")
+
+    def test_gte_clause_date(self):
+        qb = QueryBuilder('company')
+        qb.where("a").gte(datetime.date(2016, 1, 2))
+        self._test_clause(qb, "a", ">=", "'2016-01-02'")
+
+    def test_gt_clause_raises_error_on_non_numeric(self):
+        qb = QueryBuilder('company')
+        qb.where("a")
+        self.assertRaisesRegexp(InvalidQueryError, r"integer/float",
+                                qb.gt, "abc")
+
     def test_gt_chainable(self):
         return self._test_clause_chainable("gt", "5")
 
@@ -153,6 +187,26 @@ class TestQueryBuilder(BaseCase):
     def test_like_chainable(self):
         return self._test_clause_chainable("like", "5")
 
+    def test_contains_chainable(self):
+        return self._test_clause_chainable("contains", ["5"])
+
+    def test_values_quoted(self):
+        qb = QueryBuilder('company')
+        qb.where("a").equals("O'Brien\\")
+        self._test_clause(qb, "a", "=", "'O\\'Brien\\\\'")
+
+    def test_order_by(self):
+        qb = QueryBuilder('Invoice').where('Balance').gt(0).order_by('Id')\
+            .limit(10)
+        self.assertEqual(qb.get_order(), 'Id')
+        self.assertEqual(qb.build(), "Select * From Invoice Where "
+                         "Balance > '0' ORDERBY Id StartPosition 1 "
+                         "MaxResults 10")
+        qb.order_by('MetaData.LastUpdatedTime', descending=True)
+        self.assertIn('ORDERBY MetaData.LastUpdatedTime DESC', qb.build())
+        self.assertRaises(InvalidQueryError,
+                          QueryBuilder('Invoice').where('Id').order_by, 'Id')
+
     def _test_clause_chainable(self, clause, param, where=True):
         qb = QueryBuilder('company')
         if where:
@@ -165,3 +219,96 @@ class TestQueryBuilder(BaseCase):
         self.assertEqual(qb.filters[0], "{} {} {}".format(lhs, op, rhs))
 
 
+class TestQueryTemplate(BaseCase):
+
+    def setUp(self):
+        super(TestQueryTemplate, self).setUp()
+        TEMPLATE_CACHE.clear()
+
+    def builder(self, name='Jane', balance=0):
+        return QueryBuilder('Customer').select(['Id', 'DisplayName'])\
+            .where('DisplayName').equals(name).where('Balance').gt(balance)
+
+    def test_compile_cached_per_shape(self):
+        template = self.builder().compile()
+
+        self.assertIsInstance(template, QueryTemplate)
+        self.assertIs(self.builder('John', 10).compile(), template)
+        self.assertIsNot(self.builder().count().compile(), template)
+        self.assertEqual(len(TEMPLATE_CACHE), 2)
+
+    def test_bind_renders_like_build(self):
+        template = self.builder().compile()
+        expected = self.builder("O'Hara", 5).build()
+
+        self.assertEqual(template.bind("O'Hara", 5).build(), expected)
+        self.assertEqual(expected,
+                         "Select Id, DisplayName From Customer Where "
+                         "DisplayName = 'O\\'Hara' AND Balance > '5'")
+
+    def test_bind_validates_values(self):
+        template = self.builder().compile()
+
+        self.assertRaisesRegexp(InvalidQueryError, "> operator requires",
+                                template.bind, 'Jane', 'lots')
+        self.assertRaisesRegexp(InvalidQueryError, "requires 2 values",
+                                template.bind, 'Jane')
+
+    def test_bind_values_of_all_operators(self):
+        qb = QueryBuilder('Invoice').where('a').equals(True)\
+            .where('b').lte(datetime.date(2016, 1, 2)).where('c').like('%x%')
+        self.assertEqual(qb.compile().bind(*qb.get_values()).build(),
+                         qb.build())
+
+    def test_raw_filters_kept(self):
+        qb = QueryBuilder('Invoice')
+        qb.set_filters("Id = '1' AND Balance > '0'")
+        template = qb.compile()
+        self.assertEqual(template.bind().build(),
+                         "Select * From Invoice Where Id = '1' AND "
+                         "Balance > '0'")
+
+    def test_incomplete_filter(self):
+        qb = QueryBuilder('Invoice').where('Id')
+        self.assertRaises(InvalidQueryError, qb.compile)
+
+    def test_bound_query_pagination(self):
+        bound = self.builder().limit(10).offset(21).bind()
+
+        self.assertIsInstance(bound, BoundQuery)
+        self.assertEqual(bound.build(), self.builder().limit(10).offset(21)
+                         .build())
+        bound.offset(31)
+        self.assertTrue(bound.build().endswith('StartPosition 31 '
+                                               'MaxResults 10'))
+
+    def test_order_kept(self):
+        qb = self.builder().order_by('Id', descending=True).limit(10)
+        template = qb.compile()
+
+        self.assertIsNot(self.builder().compile(), template)
+        self.assertEqual(qb.bind().build(), qb.build())
+        self.assertNotIn('ORDERBY', template.count_template().bind(
+            'Jane', 0).build())
+
+    def test_bound_query_count(self):
+        bound = self.builder().bind().copy().count()
+        self.assertTrue(bound.is_count_query())
+        self.assertEqual(bound.build(), self.builder().count().build())
+
+    def test_batch_query_with_bound_query(self):
+        self.set_default_client()
+        responses = []
+        for page in [[{'Id': '1'}], []]:
+            self.response('Customer', {'QueryResponse': {
+                'Customer': page, 'startPosition': 1, 'maxResults': 1,
+                'totalCount': len(page)}})
+            responses.append(self.request.return_value)
+        self.request.side_effect = responses
+        bound = self.builder().limit(1).bind()
+
+        pages = list(self.qbclient.batch_query(bound))
+
+        self.assertEqual(len(pages), 2)
+        self.assertEqual(self.request.call_args_list[1][1]['params']['query'],
+                         self.builder().limit(1).offset(2).build())
@@ -2,10 +2,16 @@
 
 from __future__ import absolute_import
 from __future__ import division
+import json
 import logging
+from unittest import skipIf
+
+import requests
 from quickbook3 import QuickBooks, MissingCredentialsException, \
-    InvalidResourceError
-from tests.utils import BaseCase
+    InvalidResourceError, QueryBuilder, ReportResponse, ReadManyResponse, \
+    NotFoundError
+from quickbook3.response import ijson
+from tests.utils import BaseCase, RequestsBytesIO
 
 
 class TestQuickbooks(BaseCase):
@@ -129,4 +135,122 @@ class TestQuickbooks(BaseCase):
         resp = self.qbclient.delete('customer', resource_dict)
         self.request_assertions(resp)
 
+    def test_read_many(self):
+        self.set_default_client()
+        responses = []
+        for page in [[{'Id': '1'}, {'Id': '2'}], [{'Id': '4'}]]:
+            self.response('Customer', {'QueryResponse': {'Customer': page}})
+            responses.append(self.request.return_value)
+        self.request.side_effect = responses
+
+        result = self.qbclient.read_many('customer', [1, '2', '3', '4', '1'],
+                                         workers=1, chunk_size=2)
+
+        self.assertIsInstance(result, ReadManyResponse)
+        self.assertEqual(sorted(result), ['1', '2', '4'])
+        self.assertEqual(result[4], {'Id': '4'})
+        self.assertEqual(result.missing, ['3'])
+        self.assertRaises(NotFoundError, result.__getitem__, '3')
+        queries = [kwargs['params']['query']
+                   for args, kwargs in self.request.call_args_list]
+        self.assertEqual(queries, [
+            "Select * From Customer Where Id in ('1', '2') "
+            "AND Active in (true, false) StartPosition 1 MaxResults 2",
+            "Select * From Customer Where Id in ('3', '4') "
+            "AND Active in (true, false) StartPosition 1 MaxResults 2"])
+
+    def test_read_many_inactive(self):
+        self.set_default_client()
+        customers = [{'Id': '1', 'Active': True}, {'Id': '2', 'Active': False}]
+
+        def query(method, url, **kwargs):
+            # quickbooks leaves the inactive entities out unless asked for
+            inactive = 'Active in (true, false)' in kwargs['params']['query']
+            self.response('Customer', {'QueryResponse': {'Customer': [
+                obj for obj in customers if obj['Active'] or inactive]}})
+            return self.request.return_value
+        self.request.side_effect = query
+
+        result = self.qbclient.read_many('customer', ['1', '2'])
+
+        self.assertEqual(sorted(result), ['1', '2'])
+        self.assertEqual(result.missing, [])
+
+    def test_read_many_transactions_not_filtered_by_active(self):
+        self.set_default_client()
+        self.response('Invoice', {'QueryResponse': {'Invoice': [{'Id': '1'}]}})
+
+        self.qbclient.read_many('invoice', ['1'])
+
+        args, kwargs = self.request.call_args
+        self.assertEqual(kwargs['params']['query'],
+                         "Select * From Invoice Where Id in ('1') "
+                         "StartPosition 1 MaxResults 1")
+
+    def test_read_many_url_length(self):
+        self.set_default_client()
+        self.qbclient.MAX_ID_LIST_LENGTH = 30
+        ids = [str(i) for i in range(1000, 1010)]
+
+        chunks = self.qbclient._id_chunks(ids, 1000)
+
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 3, 3, 1])
+        self.assertEqual(sum(chunks, []), ids)
+
+    def test_read_many_invalid_resource(self):
+        self.set_default_client()
+        self.assertRaises(InvalidResourceError, self.qbclient.read_many,
+                          'unknown', ['1'])
+
+    def test_report_decoded(self):
+        self.set_default_client()
+        self.response('ProfitAndLoss', {
+            'Header': {'ReportName': 'ProfitAndLoss'},
+            'Columns': {'Column': [{'ColTitle': 'Total', 'ColType': 'Money'}]},
+            'Rows': {'Row': [{'ColData': [{'value': '10'}]}]}})
+
+        report = self.qbclient.report('ProfitAndLoss', decode=True,
+                                      start_date='2016-01-01')
+
+        self.assertIsInstance(report, ReportResponse)
+        self.assertEqual(list(report.column('Total')), [10.0])
+        args, kwargs = self.request.call_args
+        self.assertEqual(kwargs['params'], {'start_date': '2016-01-01'})
+
+    @skipIf(ijson is None, 'requires ijson')
+    def test_query_stream(self):
+        self.set_default_client()
+        self.request.return_value = self.stream_response({'QueryResponse': {
+            'Invoice': [{'Id': '1'}, {'Id': '2'}],
+            'startPosition': 1, 'maxResults': 2}})
+
+        resp = self.qbclient.query(QueryBuilder('Invoice'), stream=True)
+
+        self.assertEqual(list(resp), [{'Id': '1'}, {'Id': '2'}])
+        args, kwargs = self.request.call_args
+        self.assertEqual(kwargs['stream'], True)
+
+    @skipIf(ijson is None, 'requires ijson')
+    def test_batch_query_stream(self):
+        self.set_default_client()
+        pages = [[{'Id': '1'}, {'Id': '2'}], [{'Id': '3'}]]
+        self.request.side_effect = [
+            self.stream_response({'QueryResponse': {
+                'Invoice': page, 'startPosition': 1 + 2 * i,
+                'maxResults': len(page)}})
+            for i, page in enumerate(pages)]
+
+        qb = QueryBuilder('Invoice').limit(2)
+        ids = [invoice['Id']
+               for page in self.qbclient.batch_query(qb, stream=True)
+               for invoice in page]
+
+        self.assertEqual(ids, ['1', '2', '3'])
+        self.assertEqual(qb.get_startposition(), 3)
 
+    def stream_response(self, body):
+        resp = requests.Response()
+        resp.status_code = 200
+        resp.raw = RequestsBytesIO(json.dumps(body).encode('utf-8'))
+        resp.headers['content-type'] = 'application/json'
+        return resp
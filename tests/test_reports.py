@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+import datetime
+import threading
+from unittest import TestCase
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from quickbook3 import QuickBooks, ShardedReport, ReportResponse, \
+    RetryPolicy, ServiceUnavailable, ThrottleError, UnknownError, \
+    date_windows, merge_reports
+from quickbook3 import reports
+from tests.utils import BaseCase
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+
+COLUMNS = {'Column': [
+    {'ColTitle': 'Date', 'ColType': 'Date',
+     'MetaData': [{'Name': 'ColKey', 'Value': 'tx_date'}]},
+    {'ColTitle': 'Amount', 'ColType': 'Money',
+     'MetaData': [{'Name': 'ColKey', 'Value': 'subt_nat_amount'}]}]}
+
+
+def transaction_list(start, end, accounts):
+    rows = []
+    for account, entries in accounts:
+        total = sum(amount for date, amount in entries)
+        rows.append({
+            'type': 'Section',
+            'Header': {'ColData': [{'value': account}, {'value': ''}]},
+            'Rows': {'Row': [
+                {'type': 'Data',
+                 'ColData': [{'value': date}, {'value': str(amount)}]}
+                for date, amount in entries]},
+            'Summary': {'ColData': [
+                {'value': 'Total for %s' % account},
+                {'value': '%.2f' % total}]}})
+    return {'Header': {'ReportName': 'TransactionList', 'StartPeriod': start,
+                       'EndPeriod': end},
+            'Columns': COLUMNS,
+            'Rows': {'Row': rows}}
+
+
+JANUARY = transaction_list('2016-01-01', '2016-01-31', [
+    ('Checking', [('2016-01-05', 10), ('2016-01-20', 5)]),
+    ('Sales', [('2016-01-05', -10)])])
+
+FEBRUARY = transaction_list('2016-02-01', '2016-02-29', [
+    ('Savings', [('2016-02-03', 7)]),
+    ('Checking', [('2016-02-10', 20)])])
+
+
+class FakeClient(object):
+
+    def __init__(self, reports, failures=0, error=None, retry_policy=None):
+        self.reports = reports
+        self.failures = failures
+        self.error = error or ServiceUnavailable('Service Unavailable')
+        self.calls = []
+        self.retry_policy = retry_policy
+        self.lock = threading.Lock()
+
+    def report(self, name, **params):
+        with self.lock:
+            self.calls.append((name, params))
+            if params['start_date'] == '2016-02-01' and self.failures:
+                self.failures -= 1
+                raise self.error
+        return self.reports[params['start_date']]
+
+
+class TestDateWindows(TestCase):
+
+    def test_windows(self):
+        self.assertEqual(date_windows('2016-01-01', '2016-01-10', days=4), [
+            (datetime.date(2016, 1, 1), datetime.date(2016, 1, 4)),
+            (datetime.date(2016, 1, 5), datetime.date(2016, 1, 8)),
+            (datetime.date(2016, 1, 9), datetime.date(2016, 1, 10))])
+
+    def test_single_day(self):
+        day = datetime.date(2016, 1, 1)
+        self.assertEqual(date_windows(day, day), [(day, day)])
+
+    def test_invalid_period(self):
+        self.assertRaises(ValueError, date_windows, '2016-02-01',
+                          '2016-01-01')
+
+
+class TestMergeReports(TestCase):
+
+    def test_sections_merged_in_order(self):
+        report = ReportResponse(merge_reports([JANUARY, FEBRUARY]))
+
+        self.assertEqual([section.title for section in report.sections],
+                         ['Checking', 'Sales', 'Savings'])
+        self.assertEqual(report.column('Date'), [
+            'Checking', '2016-01-05', '2016-01-20', '2016-02-10',
+            'Total for Checking', 'Sales', '2016-01-05', 'Total for Sales',
+            'Savings', '2016-02-03', 'Total for Savings'])
+        self.assertEqual(report.start_period, '2016-01-01')
+        self.assertEqual(report.end_period, '2016-02-29')
+
+    def test_summaries(self):
+        report = ReportResponse(merge_reports([JANUARY, FEBRUARY]))
+        checking = report.row(report.sections[0].summary_row)
+
+        self.assertEqual(checking.values[1:], [35.0])
+
+    def test_payloads_not_mutated(self):
+        merge_reports([JANUARY, FEBRUARY])
+        self.assertEqual(len(JANUARY['Rows']['Row'][0]['Rows']['Row']), 2)
+        self.assertEqual(
+            JANUARY['Rows']['Row'][0]['Summary']['ColData'][1]['value'],
+            '15.00')
+
+    def test_empty(self):
+        self.assertEqual(merge_reports([]), {})
+
+
+class TestShardedReport(TestCase):
+
+    def setUp(self):
+        self.sleeps = []
+        # the default policy of the windows retried without client policy
+        self.mock = mock.patch.object(reports, 'RetryPolicy', lambda:
+                                      RetryPolicy(jitter=False,
+                                                  sleep=self.sleeps.append))
+        self.mock.start()
+
+    def tearDown(self):
+        self.mock.stop()
+
+    def test_fetch(self):
+        client = FakeClient({'2016-01-01': JANUARY, '2016-02-01': FEBRUARY})
+        report = ShardedReport(client, 'TransactionList', '2016-01-01',
+                               '2016-03-01', days=31, accounting_method='Cash')
+        result = report.fetch()
+
+        self.assertIsInstance(result, ReportResponse)
+        self.assertEqual(len(result.sections), 3)
+        self.assertEqual(sorted(params['end_date']
+                                for name, params in client.calls),
+                         ['2016-01-31', '2016-03-01'])
+        self.assertTrue(all(params['accounting_method'] == 'Cash'
+                            for name, params in client.calls))
+
+    def test_failed_window_retried(self):
+        client = FakeClient({'2016-01-01': JANUARY, '2016-02-01': FEBRUARY},
+                            failures=2)
+        result = ShardedReport(client, 'TransactionList', '2016-01-01',
+                               '2016-03-01', days=31).fetch(decode=False)
+
+        self.assertEqual(result['Header']['EndPeriod'], '2016-02-29')
+        self.assertEqual(len(client.calls), 4)
+        self.assertEqual(self.sleeps, [0.5, 1])
+
+    def test_throttled_window_waits_retry_after(self):
+        client = FakeClient({'2016-01-01': JANUARY, '2016-02-01': FEBRUARY},
+                            failures=1, error=ThrottleError(None, 7))
+        ShardedReport(client, 'TransactionList', '2016-01-01', '2016-03-01',
+                      days=31).fetch()
+        self.assertEqual(self.sleeps, [7])
+        del self.sleeps[:]
+
+        client = FakeClient({'2016-01-01': JANUARY, '2016-02-01': FEBRUARY},
+                            failures=1, error=ThrottleError(None, 3600))
+        report = ShardedReport(client, 'TransactionList', '2016-01-01',
+                               '2016-03-01', days=31)
+        self.assertRaises(ThrottleError, report.fetch)
+        self.assertEqual(self.sleeps, [])
+
+    def test_only_transaction_lists(self):
+        for name in ('ProfitAndLoss', 'GeneralLedger', 'BalanceSheet'):
+            self.assertRaises(ValueError, ShardedReport, FakeClient({}),
+                              name, '2016-01-01', '2016-03-01')
+        ShardedReport(FakeClient({}), 'transactionlistwithsplits',
+                      '2016-01-01', '2016-03-01')
+
+    def test_retries_exhausted(self):
+        client = FakeClient({'2016-01-01': JANUARY, '2016-02-01': FEBRUARY},
+                            failures=3)
+        report = ShardedReport(client, 'TransactionList', '2016-01-01',
+                               '2016-03-01', days=31, retries=2)
+
+        self.assertRaises(ServiceUnavailable, report.fetch)
+
+    def test_errors_retried_by_client_policy_not_retried(self):
+        client = FakeClient({'2016-01-01': JANUARY, '2016-02-01': FEBRUARY},
+                            failures=1, retry_policy=RetryPolicy())
+        report = ShardedReport(client, 'TransactionList', '2016-01-01',
+                               '2016-03-01', days=31)
+
+        self.assertRaises(ServiceUnavailable, report.fetch)
+        self.assertEqual(len(client.calls), 2)
+
+    def test_errors_not_retried_by_client_policy_retried(self):
+        sleeps = []
+        client = FakeClient({'2016-01-01': JANUARY, '2016-02-01': FEBRUARY},
+                            failures=1, error=UnknownError(520, 'Unknown'),
+                            retry_policy=RetryPolicy(jitter=False,
+                                                     sleep=sleeps.append))
+        ShardedReport(client, 'TransactionList', '2016-01-01', '2016-03-01',
+                      days=31).fetch()
+
+        self.assertEqual(len(client.calls), 3)
+        self.assertEqual(sleeps, [0.5])
+        self.assertEqual(self.sleeps, [])
+
+
+def http_response(status_code, body=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.reason = 'Reason'
+    response.json = lambda: body or {}
+    response.headers = CaseInsensitiveDict(
+        {'Content-Type': 'application/json'})
+    return response
+
+
+class TestShardedReportRetryPolicy(BaseCase):
+
+    def test_window_retried_once_by_client(self):
+        sleeps = []
+        self.set_default_client(QuickBooks(
+            company_id=self.COMPANY_ID, cred_file=self.CREDENTIAL_FILE,
+            retry_policy=RetryPolicy(max_retries=2, jitter=False,
+                                     sleep=sleeps.append)))
+        self.request.side_effect = lambda *args, **kwargs: http_response(503)
+        report = ShardedReport(self.qbclient, 'TransactionList',
+                               '2016-01-01', '2016-01-31', retries=2)
+
+        self.assertRaises(ServiceUnavailable, report.fetch)
+        # the retries of the client's policy only, not multiplied by those
+        # of the sharded report
+        self.assertEqual(self.request.call_count, 3)
+        self.assertEqual(sleeps, [0.5, 1])
@@ -2,9 +2,17 @@
 
 from __future__ import absolute_import
 from __future__ import division
-from unittest import TestCase
+from array import array
+from collections import OrderedDict
+from email.utils import formatdate
+import json
+import math
+import time
+from unittest import TestCase, skipIf
 import requests
 from quickbook3 import *
+from quickbook3.response import ijson
+from tests.utils import RequestsBytesIO
 
 try:
     from unittest import mock
@@ -84,6 +92,42 @@ class TestResponseParser(TestCase):
     def test_parse_response_service_unavailable(self):
         self._test_http_exception(503, ServiceUnavailable)
 
+    def test_parse_response_throttle_error(self):
+        parser = self.create_response_parser(status_code=429,
+                                             reason='Too Many Requests')
+        parser.response.headers['Retry-After'] = '12'
+
+        with self.assertRaises(ThrottleError) as cm:
+            parser.parse()
+
+        self.assertEqual(cm.exception.retry_after, 12)
+
+    def test_parse_response_throttle_error_retry_after_date(self):
+        parser = self.create_response_parser(status_code=429)
+        parser.response.headers['Retry-After'] = formatdate(
+            time.time() + 60, usegmt=True)
+
+        with self.assertRaises(ThrottleError) as cm:
+            parser.parse()
+
+        self.assertAlmostEqual(cm.exception.retry_after, 60, delta=2)
+
+    def test_parse_response_throttle_error_retry_after_past_date(self):
+        parser = self.create_response_parser(status_code=429)
+        parser.response.headers['Retry-After'] = \
+            'Wed, 21 Oct 2015 07:28:00 GMT'
+
+        with self.assertRaises(ThrottleError) as cm:
+            parser.parse()
+
+        self.assertEqual(cm.exception.retry_after, 0)
+
+    def test_parse_response_throttle_error_without_retry_after(self):
+        parser = self.create_response_parser(status_code=429)
+        with self.assertRaises(ThrottleError) as cm:
+            parser.parse()
+        self.assertIsNone(cm.exception.retry_after)
+
     def _test_bad_request_error(self, fault_type, exception_type, reason=None):
         reason = reason or ERROR_MSG_MAP[exception_type]
         parser = self.create_response_parser(status_code=400,
@@ -137,3 +181,158 @@ class TestResponseParser(TestCase):
         for err in errors:
             assert err['Detail'] in err_msg
 
+
+@skipIf(ijson is None, 'requires ijson')
+class TestStreamingQueryResponse(TestCase):
+
+    def create_response(self, body, status_code=200, reason=None):
+        resp = requests.Response()
+        resp.status_code = status_code
+        resp.reason = reason
+        resp.raw = RequestsBytesIO(json.dumps(body).encode('utf-8'))
+        resp.headers['content-type'] = 'application/json'
+        return resp
+
+    def test_entities_yielded_one_by_one(self):
+        invoices = [{'Id': '1', 'Balance': 10.5,
+                     'Line': [{'Amount': 10.5, 'Description': None}]},
+                    {'Id': '2', 'Balance': 0, 'Line': []}]
+        body = OrderedDict([('QueryResponse', OrderedDict([
+            ('Invoice', invoices), ('startPosition', 1),
+            ('maxResults', 2)])), ('time', 'now')])
+
+        stream = ResponseParser(self.create_response(body))\
+            .parse_stream('Invoice')
+        self.assertIsInstance(stream, StreamingQueryResponse)
+
+        entities = iter(stream)
+        self.assertEqual(next(entities), invoices[0])
+        self.assertEqual(next(entities), invoices[1])
+        self.assertRaises(StopIteration, next, entities)
+        self.assertEqual(stream.startposition, 1)
+        self.assertEqual(stream.maxresults, 2)
+        self.assertEqual(stream.total_count, 2)
+
+    def test_close_skips_remaining_entities(self):
+        body = {'QueryResponse': OrderedDict([
+            ('Invoice', [{'Id': str(i)} for i in range(5)]),
+            ('startPosition', 11), ('maxResults', 5)])}
+
+        stream = StreamingQueryResponse('Invoice', self.create_response(body))
+        stream.close()
+
+        self.assertEqual(list(stream), [])
+        self.assertEqual(stream.startposition, 11)
+        self.assertEqual(stream.maxresults, 5)
+
+    def test_empty_response(self):
+        stream = StreamingQueryResponse('Invoice',
+                                        self.create_response({
+                                            'QueryResponse': {}}))
+        self.assertEqual(list(stream), [])
+        self.assertEqual(stream.total_count, 0)
+
+    def test_fault_raised_before_first_entity(self):
+        body = {'Fault': {'type': 'ValidationFault',
+                          'Error': [{'Detail': 'Invalid query'}]}}
+        parser = ResponseParser(self.create_response(body))
+
+        with self.assertRaises(ValidationFault) as cm:
+            parser.parse_stream('Invoice')
+        self.assertIn('Invalid query', str(cm.exception))
+
+    def test_http_error_raised(self):
+        parser = ResponseParser(self.create_response(
+            {}, status_code=401, reason='Unauthorized'))
+        self.assertRaises(AuthenticationError, parser.parse_stream, 'Invoice')
+
+
+PROFIT_AND_LOSS = {
+    'Header': {'ReportName': 'ProfitAndLoss', 'StartPeriod': '2016-01-01',
+               'EndPeriod': '2016-12-31', 'Currency': 'USD',
+               'Option': [{'Name': 'NoReportData', 'Value': 'false'}]},
+    'Columns': {'Column': [
+        {'ColTitle': '', 'ColType': 'Account',
+         'MetaData': [{'Name': 'ColKey', 'Value': 'account'}]},
+        {'ColTitle': 'Total', 'ColType': 'Money',
+         'MetaData': [{'Name': 'ColKey', 'Value': 'total'}]}]},
+    'Rows': {'Row': [
+        {'type': 'Section', 'group': 'Income',
+         'Header': {'ColData': [{'value': 'Income'}, {'value': ''}]},
+         'Rows': {'Row': [
+             {'type': 'Data', 'ColData': [{'value': 'Sales', 'id': '1'},
+                                          {'value': '100.50'}]},
+             {'type': 'Section',
+              'Header': {'ColData': [{'value': 'Services'}, {'value': ''}]},
+              'Rows': {'Row': [
+                  {'type': 'Data', 'ColData': [{'value': 'Design', 'id': '2'},
+                                               {'value': '20'}]}]},
+              'Summary': {'ColData': [{'value': 'Total Services'},
+                                      {'value': '20'}]}}]},
+         'Summary': {'ColData': [{'value': 'Total Income'},
+                                 {'value': '120.50'}]}},
+        {'type': 'Section', 'group': 'NetIncome',
+         'Summary': {'ColData': [{'value': 'Net Income'},
+                                 {'value': '120.50'}]}}]}}
+
+
+class TestReportResponse(TestCase):
+
+    def test_header(self):
+        report = ReportResponse(PROFIT_AND_LOSS)
+
+        self.assertEqual(report.name, 'ProfitAndLoss')
+        self.assertEqual(report.start_period, '2016-01-01')
+        self.assertEqual(report.options, {'NoReportData': 'false'})
+        self.assertEqual([c.key for c in report.columns], ['account', 'total'])
+        self.assertEqual([c.numeric for c in report.columns], [False, True])
+
+    def test_rows_flattened_in_order(self):
+        report = ReportResponse(PROFIT_AND_LOSS)
+
+        self.assertEqual(len(report), 7)
+        self.assertEqual(report.column('account'),
+                         ['Income', 'Sales', 'Services', 'Design',
+                          'Total Services', 'Total Income', 'Net Income'])
+        self.assertEqual(report.row_kinds,
+                         ['Header', 'Data', 'Header', 'Data', 'Summary',
+                          'Summary', 'Summary'])
+        self.assertEqual(list(report.row_depths), [0, 1, 1, 2, 1, 0, 0])
+        self.assertEqual(report.row_ids[1], '1')
+
+    def test_numeric_columns(self):
+        total = ReportResponse(PROFIT_AND_LOSS).column('Total')
+
+        self.assertIsInstance(total, array)
+        self.assertTrue(math.isnan(total[0]))
+        self.assertTrue(math.isnan(total[2]))
+        self.assertEqual(list(total[3:]), [20.0, 20.0, 120.5, 120.5])
+
+    def test_sections(self):
+        report = ReportResponse(PROFIT_AND_LOSS)
+        income, services, net_income = report.sections
+
+        self.assertEqual(income.group, 'Income')
+        self.assertEqual(income.title, 'Income')
+        self.assertEqual((income.header_row, income.summary_row), (0, 5))
+        self.assertEqual(services.parent, income.index)
+        self.assertEqual(services.title, 'Services')
+        self.assertEqual(list(report.row_sections), [0, 0, 1, 1, 1, 0, 2])
+        self.assertIsNone(net_income.header_row)
+        self.assertEqual(net_income.summary_row, 6)
+
+    def test_iteration(self):
+        report = ReportResponse(PROFIT_AND_LOSS)
+        rows = list(report.data_rows())
+
+        self.assertEqual([row.values for row in rows],
+                         [['Sales', 100.5], ['Design', 20.0]])
+        self.assertEqual(rows[1].section, 1)
+        self.assertEqual(rows[1].id, '2')
+        self.assertEqual(len(list(report)), 7)
+
+    def test_empty_report(self):
+        report = ReportResponse({'Header': {'ReportName': 'BalanceSheet'}})
+        self.assertEqual(len(report), 0)
+        self.assertEqual(list(report), [])
+        self.assertRaises(KeyError, report.column, 'total')
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+import threading
+from unittest import TestCase
+
+from rauth.oauth import HmacSha1Signature
+from rauth.utils import FORM_URLENCODED
+from quickbook3 import CachedHmacSha1Signature, encode_pair, escape_segment
+from tests.utils import BaseCase
+
+URL = 'https://quickbooks.api.intuit.com/v3/company/123'
+
+
+def oauth_params(nonce='0bd1f4c2a8e2', timestamp='1457000000'):
+    return {'oauth_consumer_key': 'consumer key',
+            'oauth_nonce': nonce,
+            'oauth_signature_method': 'HMAC-SHA1',
+            'oauth_timestamp': timestamp,
+            'oauth_token': 'token~+/=',
+            'oauth_version': '1.0'}
+
+
+class TestCachedHmacSha1Signature(TestCase):
+
+    CASES = [
+        ('GET', URL + '/customer/1', {}),
+        ('POST', URL + '/customer', {'params': {}}),
+        ('POST', URL + '/customer', {'params': {'operation': 'delete'}}),
+        ('GET', URL + '/query', {'params': {
+            'query': "Select * From Customer Where DisplayName = "
+                     "'O\\'Brien & Sons+Co ~ 100%' MaxResults 10"}}),
+        ('GET', URL + '/query', {'params': {
+            'query': "Select * From Customer Where DisplayName = 'Café ☃'",
+            'minorversion': 4, 'skipped': None}}),
+        ('GET', URL + '/cdc', {'params': {'entities': 'Customer,Invoice',
+                                          'changedSince': '2016-01-01T00:00'
+                                                          ':00-08:00'}}),
+        ('GET', URL + '/reports/ProfitAndLoss?foo=bar', {'params': {
+            'columns': ['tx_date', 'amount']}}),
+        ('POST', URL + '/upload', {
+            'headers': {'Content-Type': FORM_URLENCODED},
+            'data': {'name': 'a b'}}),
+    ]
+
+    def assertSameSignature(self, consumer_secret, token_secret, method, url,
+                            params, req_kwargs, signature=None):
+        signature = signature or CachedHmacSha1Signature()
+        self.assertEqual(
+            signature.sign(consumer_secret, token_secret, method, url,
+                           params, req_kwargs),
+            HmacSha1Signature().sign(consumer_secret, token_secret, method,
+                                     url, params, req_kwargs))
+
+    def test_same_as_rauth(self):
+        for method, url, req_kwargs in self.CASES:
+            self.assertSameSignature('consumer secret', 'token secret&=',
+                                     method, url, oauth_params(), req_kwargs)
+
+    def test_same_as_rauth_with_caches_warm(self):
+        signature = CachedHmacSha1Signature()
+        for i in range(3):
+            for method, url, req_kwargs in self.CASES:
+                params = oauth_params('nonce%d' % i, str(1457000000 + i))
+                self.assertSameSignature('secret', 'token', method, url,
+                                         params, req_kwargs, signature)
+        self.assertEqual(len(signature._hmacs), 1)
+
+    def test_same_as_rauth_without_token_secret(self):
+        self.assertSameSignature('secret', None, 'GET', URL + '/customer/1',
+                                 oauth_params(), {})
+
+    def test_integer_timestamp(self):
+        params = oauth_params(timestamp=1457000000)
+        self.assertSameSignature('secret', 'token', 'GET', URL + '/query',
+                                 params, {'params': {'query': 'a b'}})
+
+    def test_url_cache_bounded(self):
+        signature = CachedHmacSha1Signature()
+        signature.MAX_URLS = 2
+        for i in range(5):
+            self.assertSameSignature('secret', 'token', 'GET',
+                                     URL + '/customer/%d' % i,
+                                     oauth_params(), {}, signature)
+        self.assertTrue(len(signature._urls) <= 2)
+
+    def test_encode_pair(self):
+        self.assertEqual(encode_pair('query', b'a b+c~/'),
+                         'query=a%20b%2Bc~%2F')
+        self.assertEqual(encode_pair('q', 'é'), 'q=%C3%A9')
+        self.assertEqual(encode_pair('n', 10), 'n=10')
+        self.assertEqual(escape_segment(encode_pair('n', [1, 2])),
+                         'n%3D1%26n%3D2')
+
+    def test_threads(self):
+        signature = CachedHmacSha1Signature()
+        errors = []
+
+        def sign(i):
+            try:
+                for j in range(50):
+                    params = oauth_params('nonce%d-%d' % (i, j))
+                    self.assertSameSignature('secret', 'token', 'GET',
+                                             URL + '/customer/%d' % j,
+                                             params, {}, signature)
+            except AssertionError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=sign, args=(i,))
+                   for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+
+class TestClientSignature(BaseCase):
+
+    def test_session_signature(self):
+        self.set_default_client()
+        self.assertIsInstance(self.qbclient.session.signature,
+                              CachedHmacSha1Signature)
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+import datetime
+import os
+import shutil
+import tempfile
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from quickbook3 import CDCSyncer, MemoryWatermarkStore, SQLiteWatermarkStore, \
+    QuickBooksError
+from tests.utils import BaseCase
+
+
+NOW = datetime.datetime(2016, 3, 1, 12, 0, 0)
+
+
+def json_response(body):
+    response = requests.Response()
+    response.status_code = 200
+    response.json = lambda: body
+    response.headers = CaseInsensitiveDict({'Content-Type': 'application/json'})
+    return response
+
+
+class FakeEndpoints(object):
+    """
+    Answers cdc calls with `changes` and queries with `rows` per entity. The
+    changes holding a `MetaData.LastUpdatedTime` are filtered by the
+    `changedSince` of the call, the first `cdc_limit` being returned.
+    """
+
+    def __init__(self, changes=None, rows=None, cdc_limit=None):
+        self.changes = changes or {}
+        self.rows = rows or {}
+        self.cdc_limit = cdc_limit
+        self.calls = []
+
+    def __call__(self, method, url, **kwargs):
+        params = kwargs['params']
+        self.calls.append((url.rsplit('/', 1)[-1], dict(params)))
+
+        if url.endswith('/cdc'):
+            entities = params['entities'].split(',')
+            return json_response({'CDCResponse': [{'QueryResponse': [
+                {entity: self.changed(entity, params['changedSince'])}
+                for entity in entities]}]})
+
+        entity = params['query'].split(' From ')[1].split(' ')[0]
+        rows = self.rows.get(entity, [])
+        return json_response({'QueryResponse': {
+            entity: rows, 'startPosition': 1, 'maxResults': len(rows)}})
+
+    def changed(self, entity, changed_since):
+        changes = [obj for obj in self.changes.get(entity, [])
+                   if 'MetaData' not in obj or
+                   obj['MetaData']['LastUpdatedTime'] >= changed_since]
+        return changes[:self.cdc_limit]
+
+
+def change(number, minute, deleted=False):
+    obj = {'Id': str(number), 'MetaData': {
+        'LastUpdatedTime': '2016-02-20T00:%02d:00+00:00' % minute}}
+    if deleted:
+        obj['status'] = 'Deleted'
+    return obj
+
+
+class TestCDCSyncer(BaseCase):
+
+    def setUp(self):
+        super(TestCDCSyncer, self).setUp()
+        self.set_default_client()
+        self.store = MemoryWatermarkStore()
+
+    def syncer(self, entities, endpoints, **kwargs):
+        self.request.side_effect = endpoints
+        return CDCSyncer(self.qbclient, entities, store=self.store,
+                         clock=lambda: NOW, **kwargs)
+
+    def test_first_sync_paginates_query(self):
+        endpoints = FakeEndpoints(rows={'Customer': [{'Id': '1'}]})
+        syncer = self.syncer(['Customer'], endpoints)
+
+        batches = list(syncer.sync())
+
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(batches[0].source, 'query')
+        self.assertEqual(batches[0].upsert, [{'Id': '1'}])
+        self.assertEqual(endpoints.calls[0][1]['query'],
+                         'Select * From Customer StartPosition 1 '
+                         'MaxResults 1000')
+        self.assertEqual(self.store.get(self.COMPANY_ID, 'Customer'),
+                         '2016-03-01T11:59:00+00:00')
+
+    def test_incremental_sync_uses_cdc(self):
+        self.store.set(self.COMPANY_ID, 'Customer', '2016-02-20T00:00:00+00:00')
+        self.store.set(self.COMPANY_ID, 'Invoice', '2016-02-20T00:00:00+00:00')
+        endpoints = FakeEndpoints(changes={
+            'Customer': [{'Id': '1'}, {'Id': '2', 'status': 'Deleted'}],
+            'Invoice': [{'Id': '7'}]})
+        syncer = self.syncer(['Customer', 'Invoice'], endpoints, overlap=0)
+
+        batches = list(syncer.sync())
+
+        self.assertEqual(len(endpoints.calls), 1)
+        self.assertEqual(endpoints.calls[0][1], {
+            'entities': 'Customer,Invoice',
+            'changedSince': '2016-02-20T00:00:00+00:00'})
+        self.assertEqual([(b.entity, b.source, len(b.upsert), len(b.delete))
+                          for b in batches],
+                         [('Customer', 'cdc', 1, 1), ('Invoice', 'cdc', 1, 0)])
+        self.assertEqual(self.store.get(self.COMPANY_ID, 'Invoice'),
+                         '2016-03-01T12:00:00+00:00')
+
+    def test_truncated_cdc_narrowed(self):
+        self.store.set(self.COMPANY_ID, 'Invoice', '2016-02-20T00:00:00+00:00')
+        endpoints = FakeEndpoints(changes={'Invoice': [
+            change(1, 1), change(2, 2, True), change(3, 3), change(4, 3, True),
+            change(5, 4, True), change(6, 5)]}, cdc_limit=3)
+        syncer = self.syncer(['Invoice'], endpoints)
+        syncer.CDC_MAX_OBJECTS = 3
+        watermarks = []
+
+        for batch in syncer.sync():
+            watermarks.append(self.store.get(self.COMPANY_ID, 'Invoice'))
+            self.assertEqual(batch.source, 'cdc')
+            watermarks.append([obj['Id'] for obj in batch.upsert] +
+                              [obj['Id'] for obj in batch.delete])
+
+        self.assertEqual(watermarks, [
+            '2016-02-20T00:00:00+00:00', ['1', '2'],
+            '2016-02-20T00:03:00+00:00', ['3', '4'],
+            '2016-02-20T00:04:00+00:00', ['6', '5']])
+        self.assertEqual([params['changedSince']
+                          for call, params in endpoints.calls], [
+            '2016-02-20T00:00:00+00:00', '2016-02-20T00:03:00+00:00',
+            '2016-02-20T00:04:00+00:00'])
+        self.assertEqual(self.store.get(self.COMPANY_ID, 'Invoice'),
+                         '2016-03-01T11:59:00+00:00')
+
+    def test_truncated_cdc_without_progress(self):
+        self.store.set(self.COMPANY_ID, 'Invoice', '2016-02-20T00:00:00+00:00')
+        endpoints = FakeEndpoints(changes={'Invoice': [
+            change(number, 0) for number in range(3)]})
+        syncer = self.syncer(['Invoice'], endpoints)
+        syncer.CDC_MAX_OBJECTS = 3
+
+        self.assertRaises(QuickBooksError, list, syncer.sync())
+        self.assertEqual(self.store.get(self.COMPANY_ID, 'Invoice'),
+                         '2016-02-20T00:00:00+00:00')
+
+    def test_expired_watermark_falls_back_to_query(self):
+        self.store.set(self.COMPANY_ID, 'Invoice', '2016-01-01T00:00:00+00:00')
+        endpoints = FakeEndpoints(rows={'Invoice': [{'Id': '1'}]})
+
+        batches = list(self.syncer(['Invoice'], endpoints).sync())
+
+        self.assertEqual(endpoints.calls[0][0], 'query')
+        self.assertEqual(batches[0].source, 'query')
+
+    def test_watermark_kept_when_interrupted(self):
+        self.store.set(self.COMPANY_ID, 'Invoice', '2016-02-20T00:00:00+00:00')
+        endpoints = FakeEndpoints(changes={'Invoice': [{'Id': '1'}]})
+
+        batches = self.syncer(['Invoice'], endpoints).sync()
+        next(batches)
+        batches.close()
+
+        self.assertEqual(self.store.get(self.COMPANY_ID, 'Invoice'),
+                         '2016-02-20T00:00:00+00:00')
+
+    def test_reset(self):
+        self.store.set(self.COMPANY_ID, 'Invoice', '2016-02-20T00:00:00+00:00')
+        self.syncer(['Invoice'], FakeEndpoints()).reset()
+        self.assertIsNone(self.store.get(self.COMPANY_ID, 'Invoice'))
+
+
+class TestSQLiteWatermarkStore(BaseCase):
+
+    def setUp(self):
+        super(TestSQLiteWatermarkStore, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'watermarks.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super(TestSQLiteWatermarkStore, self).tearDown()
+
+    def test_watermarks_persisted(self):
+        store = SQLiteWatermarkStore(self.path)
+        store.set('realm', 'Invoice', '2016-02-20T00:00:00+00:00')
+        store.set('realm', 'Invoice', '2016-02-21T00:00:00+00:00')
+        store.close()
+
+        store = SQLiteWatermarkStore(self.path)
+        self.assertEqual(store.get('realm', 'Invoice'),
+                         '2016-02-21T00:00:00+00:00')
+        self.assertIsNone(store.get('other', 'Invoice'))
+        store.delete('realm', 'Invoice')
+        self.assertIsNone(store.get('realm', 'Invoice'))
+        store.close()
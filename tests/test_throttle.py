@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from unittest import TestCase
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from quickbook3 import QuickBooks, TokenBucket, RateLimiter, RetryPolicy, \
+    ThrottleError, ServiceUnavailable, ServerError, NotFoundError
+from tests.utils import BaseCase
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def http_response(status_code, body=None, **headers):
+    response = requests.Response()
+    response.status_code = status_code
+    response.reason = 'Reason'
+    response.json = lambda: body or {}
+    response.headers = CaseInsensitiveDict({'Content-Type': 'application/json'})
+    response.headers.update(headers)
+    return response
+
+
+class TestTokenBucket(TestCase):
+
+    def test_burst_then_rate(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, burst=3, clock=clock, sleep=clock.sleep)
+
+        for _ in range(3):
+            bucket.acquire()
+        self.assertEqual(clock.sleeps, [])
+
+        bucket.acquire()
+        self.assertEqual(clock.sleeps, [0.5])
+
+    def test_try_acquire_returns_wait(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=4, burst=1, clock=clock)
+        self.assertEqual(bucket.try_acquire(), 0)
+        self.assertEqual(bucket.try_acquire(), 0.25)
+        clock.now += 0.25
+        self.assertEqual(bucket.try_acquire(), 0)
+
+    def test_refill_capped_at_burst(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10, burst=2, clock=clock)
+        clock.now += 100
+        bucket.try_acquire()
+        self.assertEqual(bucket.tokens, 1)
+
+
+class TestRateLimiter(TestCase):
+
+    def test_bucket_per_realm(self):
+        clock = FakeClock()
+        limiter = RateLimiter(rate=1, burst=1, clock=clock, sleep=clock.sleep)
+
+        limiter.acquire('realm1')
+        limiter.acquire('realm2')
+        self.assertEqual(clock.sleeps, [])
+
+        limiter.acquire('realm1')
+        self.assertEqual(clock.sleeps, [1])
+        self.assertIs(limiter.bucket('realm1'), limiter.bucket('realm1'))
+
+
+class TestRetryPolicy(TestCase):
+
+    def test_throttle_always_retried(self):
+        policy = RetryPolicy(max_retries=2)
+        self.assertTrue(policy.should_retry(ThrottleError(), 'post', 0))
+        self.assertFalse(policy.should_retry(ThrottleError(), 'post', 2))
+
+    def test_server_errors_retried_when_idempotent(self):
+        policy = RetryPolicy()
+        self.assertTrue(policy.should_retry(ServiceUnavailable(), 'get', 0))
+        self.assertTrue(policy.should_retry(ServerError(), 'get', 0))
+        self.assertFalse(policy.should_retry(ServiceUnavailable(), 'post', 0))
+        self.assertFalse(policy.should_retry(NotFoundError(), 'get', 0))
+
+    def test_retry_after_honoured(self):
+        policy = RetryPolicy(backoff=4, max_backoff=30, jitter=False)
+        self.assertEqual(policy.delay(ThrottleError(None, 7), 0), 7)
+        self.assertEqual(policy.delay(ThrottleError(None, 2), 0), 4)
+        self.assertEqual(policy.delay(ThrottleError(None, 90), 0), 90)
+
+    def test_retry_after_over_maximum_not_retried(self):
+        policy = RetryPolicy(max_retry_after=60)
+        self.assertTrue(policy.should_retry(ThrottleError(None, 60), 'get', 0))
+        self.assertFalse(policy.should_retry(ThrottleError(None, 61), 'get',
+                                             0))
+        self.assertTrue(RetryPolicy(max_retry_after=None).should_retry(
+            ThrottleError(None, 3600), 'get', 0))
+
+    def test_exponential_backoff(self):
+        policy = RetryPolicy(backoff=0.5, max_backoff=3, jitter=False)
+        self.assertEqual([policy.delay(ServerError(), attempt)
+                          for attempt in range(5)], [0.5, 1, 2, 3, 3])
+
+    def test_jitter(self):
+        policy = RetryPolicy(backoff=1)
+        for _ in range(20):
+            self.assertTrue(0 <= policy.delay(ServerError(), 2) <= 4)
+
+
+class TestQuickBooksRetries(BaseCase):
+
+    def setUp(self):
+        super(TestQuickBooksRetries, self).setUp()
+        self.clock = FakeClock()
+        self.policy = RetryPolicy(max_retries=2, jitter=False,
+                                  sleep=self.clock.sleep)
+        self.set_default_client(QuickBooks(company_id=self.COMPANY_ID,
+                                           cred_file=self.CREDENTIAL_FILE,
+                                           retry_policy=self.policy))
+
+    def test_throttled_request_retried(self):
+        self.request.side_effect = [
+            http_response(429, **{'Retry-After': '3'}),
+            http_response(200, {'customer': {'Id': '1'}})]
+
+        resp = self.qbclient.create('customer', {'DisplayName': 'Name'})
+
+        self.assertEqual(resp, {'Id': '1'})
+        self.assertEqual(self.clock.sleeps, [3])
+
+    def test_idempotent_request_retried_until_max_retries(self):
+        self.request.side_effect = [http_response(503)] * 3
+
+        self.assertRaises(ServiceUnavailable, self.qbclient.read,
+                          'customer', '1')
+        self.assertEqual(self.request.call_count, 3)
+        self.assertEqual(self.clock.sleeps, [0.5, 1])
+
+    def test_non_idempotent_request_not_retried(self):
+        self.request.side_effect = [http_response(503)]
+
+        self.assertRaises(ServiceUnavailable, self.qbclient.update,
+                          'customer', {})
+        self.assertEqual(self.request.call_count, 1)
+
+    def test_rate_limiter_acquired_per_request(self):
+        limiter = RateLimiter(rate=1, burst=1, clock=self.clock,
+                              sleep=self.clock.sleep)
+        self.qbclient.rate_limiter = limiter
+        self.response('customer', {'customer': {'Id': '1'}})
+
+        self.qbclient.read('customer', '1')
+        self.qbclient.read('customer', '1')
+
+        self.assertEqual(self.clock.sleeps, [1])
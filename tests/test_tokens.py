@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+import base64
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import TestCase
+
+try:
+    from urllib.parse import parse_qsl, urlsplit
+except ImportError:
+    from urlparse import parse_qsl, urlsplit
+
+from quickbook3 import QuickBooks, QuickBookOAuth2Service, TokenManager, \
+    OAuth2Token, MemoryTokenStore, SQLiteTokenStore, BearerSession, \
+    TokenError
+from tests.fakeserver import FakeQuickBooksServer
+from tests.utils import ServerCase
+
+
+class FakeTokenEndpoint(object):
+    """
+    A stand-in for the intuit token endpoint issuing tokens numbered by
+    refresh.
+    """
+
+    def __init__(self, server, expires_in=3600, delay=0):
+        self.expires_in = expires_in
+        self.delay = delay
+        self.requests = []
+        self.count = 0
+        self.lock = threading.Lock()
+        server.route('POST', '/oauth2/v1/tokens/bearer', self.handle)
+        self.url = server.url + '/oauth2/v1/tokens/bearer'
+
+    def handle(self, request):
+        data = dict(parse_qsl(request.body.decode('utf-8')))
+        with self.lock:
+            self.requests.append((request.headers, data))
+            self.count += 1
+            count = self.count
+        if self.delay:
+            time.sleep(self.delay)
+
+        if data.get('refresh_token') == 'revoked':
+            return 400, {'error': 'invalid_grant',
+                         'error_description': 'Token revoked'}
+        return 200, {'access_token': 'access%d' % count,
+                     'refresh_token': 'refresh%d' % count,
+                     'token_type': 'bearer', 'expires_in': self.expires_in,
+                     'x_refresh_token_expires_in': 8726400}
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TokenCase(TestCase):
+
+    def setUp(self):
+        self.server = FakeQuickBooksServer().start()
+        self.addCleanup(self.server.stop)
+        self.endpoint = FakeTokenEndpoint(self.server)
+        self.service = QuickBookOAuth2Service('client', 'secret',
+                                              'http://example.com/callback',
+                                              token_url=self.endpoint.url)
+
+    def token(self, expires_at, realm='realm', refresh_token='refresh0'):
+        return OAuth2Token(realm, 'access0', refresh_token, expires_at)
+
+
+class TestQuickBookOAuth2Service(TokenCase):
+
+    def test_authorize_url(self):
+        url = self.service.get_authorize_url('state')
+        parts = urlsplit(url)
+        self.assertEqual(parts.netloc, 'appcenter.intuit.com')
+        self.assertEqual(dict(parse_qsl(parts.query)), {
+            'client_id': 'client', 'response_type': 'code',
+            'scope': 'com.intuit.quickbooks.accounting',
+            'redirect_uri': 'http://example.com/callback', 'state': 'state'})
+
+    def test_get_tokens(self):
+        before = time.time()
+        token = self.service.get_tokens('code', realm='realm')
+
+        headers, data = self.endpoint.requests[0]
+        self.assertEqual(data, {'grant_type': 'authorization_code',
+                                'code': 'code',
+                                'redirect_uri': 'http://example.com/callback'})
+        self.assertEqual(headers['Authorization'], 'Basic %s' % base64
+                         .b64encode(b'client:secret').decode('ascii'))
+        self.assertEqual((token.realm, token.access_token,
+                          token.refresh_token),
+                         ('realm', 'access1', 'refresh1'))
+        self.assertTrue(before + 3600 <= token.expires_at <=
+                        time.time() + 3600)
+
+    def test_refresh(self):
+        token = self.service.refresh(self.token(0))
+        self.assertEqual(self.endpoint.requests[0][1],
+                         {'grant_type': 'refresh_token',
+                          'refresh_token': 'refresh0'})
+        self.assertEqual(token.access_token, 'access1')
+
+    def test_refresh_refused(self):
+        with self.assertRaises(TokenError) as cm:
+            self.service.refresh(self.token(0, refresh_token='revoked'))
+        self.assertEqual(cm.exception.error, 'invalid_grant')
+        self.assertEqual(cm.exception.status_code, 400)
+
+
+class TestTokenManager(TokenCase):
+
+    def setUp(self):
+        super(TestTokenManager, self).setUp()
+        self.clock = FakeClock()
+        self.manager = TokenManager(self.service, refresh_margin=300,
+                                    clock=self.clock)
+
+    def test_valid_token_not_refreshed(self):
+        self.manager.add(self.token(self.clock.now + 301))
+        self.assertEqual(self.manager.access_token('realm'), 'access0')
+        self.assertEqual(self.endpoint.count, 0)
+
+    def test_expiring_token_refreshed(self):
+        self.manager.add(self.token(self.clock.now + 299))
+
+        token = self.manager.get('realm')
+
+        self.assertEqual(token.access_token, 'access1')
+        self.assertEqual(token.realm, 'realm')
+        self.assertEqual(self.manager.store.get('realm').refresh_token,
+                         'refresh1')
+        self.assertEqual(self.manager.get('realm'), token)
+
+    def test_missing_token(self):
+        self.assertRaises(TokenError, self.manager.get, 'unknown')
+
+    def test_single_flight(self):
+        self.endpoint.delay = 0.2
+        self.manager.add(self.token(self.clock.now))
+        tokens = []
+
+        def get():
+            tokens.append(self.manager.access_token('realm'))
+
+        threads = [threading.Thread(target=get) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.endpoint.count, 1)
+        self.assertEqual(tokens, ['access1'] * 8)
+
+    def test_token_refreshed_by_other_process_reused(self):
+        store = MemoryTokenStore()
+        manager = TokenManager(self.service, store, clock=self.clock)
+        other = TokenManager(self.service, store, clock=self.clock)
+        manager.add(self.token(self.clock.now + 400))
+        stale = manager.get('realm')
+
+        other.refresh('realm')
+        self.clock.now += 200
+
+        self.assertEqual(manager.get('realm').access_token, 'access1')
+        self.assertEqual(manager.refresh('realm', stale).access_token,
+                         'access1')
+        self.assertEqual(self.endpoint.count, 1)
+
+    def test_refresh_due(self):
+        self.manager.add(self.token(self.clock.now + 100, 'due'))
+        self.manager.add(self.token(self.clock.now + 1000, 'later'))
+
+        wait = self.manager.refresh_due()
+
+        self.assertEqual(self.manager.store.get('due').access_token,
+                         'access1')
+        self.assertEqual(self.manager.store.get('later').access_token,
+                         'access0')
+        self.assertEqual(wait, 60)
+
+        self.manager.add(self.token(self.clock.now + 100, 'revoked',
+                                    refresh_token='revoked'))
+        self.assertEqual(self.manager.refresh_due(), 30)
+        self.assertEqual(self.manager.refresh_due(), 30)
+        self.assertEqual(self.endpoint.count, 2)
+
+    def test_background_refresh(self):
+        manager = TokenManager(self.service, refresh_margin=10)
+        manager.MIN_WAIT = 0.01
+        self.endpoint.expires_in = 10.2
+        manager.add(self.token(time.time() + 10.1))
+
+        with manager:
+            deadline = time.time() + 5
+            while self.endpoint.count < 3 and time.time() < deadline:
+                time.sleep(0.05)
+
+        self.assertTrue(self.endpoint.count >= 3)
+        self.assertEqual(manager.store.get('realm').access_token,
+                         'access%d' % self.endpoint.count)
+
+
+class TestSQLiteTokenStore(TestCase):
+
+    def test_roundtrip(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        store = SQLiteTokenStore(os.path.join(directory, 'tokens.db'))
+        self.addCleanup(store.close)
+
+        store.set('realm', OAuth2Token('realm', 'access', 'refresh', 10.5,
+                                       20))
+        token = store.get('realm')
+
+        self.assertEqual(token.as_dict(), {
+            'realm': 'realm', 'access_token': 'access',
+            'refresh_token': 'refresh', 'expires_at': 10.5,
+            'refresh_expires_at': 20})
+        self.assertEqual(store.realms(), ['realm'])
+        store.delete('realm')
+        self.assertIsNone(store.get('realm'))
+
+
+class TestBearerClient(ServerCase):
+
+    def setUp(self):
+        super(TestBearerClient, self).setUp()
+        self.endpoint = FakeTokenEndpoint(self.server)
+        service = QuickBookOAuth2Service('client', 'secret',
+                                         token_url=self.endpoint.url)
+        self.manager = TokenManager(service)
+        self.manager.add(OAuth2Token(self.COMPANY_ID, 'access0', 'refresh0',
+                                     time.time() + 3600))
+        self.set_default_client(QuickBooks(self.COMPANY_ID,
+                                           token_manager=self.manager))
+
+    def authorizations(self):
+        return [request.headers['Authorization']
+                for request in self.server.requests
+                if '/company/' in request.path]
+
+    def test_bearer_auth(self):
+        self.server.route('GET', self.company_path('customer', '1'),
+                          lambda request: (200, {'customer': {'Id': '1'}}))
+
+        self.assertIsInstance(self.qbclient.session, BearerSession)
+        self.assertEqual(self.qbclient.read('customer', '1'), {'Id': '1'})
+        self.assertEqual(self.authorizations(), ['Bearer access0'])
+
+    def test_token_swapped_after_refresh(self):
+        self.server.route('GET', self.company_path('customer', '1'),
+                          lambda request: (200, {'customer': {'Id': '1'}}))
+
+        self.qbclient.read('customer', '1')
+        self.manager.refresh(self.COMPANY_ID)
+        self.qbclient.read('customer', '1')
+
+        self.assertEqual(self.authorizations(),
+                         ['Bearer access0', 'Bearer access1'])
+
+    def test_unauthorized_retried_with_refreshed_token(self):
+        def read(request):
+            if request.headers['Authorization'] == 'Bearer access0':
+                return 401, {}
+            return 200, {'customer': {'Id': '1'}}
+
+        self.server.route('GET', self.company_path('customer', '1'), read)
+
+        self.assertEqual(self.qbclient.read('customer', '1'), {'Id': '1'})
+        self.assertEqual(self.authorizations(),
+                         ['Bearer access0', 'Bearer access1'])
+        self.assertEqual(self.endpoint.count, 1)
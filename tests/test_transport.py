@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from concurrent.futures import ThreadPoolExecutor
+
+from quickbook3 import QuickBooks, PooledTransport
+from tests.utils import BaseCase, ServerCase
+
+
+class TestPooledTransport(BaseCase):
+
+    def test_adapter_configuration(self):
+        transport = PooledTransport(pool_connections=2, pool_maxsize=25)
+        self.assertEqual(transport.adapter._pool_connections, 2)
+        self.assertEqual(transport.adapter._pool_maxsize, 25)
+
+    def test_mounted_on_session(self):
+        transport = PooledTransport()
+        self.set_default_client(QuickBooks(company_id=self.COMPANY_ID,
+                                           cred_file=self.CREDENTIAL_FILE,
+                                           transport=transport))
+
+        session = self.qbclient.session
+        self.assertIs(session.get_adapter(self.PRODUCTION_URL),
+                      transport.adapter)
+        self.assertIs(session.get_adapter(self.qbclient.disconnect_url),
+                      transport.adapter)
+
+    def test_static_headers_reused(self):
+        self.set_default_client()
+        self.response('customer')
+        self.get('customer', '1')
+
+        self.qbclient.read('customer', '1')
+        self.qbclient.read('customer', '1')
+
+        headers = [kwargs['headers']
+                   for args, kwargs in self.request.call_args_list]
+        self.assertIs(headers[0], headers[1])
+        self.assertEqual(headers[0], self.conf['headers'])
+
+
+class TestSharedTransport(ServerCase):
+
+    def test_realms_share_connection_pool(self):
+        self.server.route('GET', r'/v3/company/(\w+)/customer/(\w+)',
+                          lambda request, realm, customer_id:
+                          (200, {'customer': {'Id': customer_id,
+                                              'realm': realm}}))
+
+        transport = PooledTransport(pool_maxsize=4)
+        clients = []
+        for realm in ('realm1', 'realm2', 'realm3'):
+            client = QuickBooks(company_id=realm,
+                                cred_file=self.CREDENTIAL_FILE,
+                                transport=transport)
+            client.base_url_v3 = self.server.base_url_v3
+            clients.append(client)
+
+        def read(i):
+            return clients[i % 3].read('customer', str(i))
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(read, range(30)))
+
+        self.assertEqual([r['realm'] for r in results[:3]],
+                         ['realm1', 'realm2', 'realm3'])
+        self.assertEqual(len(transport.adapter.poolmanager.pools), 1)
+        transport.close()
@@ -5,7 +5,14 @@ from __future__ import division
 import json
 import os
 import sys
-from test.test_support import EnvironmentVarGuard
+
+try:
+    from test.test_support import EnvironmentVarGuard
+except ImportError:
+    try:
+        from test.support.os_helper import EnvironmentVarGuard
+    except ImportError:
+        from test.support import EnvironmentVarGuard
 
 from unittest import TestCase
 from rauth import OAuth1Session
@@ -13,6 +20,7 @@ import rauth
 import requests
 from requests.structures import CaseInsensitiveDict
 from quickbook3 import QuickBooks
+from tests.fakeserver import FakeQuickBooksServer
 
 try:
     from unittest import mock
@@ -117,6 +125,30 @@ class BaseCase(TestCase):
         self.args = ('PUT', self._get_url(resource, resource_id))
 
 
+class ServerCase(BaseCase):
+    """
+    A test case whose client talks over http to a
+    :class:`~tests.fakeserver.FakeQuickBooksServer` instead of a mocked
+    session.
+    """
+
+    def setUp(self):
+        self.env = EnvironmentVarGuard()
+        self.conf = {}
+        self.server = FakeQuickBooksServer().start()
+        self.qbclient = None
+
+    def tearDown(self):
+        self.server.stop()
+
+    def set_default_client(self, qbclient=None):
+        super(ServerCase, self).set_default_client(qbclient)
+        self.qbclient.base_url_v3 = self.server.base_url_v3
+
+    def company_path(self, *parts):
+        return '/'.join(('/v3/company', self.COMPANY_ID) + parts)
+
+
 class RequestsBytesIO(BytesIO):
     def read(self, chunk_size, *args, **kwargs):
         return super(RequestsBytesIO, self).read(chunk_size)